@@ -9,53 +9,107 @@ A flexible Python package for lattice Boltzmann method.
 """
 
 import logging
-from colorlog import ColoredFormatter
-import mpi4py.MPI as mpi
-from colorama import init
+import importlib
 
-init()
-
-# pylint: disable=wrong-import-position
-# pylint: disable=wildcard-import
 # pylint: disable=invalid-name
 
 __version__ = "0.9.0"
 
-from .domain import Domain  # noqa: E402
-from .stencil import Stencil  # noqa: E402
-from .simulation import Simulation  # noqa: E402
-from . import boundary as bc  # noqa: E402
-from .scheme import Scheme  # noqa: E402
-from .elements import *  # noqa: E402, F403
-from .geometry import Geometry  # noqa: E402
-from . import viewer  # noqa: E402
-from .hdf5 import H5File  # noqa: E402
+# the command line is parsed at the first call
 from .options import options  # noqa: E402
-from . import monitoring  # noqa: E402
-from .analysis import EquivalentEquation, Stability  # noqa: E402
-from .utils import progress_bar  # noqa: E402
-
-numeric_level = getattr(logging, options().loglevel, None)
-
-formatter = ColoredFormatter(
-    f"%(log_color)s[{mpi.COMM_WORLD.Get_rank()}] "
-    "%(levelname)-8s %(name)s in function %(funcName)s "
-    "line %(lineno)s\n%(reset)s%(message)s",
-    datefmt=None,
-    reset=True,
-    log_colors={
-        "DEBUG": "green",
-        "INFO": "cyan",
-        "WARNING": "blue",
-        "ERROR": "red",
-        "CRITICAL": "red,bg_white",
-    },
-    style="%",
-)
+
+# the subsystems are imported at the first access: import pylbm doesn't
+# load mpi4py, cerberus, h5py, numpy-stl, matplotlib or the analysis tools
+_lazy = {
+    "Domain": ".domain",
+    "Stencil": ".stencil",
+    "Simulation": ".simulation",
+    "Scheme": ".scheme",
+    "Circle": ".elements",
+    "Ellipse": ".elements",
+    "Parallelogram": ".elements",
+    "Triangle": ".elements",
+    "Sphere": ".elements",
+    "Ellipsoid": ".elements",
+    "CylinderCircle": ".elements",
+    "CylinderEllipse": ".elements",
+    "CylinderTriangle": ".elements",
+    "Parallelepiped": ".elements",
+    "STLElement": ".elements",
+    "Geometry": ".geometry",
+    "H5File": ".hdf5",
+    "EquivalentEquation": ".analysis",
+    "Stability": ".analysis",
+    "progress_bar": ".utils",
+}
+# the subpackages given by their module
+_lazy_modules = {
+    "bc": ".boundary",
+    "viewer": ".viewer",
+    "monitoring": ".monitoring",
+    "analysis": ".analysis",
+    "hdf5": ".hdf5",
+}
+
+__all__ = ["options", *_lazy, *_lazy_modules]
 
 logger = logging.getLogger(__name__)
-logger.setLevel(level=numeric_level)
+_logging_configured = False
+
+
+def _configure_logging():
+    """
+    Set the level given by the command line and the colored output
+    of the logger of pylbm.
+
+    The configuration is done at the first access to a subsystem
+    of pylbm or at the validation of the dictionary of a Stencil,
+    Domain, Geometry, Scheme or Simulation when the subsystems are
+    imported directly.
+    """
+    global _logging_configured
+    if _logging_configured:
+        return
+    _logging_configured = True
+
+    from colorlog import ColoredFormatter
+    from colorama import init
+    import mpi4py.MPI as mpi
+
+    init()
+    formatter = ColoredFormatter(
+        f"%(log_color)s[{mpi.COMM_WORLD.Get_rank()}] "
+        "%(levelname)-8s %(name)s in function %(funcName)s "
+        "line %(lineno)s\n%(reset)s%(message)s",
+        datefmt=None,
+        reset=True,
+        log_colors={
+            "DEBUG": "green",
+            "INFO": "cyan",
+            "WARNING": "blue",
+            "ERROR": "red",
+            "CRITICAL": "red,bg_white",
+        },
+        style="%",
+    )
+
+    logger.setLevel(level=getattr(logging, options().loglevel, None))
+    console = logging.StreamHandler()
+    console.setFormatter(formatter)
+    logger.addHandler(console)
+
+
+def __getattr__(name):
+    if name not in _lazy and name not in _lazy_modules:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    _configure_logging()
+    if name in _lazy_modules:
+        value = importlib.import_module(_lazy_modules[name], __name__)
+    else:
+        value = getattr(importlib.import_module(_lazy[name], __name__), name)
+    globals()[name] = value
+    return value
+
 
-console = logging.StreamHandler()
-console.setFormatter(formatter)
-logger.addHandler(console)
+def __dir__():
+    return sorted(list(globals()) + list(_lazy) + list(_lazy_modules))
@@ -6,3 +6,5 @@
 
 from .base import BaseAlgorithm
 from .pull import PullAlgorithm
+from .aa import AAAlgorithm
+from .push import PushAlgorithm
@@ -0,0 +1,165 @@
+# Authors:
+#     Loic Gouarin <loic.gouarin@polytechnique.edu>
+#     Benjamin Graille <benjamin.graille@math.u-psud.fr>
+#
+# License: BSD 3 clause
+
+"""
+In-place streaming with the AA pattern
+======================================
+
+The time steps alternate between two kernels which read and write the
+same array of distribution functions, so that the array fnew is not
+needed.
+
+The even time steps start from the natural layout where the distribution
+function of the velocity k at the point x is stored at f[k, x]. They read
+the values like the pull algorithm and write the new value of the velocity
+k at the point x in the slot of the symmetric velocity at x + v_k:
+
+    f[ksym, x + v_k] = f_k(x)
+
+This slot has been read by the point x only. The odd time steps read the
+values at the point x in the slots of the symmetric velocities and write
+the new values at the same point in the natural layout.
+
+Between an even and an odd time step, the values which leave the inner
+domain are in the ghost points and the boundary conditions store their
+values in the inner points (see
+:py:meth:`update_layout<pylbm.storage.Array.update_layout>` and the argument
+slots of :py:meth:`update<pylbm.boundary.BoundaryMethod.update>`).
+"""
+
+import sys
+import logging
+import sympy as sp
+
+from ..symbolic import nx, ny, nz, indexed
+from .pull import PullAlgorithm
+
+log = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+class AAAlgorithm(PullAlgorithm):
+    """
+    LBM algorithm with in-place streaming (AA pattern).
+
+    The kernel one_time_step makes the even time steps and the kernel
+    one_time_step_odd makes the odd time steps. The parity of the layout
+    of the distribution functions is given by the attribute parity of the
+    container.
+    """
+
+    in_place = True
+    natural_layout = False
+
+    def __init__(self, scheme, sorder, generator, settings=None, **kwargs):
+        super().__init__(scheme, sorder, generator, settings, **kwargs)
+
+        if generator.backend == "LOOPY":
+            log.error(
+                "Solution: the AA algorithm can't be used with the loopy generator\n"
+            )
+            sys.exit()
+        if self.reductions:
+            log.error("Solution: the reductions can't be used with the AA algorithm\n")
+            sys.exit()
+        if self.f_ref is not None:
+            log.error("Solution: the reference can't be used with the AA algorithm\n")
+            sys.exit()
+
+        try:
+            self.symmetric = scheme.stencil.get_symmetric()
+        except ValueError:
+            log.error(
+                "Solution: the AA algorithm needs the symmetric of each velocity\n"
+            )
+            sys.exit()
+
+    def _get_indexed_on_symmetric(self, name, space_index, shift):
+        """
+        Return a SymPy matrix of indexed objects where the component k is
+        the slot of the symmetric of the velocity k at the point
+        shifted by shift * v_k.
+
+        Parameters
+        ----------
+
+        name : string
+            name of the SymPy symbol for the indexed object
+
+        space_index : list
+            list of SymPy Idx corresponding to space variables
+
+        shift : int
+            the multiple of the velocities added to the space indices
+
+        Return
+        ------
+
+        SymPy Matrix
+            indexed objects for each velocity
+
+        """
+        output = []
+        for k in range(self.ns):
+            index = [int(self.symmetric[k])]
+            for d in range(self.dim):
+                index.append(space_index[d] + shift * int(self.all_velocities[k, d]))
+            output.append(
+                indexed(
+                    name,
+                    [self.ns, nx, ny, nz],
+                    index,
+                    priority=self.sorder,
+                    batch=self.batch,
+                )
+            )
+        return sp.Matrix(output)
+
+    def one_time_step(self):
+        """
+        Return the code expression which makes an even time step
+        on the whole inner domain.
+        """
+        space_index = self._get_space_idx_inner()
+        f = self._get_indexed_on_velocities("f", space_index, -self.all_velocities)
+        fnew = self._get_indexed_on_symmetric("f", space_index, 1)
+        return self._time_step_routine(space_index, f, fnew)
+
+    def one_time_step_odd(self):
+        """
+        Return the code expression which makes an odd time step
+        on the whole inner domain.
+        """
+        space_index = self._get_space_idx_inner()
+        f = self._get_indexed_on_symmetric("f", space_index, 0)
+        fnew = self._get_indexed_on_range("f", space_index)
+        return self._time_step_routine(space_index, f, fnew)
+
+    def generate(self):
+        """
+        Define the routines which must be generate by code generator of SymPy
+        for a given generator.
+        """
+        super().generate()
+        self._add_routine(self.one_time_step_odd)
+
+    def time_step_name(self, parity):
+        """
+        The odd time steps use the kernel one_time_step_odd.
+        """
+        return "one_time_step_odd" if parity else "one_time_step"
+
+    def next_parity(self, parity):
+        """
+        The parity alternates between two time steps.
+        """
+        return 1 - parity
+
+    def layout_slots(self, parity):
+        """
+        In the layout of the odd time steps, the velocities are stored
+        in the slots of their symmetric velocities.
+        """
+        return self.symmetric if parity else None
@@ -63,47 +63,181 @@ Therefore, for our example we have
 
 """
 
+import sys
+import time
+import logging
+import itertools
+import numpy as np
 import sympy as sp
+import mpi4py.MPI as mpi
 from sympy import Eq
 
-from ..generator import For, If
+from ..generator import For, If, IdxRange
 from ..symbolic import (
     ix,
     iy,
     iz,
+    ix_,
+    iy_,
+    iz_,
+    iv_,
     nx,
     ny,
     nz,
     nv,
+    nb,
     indexed,
     space_idx,
+    batch_idx,
     alltogether,
     recursive_sub,
 )
 from ..symbolic import rel_ux, rel_uy, rel_uz
 from .transform import parse_expr
 from .ode import euler
+from .optimize import optimize
 from ..monitoring import monitor
 
 
+log = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+# the sizes of the tiles tried by the autotuner
+TILE_SIZES = (8, 16, 32, 64)
+
+
+def ensemble_name(symbol):
+    """
+    Return the name of the array which stores the values of the parameter
+    symbol for each ensemble member in the generated code.
+    """
+    return "ensemble_{}".format(symbol)
+
+
+def same_parameters(old, new):
+    """
+    Return True if the two dictionaries of parameters give the same call.
+
+    The arrays are bound by reference in the calls: they are compared
+    by identity and the other values are compared by value.
+    """
+    if old.keys() != new.keys():
+        return False
+    for key, value in new.items():
+        if value is old[key]:
+            continue
+        if isinstance(value, np.ndarray) or isinstance(old[key], np.ndarray):
+            return False
+        if value != old[key]:
+            return False
+    return True
+
+
+class TileAutotuner:
+    """
+    Choose the sizes of the tiles of the loops by timing the first time steps.
+
+    Each time step (or each call of the driver) uses the next candidate
+    until all the candidates have been timed. The first call is a warm-up
+    (the arrays and the code are not in the caches yet) whose duration is
+    discarded. The duration is the maximum over the MPI processes so that
+    all the processes choose the same sizes.
+
+    Parameters
+    ----------
+
+    axes : list
+        the names of the autotuned axes ('x', 'y' or 'z')
+    sizes : list
+        the sizes tried for each axis (default TILE_SIZES)
+    """
+
+    def __init__(self, axes, sizes=TILE_SIZES):
+        self.candidates = [
+            dict(zip(axes, c)) for c in itertools.product(sizes, repeat=len(axes))
+        ]
+        self.timings = []
+        self.warm = False
+
+    @property
+    def done(self):
+        """True if all the candidates have been timed"""
+        return len(self.timings) == len(self.candidates)
+
+    @property
+    def candidate(self):
+        """the sizes of the tiles to time"""
+        return self.candidates[len(self.timings)]
+
+    @property
+    def best(self):
+        """the fastest sizes of the tiles"""
+        return self.candidates[int(np.argmin(self.timings))]
+
+    def record(self, duration):
+        """record the duration of one time step with the current candidate"""
+        if not self.warm:
+            # the first candidate is timed again after the warm-up
+            self.warm = True
+            return
+        self.timings.append(mpi.COMM_WORLD.allreduce(duration, op=mpi.MAX))
+
+
 class BaseAlgorithm:
-    def __init__(self, scheme, sorder, generator, settings=None):
+    # True if the time steps read and write the same array
+    # of distribution functions
+    in_place = False
+    # False if the time steps leave the distribution functions
+    # in another layout (see layout_slots)
+    natural_layout = True
+
+    def __init__(
+        self,
+        scheme,
+        sorder,
+        generator,
+        settings=None,
+        ensemble=None,
+        reductions=None,
+        reference=False,
+        sparse=False,
+        tile_size=None,
+    ):
         xx, yy, zz = sp.symbols("xx, yy, zz")
         self.symb_coord_local = [xx, yy, zz]
         self.symb_coord = scheme.symb_coord
         self.dim = scheme.dim
         self.ns = scheme.stencil.nv_ptr[-1]
-        self.M = scheme.M.subs(scheme.param.items())
-        self.invM = scheme.invM.subs(scheme.param.items())
+
+        # the parameters which vary between the ensemble members
+        # are replaced by arrays indexed by the member
+        self.ensemble = list(ensemble) if ensemble else []
+        self.batch = batch_idx() if self.ensemble else None
+        param = [(k, v) for k, v in scheme.param.items() if k not in self.ensemble]
+        param += [
+            (k, sp.IndexedBase(ensemble_name(k), [nb])[self.batch])
+            for k in self.ensemble
+        ]
+
+        self.M = scheme.M.subs(param)
+        self.invM = scheme.invM.subs(param)
         self.all_velocities = scheme.stencil.get_all_velocities()
         self.mv = sp.MatrixSymbol("m", self.ns, 1)
 
+        # with a reference, the arrays f and fnew store the deviations
+        # from the distribution functions f_ref whose moments are m_ref
+        self.m_ref, self.f_ref = None, None
+        if reference:
+            m_ref = sp.IndexedBase("m_ref", [self.ns])
+            f_ref = sp.IndexedBase("f_ref", [self.ns])
+            self.m_ref = sp.Matrix([m_ref[k] for k in range(self.ns)])
+            self.f_ref = sp.Matrix([f_ref[k] for k in range(self.ns)])
+
         if scheme.rel_vel is not None:
             self.rel_vel_symb = [rel_ux, rel_uy, rel_uz][: self.dim]
             self.rel_vel = sp.Matrix(scheme.rel_vel)
 
-            self.Tu = scheme.Tu.subs(scheme.param.items())
-            self.Tmu = scheme.Tmu.subs(scheme.param.items())
+            self.Tu = scheme.Tu.subs(param)
+            self.Tmu = scheme.Tmu.subs(param)
 
             self.Mu = self.Tu * self.M
             self.invMu = self.invM * self.Tmu
@@ -118,6 +252,7 @@ class BaseAlgorithm:
 
         self.sorder = sorder
         self.generator = generator
+        self._calls = {}
 
         subs_coords = list(zip(self.symb_coord, self.symb_coord_local))
         subs_moments = list(
@@ -125,7 +260,7 @@ class BaseAlgorithm:
                 scheme.consm.keys(), [self.mv[int(i), 0] for i in scheme.consm.values()]
             )
         )
-        to_subs = subs_coords + list(scheme.param.items())
+        to_subs = subs_coords + param
         to_subs_full = to_subs + subs_moments
 
         self.eq = recursive_sub(scheme.EQ, to_subs_full)
@@ -148,11 +283,151 @@ class BaseAlgorithm:
                         rhs = recursive_sub(v, to_subs)
                     self.source_eq.append((lhs, rhs))
 
+        # the global reductions computed in one_time_step
+        self.reductions = [
+            (op, recursive_sub(expr, to_subs_full), dims, increment)
+            for op, expr, dims, increment in (reductions if reductions else [])
+        ]
+
         self.vmax = [0] * 3
         self.vmax[: scheme.dim] = scheme.stencil.vmax
         self.local_vars = self.symb_coord_local[: self.dim]
         self.settings = settings if settings else {}
 
+        # the sizes of the tiles of the loops of one_time_step
+        self.tiles, self.tile_tuner = {}, None
+        tiles = dict(self.settings.get("tiles", {}))
+        if tiles and generator.backend != "CYTHON":
+            log.warning("the tiles are only used with the cython generator")
+            tiles = {}
+        auto = [a for a in "xyz"[: self.dim] if tiles.get(a, None) == "auto"]
+        if auto:
+            self.tile_tuner = TileAutotuner(auto)
+            tiles.update(self.tile_tuner.candidate)
+        self.tiles = {a: int(s) for a, s in tiles.items() if a in "xyz"[: self.dim]}
+
+        # the boundary links are resolved during the pull of one_time_step
+        self.fused_bc = self.settings.get("fused_bc", False)
+        if self.fused_bc and (
+            generator.backend != "CYTHON"
+            or self.settings.get("split", False)
+            or not self.natural_layout
+        ):
+            log.error(
+                "Solution: the boundary conditions can only be fused with the "
+                "cython generator, without split and in the natural layout\n"
+            )
+            sys.exit()
+
+        # the distribution functions are stored on the nodes of a sparse
+        # lattice: the kernels loop over the fluid nodes and pull the values
+        # from the nodes given by the table neighbors (see SparseContainer)
+        self.sparse = sparse
+        if sparse and (
+            generator.backend != "CYTHON"
+            or not self.natural_layout
+            or self.fused_bc
+            or self.settings.get("check_isfluid", False)
+            or any(dims for _, _, dims, _ in self.reductions)
+        ):
+            log.error(
+                "Solution: the sparse storage can only be used with the cython "
+                "generator and in the natural layout, without fused boundary "
+                "conditions, check_isfluid and reductions on a plane or a line\n"
+            )
+            sys.exit()
+
+        # only the tiles with fluid nodes are stored with their halo and
+        # stacked along x (see TiledContainer): the kernels loop over the
+        # tiles and make dense loops inside each tile
+        self.tile_size = None
+        self._tile_start = sp.Symbol("ix_t", integer=True)
+        if tile_size is not None:
+            self.tile_size = list(tile_size) + [1] * (3 - self.dim)
+        if tile_size is not None and (
+            generator.backend != "CYTHON"
+            or not self.natural_layout
+            or self.fused_bc
+            or self.settings.get("check_isfluid", False)
+            or self.reductions
+            or self.tiles
+        ):
+            log.error(
+                "Solution: the tiled storage can only be used with the cython "
+                "generator and in the natural layout, without fused boundary "
+                "conditions, check_isfluid, reductions and tiles of the loops\n"
+            )
+            sys.exit()
+
+        # the loops of the kernels are rewritten to reduce the number of
+        # operations per node (see pylbm.algorithm.optimize)
+        self.optimize = self.settings.get("optimize", False)
+        self.flops = {}
+        if self.optimize and generator.backend == "LOOPY":
+            log.error(
+                "Solution: the kernels can't be optimized with the loopy generator\n"
+            )
+            sys.exit()
+
+    def _get_loop_idx(self, space_index):
+        """
+        Return the list of SymPy Idx of the loops over the domain:
+        the space indices preceded by the loop over the tiles if the
+        space indices are the inner points of a tile of the tiled storage
+        and by the index of the ensemble members if there is an ensemble.
+        """
+        loop = list(space_index)
+        if self.tile_size is not None and any(
+            self._tile_start in sp.sympify(i.lower).free_symbols for i in space_index
+        ):
+            # the first point along x of each tile with its halo
+            block = self.tile_size[0] + 2 * self.vmax[0]
+            tile = IdxRange(sp.Idx(self._tile_start, (0, nx)), 0, nx, block)
+            loop = [tile] + loop
+        if self.batch is None:
+            return loop
+        return [self.batch] + loop
+
+    def _get_tiled_loop_idx(self, space_index):
+        """
+        Return the loop indices where the axes given in the setting tiles
+        are split in tiles.
+
+        The loops over the tiles are the outermost loops, the size of the
+        tiles of the axis x is the argument tile_x of the generated code.
+        """
+        loop_idx = self._get_loop_idx(space_index)
+        if not self.tiles:
+            return loop_idx
+
+        axes = {ix_: "x", iy_: "y", iz_: "z"}
+        tiles, inner = [], []
+        for i in loop_idx:
+            axis = axes.get(i.label, None)
+            if axis not in self.tiles:
+                inner.append(i)
+                continue
+            size = sp.Symbol("tile_" + axis, integer=True)
+            start = sp.Symbol(str(i.label) + "t", integer=True)
+            tiles.append(
+                IdxRange(sp.Idx(start, (i.lower, i.upper)), i.lower, i.upper, size)
+            )
+            inner.append(sp.Idx(i.label, (start, sp.Min(start + size, i.upper))))
+        return tiles + inner
+
+    def set_tiles(self, sizes):
+        """
+        Set the sizes of the tiles used by the generated code.
+
+        Parameters
+        ----------
+
+        sizes : dict
+            the size of the tiles for each tiled axis ('x', 'y' or 'z')
+        """
+        self.tiles.update({a: int(s) for a, s in sizes.items() if a in self.tiles})
+        self._calls.clear()
+
     def _get_space_idx_full(self):
         """
         Return a list of SymPy Idx ordered with sorder
@@ -177,7 +452,29 @@ class BaseAlgorithm:
 
         where vmax_i is the maximum of the velocities modulus in direction i.
         The length of the list is the dimension of the problem.
+
+        With the sparse storage, the list has one index over the fluid nodes
+
+            ix -> [0, nfluid[
+
+        With the tiled storage, the indices are the inner points of the tile
+        whose first point along x is ix_t
+
+            ix -> [ix_t + vmax_x, ix_t + vmax_x + tile_size_x[
+            iy -> [vmax_y, vmax_y + tile_size_y[
+            iz -> [vmax_z, vmax_z + tile_size_z[
         """
+        if self.sparse:
+            return space_idx([(0, sp.Symbol("nfluid", integer=True))])
+        if self.tile_size is not None:
+            start = [self._tile_start, 0, 0]
+            return space_idx(
+                [
+                    (s + v, s + v + n)
+                    for s, v, n in zip(start, self.vmax, self.tile_size)
+                ],
+                priority=self.sorder[1:],
+            )
         return space_idx(
             [
                 (self.vmax[0], nx - self.vmax[0]),
@@ -214,6 +511,7 @@ class BaseAlgorithm:
             [nv] + space_index,
             velocities_index=range(self.ns),
             priority=self.sorder,
+            batch=self.batch,
         )
 
     def _get_indexed_on_velocities(self, name, space_index, velocities):
@@ -238,13 +536,40 @@ class BaseAlgorithm:
         SymPy Matrix
             indexed objects for each velocity
 
+        Notes
+        -----
+
+        With the sparse storage, the values are read at the nodes given by
+        the table neighbors which only stores the node of x - v_k: the
+        velocities must be the opposite of the velocities of the scheme.
+
         """
+        if self.sparse:
+            if not np.array_equal(velocities, -self.all_velocities):
+                raise ValueError("the sparse storage only pulls the velocities")
+            nfluid = sp.Symbol("nfluid", integer=True)
+            neighbors = sp.IndexedBase(
+                sp.Symbol("neighbors", integer=True), [nfluid, self.ns]
+            )
+            return sp.Matrix(
+                [
+                    indexed(
+                        name,
+                        [self.ns, nx],
+                        [k, neighbors[space_index[0], k]],
+                        priority=self.sorder,
+                        batch=self.batch,
+                    )
+                    for k in range(self.ns)
+                ]
+            )
         return indexed(
             name,
             [self.ns, nx, ny, nz],
             [nv] + space_index,
             velocities=velocities,
             priority=self.sorder,
+            batch=self.batch,
         )
 
     def relative_velocity(self, m):
@@ -259,7 +584,37 @@ class BaseAlgorithm:
         else:
             m_consm = m[:nconsm]
 
-        return Eq(m_consm, sp.Matrix((self.Mu * f)[:nconsm]))
+        return Eq(m_consm, sp.Matrix(self.moments(f, True)[:nconsm]))
+
+    def moments(self, f, with_rel_velocity=False):
+        """
+        Return the moments of the distributed functions f.
+
+        The moments of the reference are added when the arrays store
+        the deviations from a reference.
+
+        Parameters
+        ----------
+
+        f : SymPy Matrix or list
+            indexed objects for the distributed functions
+
+        with_rel_velocity : boolean
+            compute the moments in the relative velocity basis
+            (default is False)
+
+        """
+        if isinstance(f, list):
+            f = sp.Matrix(f)
+        if with_rel_velocity:
+            moments = self.Mu * f
+            if self.m_ref is not None:
+                moments += self.Tu * self.m_ref
+        else:
+            moments = self.M * f
+            if self.m_ref is not None:
+                moments += self.m_ref
+        return moments
 
     def coords(self):
         coord = []
@@ -292,7 +647,33 @@ class BaseAlgorithm:
         space_index = self._get_space_idx_inner()
         f = self._get_indexed_on_velocities("f", space_index, -self.all_velocities)
         fnew = self._get_indexed_on_range("fnew", space_index)
-        return {"code": For(space_index, self.transport_local(f, fnew))}
+        code = For(self._get_loop_idx(space_index), self.transport_local(f, fnew))
+        if self.tile_size is not None:
+            code = [self._tile_halo_update(), code]
+        return {"code": code}
+
+    def _tile_halo_update(self):
+        """
+        Return the code which copies the values of the owners of the points
+        in the halos of the tiles of the tiled storage (see
+        :py:class:`TiledLattice<pylbm.container.TiledLattice>`).
+        """
+        nhalo = sp.Symbol("nhalo", integer=True)
+        dst = sp.IndexedBase(sp.Symbol("halo_dst", integer=True), [nhalo, self.dim])
+        src = sp.IndexedBase(sp.Symbol("halo_src", integer=True), [nhalo, self.dim])
+        j = sp.Idx(sp.Symbol("ih_", integer=True), (0, nhalo))
+        k = sp.Idx(iv_, (0, self.ns))
+
+        def copy(index):
+            return indexed(
+                "f",
+                [self.ns, nx, ny, nz],
+                [k] + [index[j, d] for d in range(self.dim)],
+                priority=self.sorder,
+                batch=self.batch,
+            )
+
+        return For(self._get_loop_idx([j]) + [k], Eq(copy(dst), copy(src)))
 
     def f2m_local(self, f, m, with_rel_velocity=False):
         """
@@ -325,12 +706,12 @@ class BaseAlgorithm:
                 m_notconsm = m[nconsm:]
 
             return [
-                Eq(m_consm, sp.Matrix((self.M * f)[:nconsm])),
+                Eq(m_consm, sp.Matrix(self.moments(f)[:nconsm])),
                 *self.relative_velocity(m),
-                Eq(m_notconsm, sp.Matrix((self.Mu * f)[nconsm:])),
+                Eq(m_notconsm, sp.Matrix(self.moments(f, True)[nconsm:])),
             ]
         else:
-            return Eq(m, self.M * f)
+            return Eq(m, self.moments(f))
 
     def f2m(self):
         """
@@ -340,7 +721,24 @@ class BaseAlgorithm:
         space_index = self._get_space_idx_full()
         f = self._get_indexed_on_range("f", space_index)
         m = self._get_indexed_on_range("m", space_index)
-        return {"code": For(space_index, self.f2m_local(f, m))}
+        return {"code": For(self._get_loop_idx(space_index), self.f2m_local(f, m))}
+
+    def f2m_consm(self):
+        """
+        Return the code expression which computes only the conserved moments
+        from the distributed functions on the whole inner domain.
+        """
+        nconsm = len(self.consm)
+        space_index = self._get_space_idx_inner()
+        f = self._get_indexed_on_range("f", space_index)
+        m = self._get_indexed_on_range("m", space_index)
+        m_consm = sp.Matrix(m[:nconsm])
+        return {
+            "code": For(
+                self._get_loop_idx(space_index),
+                Eq(m_consm, sp.Matrix(self.moments(f)[:nconsm])),
+            )
+        }
 
     def m2f_local(self, m, f, with_rel_velocity=False):
         """
@@ -363,9 +761,12 @@ class BaseAlgorithm:
 
         """
         if with_rel_velocity:
-            return Eq(f, self.invMu * m)
+            values = self.invMu * m
         else:
-            return Eq(f, self.invM * m)
+            values = self.invM * m
+        if self.f_ref is not None:
+            values -= self.f_ref
+        return Eq(f, values)
 
     def m2f(self):
         """
@@ -375,7 +776,7 @@ class BaseAlgorithm:
         space_index = self._get_space_idx_full()
         f = self._get_indexed_on_range("f", space_index)
         m = self._get_indexed_on_range("m", space_index)
-        return {"code": For(space_index, self.m2f_local(m, f))}
+        return {"code": For(self._get_loop_idx(space_index), self.m2f_local(m, f))}
 
     def equilibrium_local(self, m):
         """
@@ -398,7 +799,7 @@ class BaseAlgorithm:
         """
         space_index = self._get_space_idx_full()
         m = self._get_indexed_on_range("m", space_index)
-        return {"code": For(space_index, self.equilibrium_local(m))}
+        return {"code": For(self._get_loop_idx(space_index), self.equilibrium_local(m))}
 
     def relaxation_local(self, m, with_rel_velocity=False):
         """
@@ -430,7 +831,7 @@ class BaseAlgorithm:
         """
         space_index = self._get_space_idx_full()
         m = self._get_indexed_on_range("m", space_index)
-        return {"code": For(space_index, self.relaxation_local(m))}
+        return {"code": For(self._get_loop_idx(space_index), self.relaxation_local(m))}
 
     def source_term_local(self, m):
         """
@@ -497,7 +898,7 @@ class BaseAlgorithm:
         """
         space_index = self._get_space_idx_inner()
         m = self._get_indexed_on_range("m", space_index)
-        return {"code": For(space_index, self.source_term_local(m))}
+        return {"code": For(self._get_loop_idx(space_index), self.source_term_local(m))}
 
     def one_time_step_local(self, f, fnew, m):
         """
@@ -542,18 +943,107 @@ class BaseAlgorithm:
             code.extend(self.source_term_local(m))
 
         code.append(self.m2f_local(m, fnew, with_rel_velocity))
+
+        if self.reductions:
+            code.extend(self.reductions_local(m, fnew))
+        return code
+
+    def reductions_local(self, m, fnew):
+        """
+        Return symbolic expressions which accumulate the global reductions
+        in the array reductions.
+
+        The reductions restricted to a plane or a line are only accumulated
+        when the space indices are the ones given by the array
+        reductions_index. The reductions of an increment use the difference
+        between the moments of the new distribution functions and the
+        moments of the old ones at the same point.
+
+        Parameters
+        ----------
+
+        m : SymPy Matrix
+            indexed objects for the moments
+
+        fnew : SymPy Matrix
+            indexed objects for the new distributed functions
+
+        """
+        nred = len(self.reductions)
+        if self.batch is None:
+            red = sp.IndexedBase("reductions", [nred])
+            red = [red[k] for k in range(nred)]
+        else:
+            red = sp.IndexedBase("reductions", [nb, nred])
+            red = [red[self.batch, k] for k in range(nred)]
+        index = sp.IndexedBase(
+            sp.Symbol("reductions_index", integer=True), [nred, self.dim]
+        )
+        # the indices of the loops over the space
+        loop_idx = {i.label: i for i in fnew[0].atoms(sp.Idx)}
+        space = [loop_idx.get(i, i) for i in [ix_, iy_, iz_]]
+
+        # the moments are in the relative velocity basis in m
+        if self.rel_vel_symb:
+            moments = self.moments(sp.Matrix(fnew))
+        else:
+            moments = m
+        to_subs = list(zip(self.mv, moments))
+
+        # the old distribution functions at the same point
+        f_old = [sp.IndexedBase("f", fe.base.shape)[fe.indices] for fe in fnew]
+        to_subs_old = list(zip(self.mv, self.moments(f_old)))
+
+        code = []
+        for k, (op, expr, dims, increment) in enumerate(self.reductions):
+            value = expr.subs(to_subs)
+            if increment:
+                value -= expr.subs(to_subs_old)
+            new = {
+                "sum": red[k] + value,
+                "l2": red[k] + value**2,
+                "max": sp.Max(red[k], value),
+                "min": sp.Min(red[k], value),
+            }[op]
+            if dims:
+                cond = sp.And(*[Eq(space[d], index[k, d]) for d in dims])
+                new = sp.Piecewise((new, cond), (red[k], True))
+            code.append(Eq(red[k], new))
         return code
 
     def one_time_step(self):
         """
         Return the code expression which  makes one time step of
         LBM algorithm on the whole inner domain.
+        """
+        space_index = self._get_space_idx_inner()
+        f = self._get_indexed_on_velocities("f", space_index, -self.all_velocities)
+        fnew = self._get_indexed_on_range("fnew", space_index)
+        return self._time_step_routine(space_index, f, fnew)
+
+    def _time_step_routine(self, space_index, f, fnew):
+        """
+        Return the code expression which makes one time step on the whole
+        inner domain where the distribution functions are read in f and
+        written in fnew.
+
+        Parameters
+        ----------
+
+        space_index : list
+            list of SymPy Idx of the inner domain
+
+        f : SymPy Matrix
+            indexed objects where the distributed functions are read
+
+        fnew : SymPy Matrix
+            indexed objects where the new distributed functions are written
+
         """
         m_local = self.settings.get("m_local", False)
         check_isfluid = self.settings.get("check_isfluid", False)
         split = self.settings.get("split", False)
 
-        space_index = self._get_space_idx_inner()
         if m_local:
             if split:
                 m = self._get_indexed_on_range("m", space_index)
@@ -568,33 +1058,206 @@ class BaseAlgorithm:
         if self.rel_vel_symb:
             local_vars.extend(self.rel_vel_symb)
 
-        f = self._get_indexed_on_velocities("f", space_index, -self.all_velocities)
-        fnew = self._get_indexed_on_range("fnew", space_index)
-
-        internal = self.one_time_step_local(f, fnew, m)
+        reads = []
+        if self.fused_bc:
+            reads, fpull = self._fused_pull(space_index, f)
+            local_vars.append(fpull)
+            internal = self.one_time_step_local(
+                sp.Matrix([fpull[k, 0] for k in range(self.ns)]), fnew, m
+            )
+        else:
+            internal = self.one_time_step_local(f, fnew, m)
 
         if check_isfluid:
             valin = sp.Symbol("valin", real=True)
             in_or_out = indexed(
                 "in_or_out", [nx, ny, nz], space_index, priority=self.sorder[1:]
             )
-            loop = lambda x: For(space_index, If((Eq(in_or_out, valin), x)))
+            loop = lambda x: For(
+                self._get_tiled_loop_idx(space_index), If((Eq(in_or_out, valin), x))
+            )
         else:
-            loop = lambda x: For(space_index, x)
+            loop = lambda x: For(self._get_tiled_loop_idx(space_index), x)
 
         if split:
             # code = [loop([*self.coords(), i]) for i in internal]
             code = [loop([i]) for i in internal]
         else:
             # code = loop([*self.coords(), *internal])
-            code = loop([*internal])
+            code = loop([*reads, *internal])
+
+        if self.tile_size is not None:
+            # the halos of the tiles are read by the pull
+            code = [self._tile_halo_update(), *(code if split else [code])]
+
+        settings = {"prefetch": [f[0]]}
+        if self.reductions:
+            # the accumulators of the reductions are shared:
+            # the loop can't be done by several threads
+            settings["threads"] = 0
 
         return {
             "code": code,
             "local_vars": local_vars + self.local_vars,
-            "settings": {"prefetch": [f[0]]},
+            "settings": settings,
         }
 
+    def _fused_pull(self, space_index, f):
+        """
+        Return the code which pulls the distribution functions in the local
+        array fpull and the local array.
+
+        The velocities which are boundary links of the point are computed
+        from the loads of the link (see
+        :py:class:`FusedLinks<pylbm.boundary.FusedLinks>`) instead of being
+        read in f.
+
+        Parameters
+        ----------
+
+        space_index : list
+            list of SymPy Idx of the inner domain
+
+        f : SymPy Matrix
+            indexed objects of the pull
+
+        """
+        nnode = sp.Symbol("bc_nnode", integer=True)
+        nlink = sp.Symbol("bc_nlink", integer=True)
+        node = indexed(
+            sp.Symbol("bc_node", integer=True),
+            [nx, ny, nz],
+            space_index,
+            priority=self.sorder[1:],
+        )
+        link = sp.IndexedBase(sp.Symbol("bc_link", integer=True), [nnode, self.ns])
+        load = sp.IndexedBase(
+            sp.Symbol("bc_load", integer=True), [nlink, 2, self.dim + 1]
+        )
+        weight = sp.IndexedBase("bc_weight", [nlink, 2])
+        if self.batch is None:
+            rhs = lambda j: sp.IndexedBase("bc_rhs", [nlink])[j]
+        else:
+            rhs = lambda j: sp.IndexedBase("bc_rhs", [nb, nlink])[self.batch, j]
+
+        fpull = sp.MatrixSymbol("fpull", self.ns, 1)
+        code = []
+        for k in range(self.ns):
+            j = link[node, k]
+            value = rhs(j)
+            for t in range(2):
+                fload = indexed(
+                    "f",
+                    [self.ns, nx, ny, nz],
+                    [load[j, t, d] for d in range(self.dim + 1)],
+                    priority=self.sorder,
+                    batch=self.batch,
+                )
+                value += weight[j, t] * fload
+            code.append(Eq(fpull[k, 0], sp.Piecewise((value, j >= 0), (f[k], True))))
+        return code, fpull
+
+    def time_step_name(self, parity):  # pylint: disable=unused-argument
+        """
+        Return the name of the kernel which makes the time step
+        from the layout of the given parity.
+        """
+        return "one_time_step"
+
+    def next_parity(self, parity):
+        """
+        Return the parity of the layout after a time step
+        from the layout of the given parity.
+        """
+        return parity
+
+    def layout_slots(self, parity):  # pylint: disable=unused-argument
+        """
+        Return the slots of the velocities in the layout of the given parity
+        (None for the natural layout).
+
+        The value of the velocity k at the point x is stored in the slot
+        slots[k] at the point x + v_k.
+        """
+        return None
+
+    def start_layout(self, f, parity):  # pylint: disable=unused-argument
+        """
+        Store the distribution functions in the layout where the next
+        time step starts and return the parity of this layout.
+
+        Parameters
+        ----------
+
+        f : Array
+            the distribution functions
+
+        parity : int
+            the parity of the current layout
+
+        """
+        return parity
+
+    def _move_layout(self, f, parity, restore):
+        """
+        Move the distribution functions from the natural layout to the
+        layout of the given parity or back if restore is True.
+
+        The values are shifted with numpy: the array is copied once.
+        The values in the ghost points are not relevant after this call.
+        """
+        slots = self.layout_slots(parity)
+        if slots is None:
+            return
+        axis = 0 if f.nbatch is None else 1
+        space_axes = tuple(range(axis, axis + self.dim))
+        values = f.swaparray.copy()
+        for k in range(self.ns):
+            natural = (slice(None),) * axis + (k,)
+            slot = (slice(None),) * axis + (int(slots[k]),)
+            if restore:
+                f.swaparray[natural] = np.roll(
+                    values[slot], tuple(-self.all_velocities[k]), axis=space_axes
+                )
+            else:
+                f.swaparray[slot] = np.roll(
+                    values[natural], tuple(self.all_velocities[k]), axis=space_axes
+                )
+
+    def store_layout(self, f, parity):
+        """
+        Move the distribution functions from the natural layout
+        to the layout of the given parity.
+
+        Parameters
+        ----------
+
+        f : Array
+            the distribution functions
+
+        parity : int
+            the parity of the layout
+
+        """
+        self._move_layout(f, parity, False)
+
+    def restore_layout(self, f, parity):
+        """
+        Move the distribution functions from the layout of the given parity
+        to the natural layout.
+
+        Parameters
+        ----------
+
+        f : Array
+            the distribution functions
+
+        parity : int
+            the parity of the layout
+
+        """
+        self._move_layout(f, parity, True)
+
     @monitor
     def generate(self):
         """
@@ -613,15 +1276,33 @@ class BaseAlgorithm:
         if self.source_eq:
             to_generate.append(self.source_term)
 
+        if self.consm:
+            to_generate.append(self.f2m_consm)
+
         for gen in to_generate:
-            name = gen.__name__
-            output = gen()
-            code = output["code"]
-            local_vars = output.get("local_vars", [])
-            settings = output.get("settings", {})
-            self.generator.add_routine(
-                (name, code), local_vars=local_vars, settings=settings
+            self._add_routine(gen)
+
+    def _add_routine(self, gen):
+        """
+        Add to the generator the routine defined by the method gen
+        (the name of the routine is the name of the method).
+        """
+        output = gen()
+        code = output["code"]
+        local_vars = output.get("local_vars", [])
+        settings = output.get("settings", {})
+        if self.optimize:
+            code, new_vars, flops = optimize(code, local_vars)
+            local_vars = local_vars + new_vars
+            self.flops[gen.__name__] = flops
+            log.info(
+                "%s: %d operations per node before the optimization, %d after",
+                gen.__name__,
+                *flops,
             )
+        self.generator.add_routine(
+            (gen.__name__, code), local_vars=local_vars, settings=settings
+        )
 
     def _get_args(self, simulation, m_user=None, f_user=None, **kwargs):
         """
@@ -649,6 +1330,11 @@ class BaseAlgorithm:
             f = simulation.container.F.array
         fnew = simulation.container.Fnew.array
 
+        # the reference of the compressed distribution functions
+        m_ref, f_ref = simulation.m_ref, simulation.f_ref
+
+        nb = mm.nbatch
+
         t = simulation.t
         dt = simulation.dt
 
@@ -659,6 +1345,13 @@ class BaseAlgorithm:
         extra = {str(k): v for k, v in simulation.extra_parameters.items()}
         if extra.get("lambda", None):
             extra["lambda_"] = extra["lambda"]
+        for k, v in simulation.ensemble.items():
+            extra[ensemble_name(k)] = v
+        extra.update(simulation._reductions.arguments())
+        extra.update(simulation.container.arguments())
+        if simulation.bc.fused is not None:
+            extra.update(simulation.bc.fused.arguments())
+        extra.update({"tile_" + a: s for a, s in self.tiles.items()})
         local.update(extra)
         return locals()
 
@@ -667,11 +1360,67 @@ class BaseAlgorithm:
     ):
         """
         Call the generated function.
+
+        Without user arrays and extra arguments, the call uses a plan
+        where the arguments are bound once (see :py:meth:`get_call`).
         """
         from ..symbolic import call_genfunction
 
+        if m_user is None and f_user is None and not kwargs:
+            self.get_call(function_name, simulation)(t=simulation.t)
+            return
+
         func = getattr(self.generator.module, function_name)
 
         args = self._get_args(simulation, m_user, f_user)
         args.update(kwargs)
         call_genfunction(func, args)
+
+    def call_tuned(self, function_name, simulation, **kwargs):
+        """
+        Call the generated function which computes nsteps time steps
+        (given by the argument nsteps, one by default).
+
+        While the sizes of the tiles are autotuned, each call uses the
+        next candidate and is timed. The fastest sizes are kept at the end.
+        """
+        tuner = self.tile_tuner
+        nsteps = kwargs.get("nsteps", 1)
+        if tuner is None or tuner.done:
+            self.call_function(function_name, simulation, **kwargs)
+            return
+
+        self.set_tiles(tuner.candidate)
+        start = time.perf_counter()
+        self.call_function(function_name, simulation, **kwargs)
+        tuner.record((time.perf_counter() - start) / nsteps)
+        if tuner.done:
+            self.set_tiles(tuner.best)
+            log.info("sizes of the tiles chosen by the autotuner: %s", self.tiles)
+
+    def get_call(self, function_name, simulation):
+        """
+        Return the call of the generated function with the arguments
+        of the simulation bound once.
+
+        The plans are cached and rebuilt only when the arrays of the
+        container are swapped or when the extra parameters change.
+        The time t can be given at each call.
+        """
+        from ..symbolic import GenFunctionCall
+
+        container = simulation.container
+        arrays = (container.F.array, container.Fnew.array, container.m.array)
+        key = (function_name,) + tuple(id(a) for a in arrays)
+        plan = self._calls.get(key, None)
+        # the plan keeps its arrays: an id reused by a new array is detected
+        if (
+            plan is None
+            or any(a is not b for a, b in zip(plan[0], arrays))
+            or not same_parameters(plan[1], simulation.extra_parameters)
+        ):
+            func = getattr(self.generator.module, function_name)
+            call = GenFunctionCall(func, self._get_args(simulation), dynamic=["t"])
+            plan = (arrays, dict(simulation.extra_parameters), call)
+            self._calls[key] = plan
+        return plan[2]
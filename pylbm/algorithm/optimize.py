@@ -0,0 +1,294 @@
+# Authors:
+#     Loic Gouarin <loic.gouarin@polytechnique.edu>
+#     Benjamin Graille <benjamin.graille@math.u-psud.fr>
+#
+# License: BSD 3 clause
+
+"""
+Optimization of the kernels
+===========================
+
+The loops of the kernels are rewritten before the code generation in
+order to reduce the number of operations made on each node:
+
+    - the values read in the arrays are loaded once in local scalars,
+    - each assignment gets its own local scalar (the moments written
+      several times in the chain f2m -> source terms -> relaxation ->
+      source terms -> m2f are renamed) so that the common subexpressions
+      are eliminated across the whole chain and not only inside one
+      expression,
+    - the subexpressions which only depend on the parameters are computed
+      once before the loops,
+    - the terms of a sum with the same numerical coefficient (the entries
+      of M and invM) are gathered to make only one multiplication.
+
+The products by the zero and by the unit entries of M and invM are already
+removed by SymPy when the kernels are built.
+
+The loops whose body is not only made of assignments of floating point
+values are left unchanged (for example the fused boundary conditions which
+compute integer indices).
+"""
+
+import itertools
+import sympy as sp
+from sympy import Eq
+from sympy.logic.boolalg import Boolean
+from sympy.matrices.expressions.matexpr import MatrixExpr, MatrixElement
+
+from ..generator import For, If
+
+
+def count_flops(expressions):
+    """
+    Return the number of operations of a list of expressions.
+
+    The operations made to compute the indices of the arrays are not counted.
+
+    Parameters
+    ----------
+
+    expressions : list
+        the SymPy expressions
+
+    """
+    flops = 0
+    for expr in expressions:
+        arrays = {a: sp.Dummy() for a in expr.atoms(sp.Indexed)}
+        flops += sp.count_ops(expr.xreplace(arrays))
+    return flops
+
+
+def optimize(code, local_vars):
+    """
+    Return the code of a routine where the loops are optimized.
+
+    Parameters
+    ----------
+
+    code : list or For
+        the code of the routine
+
+    local_vars : list
+        the local variables of the routine
+
+    Returns
+    -------
+
+    list
+        the optimized code
+
+    list
+        the new local variables
+
+    tuple
+        the number of operations per node before and after the optimization
+
+    """
+    count = itertools.count()
+
+    def symbol(prefix):
+        return sp.Symbol("%s%d_" % (prefix, next(count)), real=True)
+
+    statements = code if isinstance(code, list) else [code]
+    new_code, new_vars = [], []
+    before, after = 0, 0
+    for statement in statements:
+        output = None
+        if isinstance(statement, For):
+            output = _optimize_loop(statement, local_vars, symbol)
+        if output is None:
+            new_code.append(statement)
+            continue
+        hoisted, loop, variables, flops = output
+        new_code.extend(hoisted)
+        new_code.append(loop)
+        new_vars.extend(variables)
+        before += flops[0]
+        after += flops[1]
+    return new_code, new_vars, (before, after)
+
+
+def _optimize_loop(loop, local_vars, symbol):
+    """
+    Return the statements computed before the loop, the optimized loop,
+    its local variables and the number of operations per node before and
+    after the optimization or None if the loop can't be optimized.
+    """
+    body, cond = list(loop.body), None
+    # the loop over the fluid nodes only (setting check_isfluid)
+    if len(body) == 1 and isinstance(body[0], If) and len(body[0].statement) == 1:
+        cond, body = body[0].statement[0]
+    if not all(isinstance(s, sp.Equality) for s in body):
+        return None
+
+    assignments = []
+    for statement in body:
+        assignments.extend(_assignments(statement))
+
+    local = {v for v in local_vars if isinstance(v, sp.Symbol)}
+    local_arrays = {v for v in local_vars if isinstance(v, sp.MatrixSymbol)}
+
+    def is_local(target):
+        if isinstance(target, MatrixElement):
+            return target.parent in local_arrays
+        return target in local
+
+    for lhs, _ in assignments:
+        if not isinstance(lhs, (sp.Indexed, sp.Symbol, MatrixElement)):
+            return None
+        if lhs.is_integer:
+            return None
+
+    before = count_flops([rhs for _, rhs in assignments])
+    labels = sp.Tuple(*loop.target).free_symbols
+    stored = {lhs.base.label for lhs, _ in assignments if isinstance(lhs, sp.Indexed)}
+
+    # static single assignment form: the reads of the values written
+    # before in the loop are replaced by the local scalars
+    values, loads, invariants = {}, {}, {}
+    definitions, stores, written = [], {}, set()
+    for lhs, rhs in assignments:
+        rhs = rhs.xreplace(values)
+        for a in rhs.atoms(sp.Indexed):
+            if a.is_integer:
+                continue
+            if a.base.label in written:
+                # the value may have been overwritten by the loop
+                return None
+            if a in loads or a in invariants:
+                continue
+            if a.free_symbols & labels or a.base.label in stored:
+                loads[a] = symbol("ld")
+            else:
+                invariants[a] = symbol("p")
+        rhs = rhs.xreplace(loads).xreplace(invariants)
+        if not rhs.is_Atom:
+            definitions.append((symbol("t"), rhs))
+            rhs = definitions[-1][0]
+        values[lhs] = rhs
+        if not is_local(lhs):
+            if isinstance(lhs, sp.Indexed):
+                written.add(lhs.base.label)
+            # the stores are made in the order of the last writes
+            stores.pop(lhs, None)
+            stores[lhs] = rhs
+
+    # a value loaded in an array can't be stored in the same array
+    # since the load may be a view with the numpy generator
+    for lhs, rhs in stores.items():
+        load = {s: a for a, s in loads.items()}.get(rhs, None)
+        if load is not None and load != lhs and load.base.label in stored:
+            return None
+
+    # the subexpressions of the parameters are computed before the loop
+    varying = labels | local | set(loads.values())
+    varying |= {s for s, _ in definitions}
+
+    def hoist(expr):
+        if expr.is_Atom or isinstance(expr, MatrixElement):
+            return expr
+        symbols = expr.free_symbols
+        if (
+            isinstance(expr, sp.Expr)
+            and symbols
+            and not symbols & varying
+            and not expr.is_integer
+            and not expr.has(sp.Indexed, sp.Idx)
+        ):
+            if expr not in invariants:
+                invariants[expr] = symbol("p")
+            return invariants[expr]
+        args = [hoist(a) for a in expr.args]
+        if all(a is b for a, b in zip(args, expr.args)):
+            return expr
+        return expr.func(*args)
+
+    definitions = [(s, hoist(rhs)) for s, rhs in definitions]
+
+    # the common subexpressions of the whole loop body
+    names = (symbol("x") for _ in itertools.count())
+    common, reduced = sp.cse([rhs for _, rhs in definitions], names, ignore=labels)
+    # only the floating point values are stored in the local scalars
+    subs, kept = {}, {}
+    for s, expr in common:
+        expr = expr.xreplace(subs)
+        if isinstance(expr, Boolean) or expr.is_integer:
+            subs[s] = expr
+        else:
+            kept[s] = expr
+    reduced = [expr.xreplace(subs) for expr in reduced]
+
+    new_body = [Eq(s, a, evaluate=False) for a, s in loads.items()]
+
+    def require(expr):
+        # the common subexpressions are computed before their first use
+        for s in [s for s in kept if s in expr.free_symbols]:
+            if s in kept:
+                value = kept.pop(s)
+                require(value)
+                new_body.append(Eq(s, _gather(value), evaluate=False))
+
+    for (s, _), expr in zip(definitions, reduced):
+        require(expr)
+        new_body.append(Eq(s, _gather(expr), evaluate=False))
+    local_scalars = [e.lhs for e in new_body]
+    new_body.extend(Eq(lhs, rhs, evaluate=False) for lhs, rhs in stores.items())
+
+    after = count_flops([e.rhs for e in new_body])
+    hoisted = [Eq(s, _gather(expr), evaluate=False) for expr, s in invariants.items()]
+    if cond is not None:
+        new_body = [If((cond, new_body))]
+    return (
+        hoisted,
+        For(loop.target, new_body),
+        list(invariants.values()) + local_scalars,
+        (before, after),
+    )
+
+
+def _assignments(statement):
+    """
+    Return the scalar assignments (lhs, rhs) made by an equality
+    between matrices or scalars.
+    """
+    lhs, rhs = statement.lhs, statement.rhs
+    if isinstance(lhs, (sp.MatrixBase, MatrixExpr)):
+        lhs, rhs = [
+            sp.Matrix(e.as_explicit() if isinstance(e, MatrixExpr) else e)
+            for e in (lhs, rhs)
+        ]
+        return list(zip(lhs, rhs))
+    return [(lhs, rhs)]
+
+
+def _gather(expr):
+    """
+    Return the expression where the terms of the sums with the same
+    numerical coefficient (up to the sign) are gathered.
+    """
+    if expr.is_Atom or not expr.args:
+        return expr
+    args = [_gather(a) for a in expr.args]
+    groups = {}
+    if expr.is_Add:
+        for term in args:
+            coeff, rest = term.as_coeff_Mul()
+            groups.setdefault(abs(coeff), []).append((term, sp.sign(coeff) * rest))
+    if any(coeff != 1 and len(g) > 1 for coeff, g in groups.items()):
+        terms = []
+        for coeff, group in groups.items():
+            if coeff == 1 or len(group) == 1:
+                terms.extend(term for term, _ in group)
+            else:
+                # the sums are not evaluated: SymPy would distribute
+                # the coefficient over the terms again
+                terms.append(
+                    sp.Mul(coeff, sp.Add(*[r for _, r in group]), evaluate=False)
+                )
+        return sp.Add(*terms, evaluate=False)
+    if all(a is b for a, b in zip(args, expr.args)):
+        return expr
+    if expr.is_Add or expr.is_Mul or expr.is_Pow:
+        return expr.func(*args, evaluate=False)
+    return expr.func(*args)
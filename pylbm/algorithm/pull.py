@@ -56,4 +56,7 @@ class PullAlgorithm(BaseAlgorithm):
 
         code.append(self.m2f_local(m, fnew, with_rel_velocity))
 
+        if self.reductions:
+            code.extend(self.reductions_local(m, fnew))
+
         return code
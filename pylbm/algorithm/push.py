@@ -0,0 +1,88 @@
+# Authors:
+#     Loic Gouarin <loic.gouarin@polytechnique.edu>
+#     Benjamin Graille <benjamin.graille@math.u-psud.fr>
+#
+# License: BSD 3 clause
+
+"""
+Push algorithm
+==============
+
+The collision is made with the values stored at the point x and the new
+value of the velocity k is scattered to the point x + v_k:
+
+    fnew[k, x + v_k] = f_k(x)
+
+After a time step, the value of the velocity k at the point x is then
+stored in its own slot at x + v_k: this is the layout given by
+:py:meth:`layout_slots<pylbm.algorithm.PushAlgorithm.layout_slots>`.
+The values which leave the inner domain are in the ghost points and the
+boundary conditions store their values in the inner points (see
+:py:meth:`update_layout<pylbm.storage.Array.update_layout>` and the argument
+slots of :py:meth:`update<pylbm.boundary.BoundaryMethod.update>`).
+"""
+
+import sys
+import logging
+import numpy as np
+
+from .pull import PullAlgorithm
+
+log = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+class PushAlgorithm(PullAlgorithm):
+    """
+    LBM algorithm with a push scheme: the collision and the scattering
+    to the neighbors are made in one kernel.
+
+    The local kernel is the one of the pull algorithm, only the indices
+    of the distribution functions differ.
+    """
+
+    natural_layout = False
+
+    def __init__(self, scheme, sorder, generator, settings=None, **kwargs):
+        super().__init__(scheme, sorder, generator, settings, **kwargs)
+
+        if generator.backend == "LOOPY":
+            log.error(
+                "Solution: the push algorithm can't be used with the loopy generator\n"
+            )
+            sys.exit()
+        if self.reductions:
+            log.error(
+                "Solution: the reductions can't be used with the push algorithm\n"
+            )
+            sys.exit()
+
+    def one_time_step(self):
+        """
+        Return the code expression which makes one time step
+        on the whole inner domain.
+        """
+        space_index = self._get_space_idx_inner()
+        f = self._get_indexed_on_range("f", space_index)
+        fnew = self._get_indexed_on_velocities("fnew", space_index, self.all_velocities)
+        return self._time_step_routine(space_index, f, fnew)
+
+    def next_parity(self, parity):
+        """
+        A time step always leaves the distribution functions
+        in the streamed layout.
+        """
+        return 1
+
+    def layout_slots(self, parity):
+        """
+        In the streamed layout, each velocity stays in its own slot.
+        """
+        return np.arange(self.ns) if parity else None
+
+    def start_layout(self, f, parity):
+        """
+        The time steps start from the streamed layout.
+        """
+        if not parity:
+            self.store_layout(f, 1)
+        return 1
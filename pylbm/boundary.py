@@ -8,6 +8,7 @@
 Module for LBM boundary conditions
 """
 
+import sys
 import collections
 import logging
 import types
@@ -72,10 +73,30 @@ class Boundary:
         list of boundary methods used in the LBM scheme
         The list contains Boundary_method instance.
 
+    nbatch : int
+        the number of ensemble members (default is None)
+
+    dtype : numpy dtype
+        the type of the distribution functions (default is numpy.double)
+
+    f_ref : ndarray
+        the reference of the distribution functions when they are stored
+        as deviations from a reference (default is None)
+
+    fused : FusedLinks
+        the boundary links resolved in the time step kernel
+        (None if the boundary conditions are not fused)
+
+    prepass : list
+        the boundary methods applied before the time step
+        (all the methods if the boundary conditions are not fused)
+
     """
 
     # pylint: disable=too-many-locals
-    def __init__(self, domain, generator, dico):
+    def __init__(
+        self, domain, generator, dico, nbatch=None, dtype=np.double, f_ref=None
+    ):
         self.domain = domain
 
         # build the list of indices for each unique velocity and for each label
@@ -145,19 +166,197 @@ class Boundary:
         # for each method create the instance associated
         self.methods = []
         for k in list(istore.keys()):
-            self.methods.append(
-                k(
-                    istore[k],
-                    ilabel[k],
-                    distance[k],
-                    normal[k],
-                    stencil,
-                    value_bc,
-                    time_bc,
-                    domain.distance.shape,
-                    generator,
-                )
+            method = k(
+                istore[k],
+                ilabel[k],
+                distance[k],
+                normal[k],
+                stencil,
+                value_bc,
+                time_bc,
+                domain.distance.shape,
+                generator,
+                dtype,
             )
+            method.nbatch = nbatch
+            method.f_ref = f_ref
+            self.methods.append(method)
+
+        self.fused = None
+        self.prepass = list(self.methods)
+
+    def fuse(self, in_or_out, valin):
+        """
+        Resolve the boundary links in the time step kernel when possible
+        (see :py:class:`FusedLinks<pylbm.boundary.FusedLinks>`).
+
+        Must be called after the set_iload of each method.
+
+        Parameters
+        ----------
+        in_or_out : ndarray
+            the flags of the points of the domain with the ghost points
+        valin : int
+            the value of the flag of the fluid points
+
+        """
+        self.fused = FusedLinks(self.methods, self.domain.stencil, in_or_out, valin)
+        self.prepass = [m for m in self.methods if m not in self.fused.methods]
+        log.info(
+            "boundary methods fused in the time step: %d/%d",
+            len(self.fused.methods),
+            len(self.methods),
+        )
+
+
+class FusedLinks:
+    """
+    Boundary links resolved during the pull of the time step kernel.
+
+    Without fusion, each boundary method writes the distribution functions
+    of its links in the ghost points before the time step and the pull
+    reads them back. When the links are fused, the pull of the velocity k
+    at a point x computes the value of the link instead of reading
+    f[k, x - v_k]:
+
+        f_k(x - v_k) = w_0 f(l_0) + w_1 f(l_1) + rhs
+
+    where the weights and the loads are given by the method
+    (see :py:meth:`link_weights<pylbm.boundary.BoundaryMethod.link_weights>`).
+
+    A method is fused if all its loads are fluid points, which are never
+    written by a boundary method, and if its links are not loaded by a
+    method of the pre-pass. The other methods are still applied before
+    the time step so that the result doesn't change. The ghost points
+    of the fused links are not updated anymore.
+
+    Parameters
+    ----------
+    methods : list
+        the boundary methods after their set_iload
+    stencil : Stencil
+        the stencil of the scheme
+    in_or_out : ndarray
+        the flags of the points of the domain with the ghost points
+    valin : int
+        the value of the flag of the fluid points
+
+    Attributes
+    ----------
+    methods : list
+        the fused methods
+    node : ndarray
+        the row of each point in link (0 for the points without fused link)
+    link : ndarray
+        the index of the link of each velocity at each point with fused
+        links (-1 if the velocity is not a link), the first row is for
+        the points without fused link
+    load : ndarray
+        the velocity and the space indices of the two loads of each link
+    weight : ndarray
+        the weights of the two loads of each link
+    rhs : ndarray
+        the constant term of each link (computed by update)
+
+    """
+
+    def __init__(self, methods, stencil, in_or_out, valin):
+        ns = int(stencil.nv_ptr[-1])
+        dim = in_or_out.ndim
+        fluid = np.ravel(in_or_out == valin)
+        v = stencil.get_all_velocities()
+
+        def flat(index):
+            # the flat index of the point in the arrays without velocity
+            return np.ravel_multi_index(tuple(index[1:]), in_or_out.shape)
+
+        def loads(method):
+            # the flat index of the distribution functions which are loaded
+            return np.concatenate([i[0] * fluid.size + flat(i) for i in method.iload])
+
+        weights = [m.link_weights() for m in methods]
+        stored = [m.istore[0] * fluid.size + flat(m.istore) for m in methods]
+        # the loads of the fused methods must be fluid points
+        fused = [
+            w is not None and np.all(fluid[loads(m) % fluid.size])
+            for m, w in zip(methods, weights)
+        ]
+        # and their links must not be loaded by the pre-pass
+        changed = True
+        while changed:
+            prepass = [loads(m) for m, f in zip(methods, fused) if not f]
+            prepass = np.concatenate(prepass) if prepass else np.empty(0, dtype=int)
+            changed = False
+            for i, store in enumerate(stored):
+                if fused[i] and np.any(np.isin(store, prepass)):
+                    fused[i], changed = False, True
+
+        self.methods = [m for m, f in zip(methods, fused) if f]
+        weights = [w for w, f in zip(weights, fused) if f]
+
+        ncond = [m.istore.shape[1] for m in self.methods]
+        nlink = sum(ncond)
+        self.load = np.empty((nlink, 2, dim + 1), dtype=np.int32)
+        self.weight = np.zeros((nlink, 2))
+        self._slices, start = [], 0
+        for method, weight, n in zip(self.methods, weights, ncond):
+            links = slice(start, start + n)
+            for t in range(2):
+                # a method with one load uses it twice with a zero weight
+                i = min(t, len(weight) - 1)
+                self.load[links, t] = method.iload[i].T
+                if t < len(weight):
+                    self.weight[links, t] = weight[t]
+            self._slices.append(links)
+            start += n
+
+        # the inner point x = y + v_k which pulls the link of the
+        # velocity k stored at the outer point y
+        istore = np.concatenate(
+            [np.empty((dim + 1, 0), dtype=np.int32)] + [m.istore for m in self.methods],
+            axis=1,
+        )
+        velocity = istore[0]
+        points = flat(np.vstack([velocity, istore[1:] + v[velocity].T]))
+        points, row = np.unique(points, return_inverse=True)
+        self.node = np.zeros(in_or_out.shape, dtype=np.int32)
+        self.node.flat[points] = np.arange(1, points.size + 1)
+        self.link = -np.ones((points.size + 1, ns), dtype=np.int32)
+        self.link[row + 1, velocity] = np.arange(nlink)
+        self._velocity = velocity
+
+        nbatch = methods[0].nbatch if methods else None
+        self.rhs = np.zeros((nbatch, nlink) if nbatch is not None else nlink)
+
+    def update(self):
+        """
+        Compute the constant terms of the links from the rhs of the methods.
+
+        With a reference, the terms of the reference of the loads and of
+        the links are added.
+        """
+        for method, links in zip(self.methods, self._slices):
+            self.rhs[..., links] = method.rhs
+            f_ref = method.f_ref
+            if f_ref is not None:
+                self.rhs[..., links] += (
+                    np.sum(self.weight[links] * f_ref[self.load[links, :, 0]], axis=1)
+                    - f_ref[self._velocity[links]]
+                )
+
+    def arguments(self):
+        """
+        Return the arrays used by the generated code.
+        """
+        return {
+            "bc_node": self.node,
+            "bc_link": self.link,
+            "bc_load": self.load,
+            "bc_weight": self.weight,
+            "bc_rhs": self.rhs,
+            "bc_nnode": self.link.shape[0],
+            "bc_nlink": self.load.shape[0],
+        }
 
 
 # pylint: disable=protected-access
@@ -185,6 +384,15 @@ class BoundaryMethod:
         indices of points needed to compute the boundary condition
     value_bc : dictionnary
        the prescribed values on the border
+    nbatch : int
+        the number of ensemble members: feq and rhs have an additional
+        first axis and the generated code loops over the members
+    f_ref : ndarray
+        the reference of the distribution functions: the arrays store the
+        deviations from f_ref and the generated code adds it to the loaded
+        values (None without reference)
+
+    The arrays feq and rhs have the type of the distribution functions.
 
     """
 
@@ -199,10 +407,11 @@ class BoundaryMethod:
         time_bc,
         nspace,
         generator,
+        dtype=np.double,
     ):
         self.istore = istore
-        self.feq = np.zeros((stencil.nv_ptr[-1], istore.shape[1]))
-        self.rhs = np.zeros(istore.shape[1])
+        self.feq = np.zeros((stencil.nv_ptr[-1], istore.shape[1]), dtype=dtype)
+        self.rhs = np.zeros(istore.shape[1], dtype=dtype)
         self.ilabel = ilabel
         self.distance = distance
         self.normal = normal
@@ -215,6 +424,8 @@ class BoundaryMethod:
         self.iload = []
         self.nspace = nspace
         self.generator = generator
+        self.nbatch = None
+        self.f_ref = None
 
         # used if time boundary
         self.func = []
@@ -223,6 +434,11 @@ class BoundaryMethod:
         self.m = []
         self.indices = []
 
+        # bound calls of the generated function
+        self._calls = {}
+        # the indices in another layout than the natural one
+        self._indices_layout = None
+
     def fix_iload(self):
         """
         Transpose iload and istore.
@@ -233,6 +449,75 @@ class BoundaryMethod:
         for i in range(len(self.iload)):
             self.iload[i] = np.ascontiguousarray(self.iload[i].T, dtype=np.int32)
         self.istore = np.ascontiguousarray(self.istore.T, dtype=np.int32)
+        self._calls = {}
+        self._indices_layout = None
+
+    def set_nodes(self, lattice):
+        """
+        Replace the space indices of istore and iload by their indices
+        in the arrays when only a part of the domain is stored (see
+        :py:class:`SparseLattice<pylbm.container.SparseLattice>` and
+        :py:class:`TiledLattice<pylbm.container.TiledLattice>`).
+
+        Parameters
+        ----------
+        lattice : SparseLattice or TiledLattice
+            the stored points of the domain
+
+        """
+
+        def nodes(indices):
+            node = lattice.slots(indices[1:])
+            if np.any(node < 0):
+                log.error(
+                    "Solution: the boundary condition %s uses points "
+                    "which are not stored\n",
+                    type(self).__name__,
+                )
+                sys.exit()
+            return np.concatenate([indices[:1], node])
+
+        self.istore = nodes(self.istore)
+        self.iload = [nodes(iload) for iload in self.iload]
+
+    def _get_indices(self, slots):
+        """
+        Return istore and the list of iload for the layout of the
+        distribution functions given by slots.
+
+        The value of the velocity k at the point x is stored in the slot
+        slots[k] at the point x + v_k (see
+        :py:meth:`layout_slots<pylbm.algorithm.BaseAlgorithm.layout_slots>`),
+        the natural layout is used if slots is None.
+        """
+        if slots is None:
+            return self.istore, self.iload
+
+        key = slots.tobytes()
+        if self._indices_layout is None or self._indices_layout[0] != key:
+            v = self.stencil.get_all_velocities()
+
+            def move(index):
+                k = index[:, 0]
+                out = np.empty_like(index)
+                out[:, 0] = slots[k]
+                out[:, 1:] = index[:, 1:] + v[k]
+                return out
+
+            self._indices_layout = (
+                key,
+                move(self.istore),
+                [move(i) for i in self.iload],
+            )
+        return self._indices_layout[1:]
+
+    def link_weights(self):
+        """
+        Return the weights of the loads of iload when the value of a link
+        is the affine combination of its loads plus rhs
+        (None if the method can't be fused in the time step).
+        """
+        return None
 
     # pylint: disable=too-many-locals
     def prepare_rhs(self, simulation):
@@ -253,6 +538,13 @@ class BoundaryMethod:
 
         gpu_support = simulation.container.gpu_support
 
+        if self.nbatch is not None:
+            ncond = self.istore.shape[1]
+            self.feq = np.zeros(
+                (self.nbatch, self.stencil.nv_ptr[-1], ncond), dtype=self.feq.dtype
+            )
+            self.rhs = np.zeros((self.nbatch, ncond), dtype=self.rhs.dtype)
+
         for key, value in self.value_bc.items():
             if value is not None:
                 indices = np.where(self.ilabel == key)
@@ -266,17 +558,33 @@ class BoundaryMethod:
                     x = simulation.domain.coords_halo[i][self.istore[i + 1, indices]]
                     x += s * v[k, i] * simulation.domain.dx
                     x = x.ravel()
-                    for j in range(
-                        1, simulation.domain.dim
-                    ):  # pylint: disable=unused-variable
+                    for j in range(1, len(nspace)):  # pylint: disable=unused-variable
                         x = x[:, np.newaxis]
                     coords += (x,)
 
-                m = Array(nv, nspace, 0, sorder, gpu_support=gpu_support)
+                m = Array(
+                    nv,
+                    nspace,
+                    0,
+                    sorder,
+                    dtype=self.feq.dtype,
+                    gpu_support=gpu_support,
+                    nbatch=self.nbatch,
+                )
                 m.set_conserved_moments(simulation.scheme.consm)
 
-                f = Array(nv, nspace, 0, sorder, gpu_support=gpu_support)
+                f = Array(
+                    nv,
+                    nspace,
+                    0,
+                    sorder,
+                    dtype=self.feq.dtype,
+                    gpu_support=gpu_support,
+                    nbatch=self.nbatch,
+                )
                 f.set_conserved_moments(simulation.scheme.consm)
+                if self.f_ref is not None:
+                    f.set_reference(self.f_ref)
 
                 args = coords
                 if isinstance(value, types.FunctionType):
@@ -296,7 +604,9 @@ class BoundaryMethod:
                 if self.generator.backend.upper() == "LOOPY":
                     f.array_cpu[...] = f.array.get()
 
-                self.feq[:, indices[0]] = f.swaparray.reshape((nv, indices[0].size))
+                self.feq[..., indices[0]] = f[...].reshape(
+                    self.feq[..., indices[0]].shape
+                )
 
                 if self.time_bc[key]:
                     self.func.append(func)
@@ -307,7 +617,6 @@ class BoundaryMethod:
 
     def update_feq(self, simulation):
         t = simulation.t
-        nv = simulation.container.nv
 
         for i in range(len(self.func)):
             self.func[i](self.f[i], self.m[i], t, *self.args[i])
@@ -317,8 +626,8 @@ class BoundaryMethod:
             if self.generator.backend.upper() == "LOOPY":
                 self.f[i].array_cpu[...] = self.f[i].array.get()
 
-            self.feq[:, self.indices[i]] = self.f[i].swaparray.reshape(
-                (nv, self.indices[i].size)
+            self.feq[..., self.indices[i]] = self.f[i][...].reshape(
+                self.feq[..., self.indices[i]].shape
             )
 
     def _get_istore_iload_symb(self, dim):
@@ -339,7 +648,36 @@ class BoundaryMethod:
         dist = IndexedBase("dist", [ncond])
         return rhs, dist
 
-    def update(self, ff, **kwargs):
+    def _get_batch_symb(self, idx):
+        """
+        Return the index of the ensemble members (None without ensemble),
+        the indices of the loops and the index of rhs.
+        """
+        from .symbolic import batch_idx
+
+        if self.nbatch is None:
+            return None, idx, idx
+        batch = batch_idx()
+        return batch, [batch, idx], (batch, idx)
+
+    def _get_ref_symb(self, index, idx):
+        """
+        Return the reference of the distribution function of the velocity
+        index[idx, 0] (0 without reference).
+        """
+        if self.f_ref is None:
+            return 0
+        f_ref = IndexedBase("f_ref", [int(self.stencil.nv_ptr[-1])])
+        return f_ref[index[idx, 0]]
+
+    def _get_rhs_symb(self, ncond):
+        from .symbolic import nb
+
+        if self.nbatch is None:
+            return IndexedBase("rhs", [ncond])
+        return IndexedBase("rhs", [nb, ncond])
+
+    def update(self, ff, slots=None, **kwargs):
         """
         Update distribution functions with this boundary condition.
 
@@ -348,33 +686,55 @@ class BoundaryMethod:
 
         ff : array
             The distribution functions
+        slots : ndarray
+            the slots of the velocities when the distribution functions
+            are not stored in the natural layout (default is None)
         """
-        from .symbolic import call_genfunction
-
-        args = self._get_args(ff)
-        args.update(kwargs)
-        call_genfunction(self.function, args)  # pylint: disable=no-member
-
-    # pylint: disable=possibly-unused-variable
-    def _get_args(self, ff):
-        dim = len(ff.nspace)
-        nx = ff.nspace[0]
-        if dim > 1:
-            ny = ff.nspace[1]
-        if dim > 2:
-            nz = ff.nspace[2]
-
-        f = ff.array
+        from .symbolic import call_genfunction, GenFunctionCall
+
+        if kwargs:
+            args = self._get_args(ff, slots)
+            args.update(kwargs)
+            call_genfunction(self.function, args)  # pylint: disable=no-member
+            return
+
+        # the arguments are bound once for each array of distribution functions
+        key = (id(ff.array), None if slots is None else slots.tobytes())
+        plan = self._calls.get(key, None)
+        # the plan keeps its array: an id reused by a new array is detected
+        if plan is None or plan[0] is not ff.array:
+            call = GenFunctionCall(
+                self.function, self._get_args(ff, slots)  # pylint: disable=no-member
+            )
+            plan = (ff.array, call)
+            self._calls[key] = plan
+        self._prepare_call(ff)
+        plan[1]()
 
-        for i in range(len(self.iload)):
-            exec("iload{i} = self.iload[{i}]".format(i=i))  # pylint: disable=exec-used
+    def _prepare_call(self, ff):
+        """
+        Update the arrays bound to the generated function before each call.
+        """
 
-        istore = self.istore
-        rhs = self.rhs
+    def _get_args(self, ff, slots=None):
+        istore, iloads = self._get_indices(slots)
+        args = {
+            "f": ff.array,
+            "istore": istore,
+            "rhs": self.rhs,
+            "ncond": istore.shape[0],
+        }
+        for n, size in zip(["nx", "ny", "nz"], ff.nspace):
+            args[n] = size
+        if self.nbatch is not None:
+            args["nb"] = self.nbatch
+        for i, iload in enumerate(iloads):
+            args["iload{}".format(i)] = iload
         if hasattr(self, "s"):
-            dist = self.s
-        ncond = istore.shape[0]
-        return locals()
+            args["dist"] = self.s
+        if self.f_ref is not None:
+            args["f_ref"] = self.f_ref
+        return args
 
     def move2gpu(self):
         """
@@ -396,6 +756,7 @@ class BoundaryMethod:
             self.istore = cl.array.to_device(queue, self.istore)
             for i in range(len(self.iload)):
                 self.iload[i] = cl.array.to_device(queue, self.iload[i])
+            self._calls = {}
 
 
 class BounceBack(BoundaryMethod):
@@ -409,6 +770,8 @@ class BounceBack(BoundaryMethod):
 
     """
 
+    name = "bounce_back"
+
     def set_iload(self):
         """
         Compute the indices that are needed (symmertic velocities and space indices).
@@ -419,13 +782,21 @@ class BounceBack(BoundaryMethod):
         indices = self.istore[1:] + v[k].T
         self.iload.append(np.concatenate([ksym, indices]))
 
+    def link_weights(self):
+        """
+        Return the weights of the loads of iload.
+        """
+        return [np.ones(self.istore.shape[1])]
+
     def set_rhs(self):
         """
         Compute and set the additional terms to fix the boundary values.
         """
         k = self.istore[:, 0]
         ksym = self.stencil.get_symmetric()[k]
-        self.rhs[:] = self.feq[k, np.arange(k.size)] - self.feq[ksym, np.arange(k.size)]
+        self.rhs[:] = (
+            self.feq[..., k, np.arange(k.size)] - self.feq[..., ksym, np.arange(k.size)]
+        )
 
     # pylint: disable=too-many-locals
     def generate(self, sorder):
@@ -441,27 +812,33 @@ class BounceBack(BoundaryMethod):
         from .symbolic import nx, ny, nz, indexed, ix
 
         ns = int(self.stencil.nv_ptr[-1])
-        dim = self.stencil.dim
+        dim = len(sorder) - 1
 
         istore, iload, ncond = self._get_istore_iload_symb(dim)
-        rhs, _ = self._get_rhs_dist_symb(ncond)
+        rhs = self._get_rhs_symb(ncond)
 
         idx = Idx(ix, (0, ncond))
+        batch, loop, irhs = self._get_batch_symb(idx)
         fstore = indexed(
             "f",
             [ns, nx, ny, nz],
             index=[istore[idx, k] for k in range(dim + 1)],
             priority=sorder,
+            batch=batch,
         )
         fload = indexed(
             "f",
             [ns, nx, ny, nz],
             index=[iload[0][idx, k] for k in range(dim + 1)],
             priority=sorder,
+            batch=batch,
         )
 
+        # the values are decoded and encoded with the reference
+        fload += self._get_ref_symb(iload[0], idx)
+        fref = self._get_ref_symb(istore, idx)
         self.generator.add_routine(
-            ("bounce_back", For(idx, Eq(fstore, fload + rhs[idx])))
+            (self.name, For(loop, Eq(fstore, fload + rhs[irhs] - fref)))
         )
 
     @property
@@ -481,6 +858,8 @@ class BouzidiBounceBack(BoundaryMethod):
 
     """
 
+    name = "Bouzidi_bounce_back"
+
     def __init__(
         self,
         istore,
@@ -492,6 +871,7 @@ class BouzidiBounceBack(BoundaryMethod):
         time_bc,
         nspace,
         generator,
+        dtype=np.double,
     ):
         super(BouzidiBounceBack, self).__init__(
             istore,
@@ -503,8 +883,10 @@ class BouzidiBounceBack(BoundaryMethod):
             time_bc,
             nspace,
             generator,
+            dtype,
         )
         self.s = np.empty(self.istore.shape[1])
+        self._fcopy = None
 
     def set_iload(self):
         """
@@ -534,30 +916,27 @@ class BouzidiBounceBack(BoundaryMethod):
         self.iload.append(iload1)
         self.iload.append(iload2)
 
-    def _get_args(self, ff):
-        dim = len(ff.nspace)
-        nx = ff.nspace[0]
-        if dim > 1:
-            ny = ff.nspace[1]
-        if dim > 2:
-            nz = ff.nspace[2]
+    def link_weights(self):
+        """
+        Return the weights of the loads of iload.
+        """
+        return [self.s, 1 - self.s]
+
+    def _prepare_call(self, ff):
+        self._fcopy[...] = ff.array
 
-        f = ff.array
+    def _get_args(self, ff, slots=None):
+        args = super(BouzidiBounceBack, self)._get_args(ff, slots)
         # FIXME: needed to have the same results between numpy and cython
         # That means that there are dependencies between the rhs and the lhs
         # during the loop over the boundary elements
         # check why (to test it use air_conditioning example)
-        fcopy = ff.array.copy()
-
-        for i in range(len(self.iload)):
-            exec("iload{i} = self.iload[{i}]".format(i=i))  # pylint: disable=exec-used
-
-        istore = self.istore
-        rhs = self.rhs
-        if hasattr(self, "s"):
-            dist = self.s
-        ncond = istore.shape[0]
-        return locals()
+        if self._fcopy is None or self._fcopy.shape != ff.array.shape:
+            self._fcopy = ff.array.copy()
+        else:
+            self._fcopy[...] = ff.array
+        args["fcopy"] = self._fcopy
+        return args
 
     def set_rhs(self):
         """
@@ -565,7 +944,9 @@ class BouzidiBounceBack(BoundaryMethod):
         """
         k = self.istore[:, 0]
         ksym = self.stencil.get_symmetric()[k]
-        self.rhs[:] = self.feq[k, np.arange(k.size)] - self.feq[ksym, np.arange(k.size)]
+        self.rhs[:] = (
+            self.feq[..., k, np.arange(k.size)] - self.feq[..., ksym, np.arange(k.size)]
+        )
 
     # pylint: disable=too-many-locals
     def generate(self, sorder):
@@ -581,38 +962,51 @@ class BouzidiBounceBack(BoundaryMethod):
         from .symbolic import nx, ny, nz, indexed, ix
 
         ns = int(self.stencil.nv_ptr[-1])
-        dim = self.stencil.dim
+        dim = len(sorder) - 1
 
         istore, iload, ncond = self._get_istore_iload_symb(dim)
-        rhs, dist = self._get_rhs_dist_symb(ncond)
+        _, dist = self._get_rhs_dist_symb(ncond)
+        rhs = self._get_rhs_symb(ncond)
 
         idx = Idx(ix, (0, ncond))
+        batch, loop, irhs = self._get_batch_symb(idx)
         fstore = indexed(
             "f",
             [ns, nx, ny, nz],
             index=[istore[idx, k] for k in range(dim + 1)],
             priority=sorder,
+            batch=batch,
         )
         fload0 = indexed(
             "fcopy",
             [ns, nx, ny, nz],
             index=[iload[0][idx, k] for k in range(dim + 1)],
             priority=sorder,
+            batch=batch,
         )
         fload1 = indexed(
             "fcopy",
             [ns, nx, ny, nz],
             index=[iload[1][idx, k] for k in range(dim + 1)],
             priority=sorder,
+            batch=batch,
         )
 
+        # the values are decoded and encoded with the reference
+        fload0 += self._get_ref_symb(iload[0], idx)
+        fload1 += self._get_ref_symb(iload[1], idx)
+        fref = self._get_ref_symb(istore, idx)
         self.generator.add_routine(
             (
-                "Bouzidi_bounce_back",
+                self.name,
                 For(
-                    idx,
+                    loop,
                     Eq(
-                        fstore, dist[idx] * fload0 + (1 - dist[idx]) * fload1 + rhs[idx]
+                        fstore,
+                        dist[idx] * fload0
+                        + (1 - dist[idx]) * fload1
+                        + rhs[irhs]
+                        - fref,
                     ),
                 ),
             )
@@ -635,13 +1029,23 @@ class AntiBounceBack(BounceBack):
 
     """
 
+    name = "anti_bounce_back"
+
+    def link_weights(self):
+        """
+        Return the weights of the loads of iload.
+        """
+        return [-np.ones(self.istore.shape[1])]
+
     def set_rhs(self):
         """
         Compute and set the additional terms to fix the boundary values.
         """
         k = self.istore[:, 0]
         ksym = self.stencil.get_symmetric()[k]
-        self.rhs[:] = self.feq[k, np.arange(k.size)] + self.feq[ksym, np.arange(k.size)]
+        self.rhs[:] = (
+            self.feq[..., k, np.arange(k.size)] + self.feq[..., ksym, np.arange(k.size)]
+        )
 
     # pylint: disable=too-many-locals
     def generate(self, sorder):
@@ -657,27 +1061,33 @@ class AntiBounceBack(BounceBack):
         from .symbolic import nx, ny, nz, indexed, ix
 
         ns = int(self.stencil.nv_ptr[-1])
-        dim = self.stencil.dim
+        dim = len(sorder) - 1
 
         istore, iload, ncond = self._get_istore_iload_symb(dim)
-        rhs, _ = self._get_rhs_dist_symb(ncond)
+        rhs = self._get_rhs_symb(ncond)
 
         idx = Idx(ix, (0, ncond))
+        batch, loop, irhs = self._get_batch_symb(idx)
         fstore = indexed(
             "f",
             [ns, nx, ny, nz],
             index=[istore[idx, k] for k in range(dim + 1)],
             priority=sorder,
+            batch=batch,
         )
         fload = indexed(
             "f",
             [ns, nx, ny, nz],
             index=[iload[0][idx, k] for k in range(dim + 1)],
             priority=sorder,
+            batch=batch,
         )
 
+        # the values are decoded and encoded with the reference
+        fload += self._get_ref_symb(iload[0], idx)
+        fref = self._get_ref_symb(istore, idx)
         self.generator.add_routine(
-            ("anti_bounce_back", For(idx, Eq(fstore, -fload + rhs[idx])))
+            (self.name, For(loop, Eq(fstore, -fload + rhs[irhs] - fref)))
         )
 
     @property
@@ -696,13 +1106,23 @@ class BouzidiAntiBounceBack(BouzidiBounceBack):
 
     """
 
+    name = "Bouzidi_anti_bounce_back"
+
+    def link_weights(self):
+        """
+        Return the weights of the loads of iload.
+        """
+        return [-self.s, 1 - self.s]
+
     def set_rhs(self):
         """
         Compute and set the additional terms to fix the boundary values.
         """
         k = self.istore[:, 0]
         ksym = self.stencil.get_symmetric()[k]
-        self.rhs[:] = self.feq[k, np.arange(k.size)] + self.feq[ksym, np.arange(k.size)]
+        self.rhs[:] = (
+            self.feq[..., k, np.arange(k.size)] + self.feq[..., ksym, np.arange(k.size)]
+        )
 
     # pylint: disable=too-many-locals
     def generate(self, sorder):
@@ -718,39 +1138,51 @@ class BouzidiAntiBounceBack(BouzidiBounceBack):
         from .symbolic import nx, ny, nz, indexed, ix
 
         ns = int(self.stencil.nv_ptr[-1])
-        dim = self.stencil.dim
+        dim = len(sorder) - 1
 
         istore, iload, ncond = self._get_istore_iload_symb(dim)
-        rhs, dist = self._get_rhs_dist_symb(ncond)
+        _, dist = self._get_rhs_dist_symb(ncond)
+        rhs = self._get_rhs_symb(ncond)
 
         idx = Idx(ix, (0, ncond))
+        batch, loop, irhs = self._get_batch_symb(idx)
         fstore = indexed(
             "f",
             [ns, nx, ny, nz],
             index=[istore[idx, k] for k in range(dim + 1)],
             priority=sorder,
+            batch=batch,
         )
         fload0 = indexed(
             "f",
             [ns, nx, ny, nz],
             index=[iload[0][idx, k] for k in range(dim + 1)],
             priority=sorder,
+            batch=batch,
         )
         fload1 = indexed(
             "f",
             [ns, nx, ny, nz],
             index=[iload[1][idx, k] for k in range(dim + 1)],
             priority=sorder,
+            batch=batch,
         )
 
+        # the values are decoded and encoded with the reference
+        fload0 += self._get_ref_symb(iload[0], idx)
+        fload1 += self._get_ref_symb(iload[1], idx)
+        fref = self._get_ref_symb(istore, idx)
         self.generator.add_routine(
             (
-                "Bouzidi_anti_bounce_back",
+                self.name,
                 For(
-                    idx,
+                    loop,
                     Eq(
                         fstore,
-                        -dist[idx] * fload0 + (1 - dist[idx]) * fload1 + rhs[idx],
+                        -dist[idx] * fload0
+                        + (1 - dist[idx]) * fload1
+                        + rhs[irhs]
+                        - fref,
                     ),
                 ),
             )
@@ -784,6 +1216,12 @@ class Neumann(BoundaryMethod):
         indices = self.istore[1:] + v[k].T
         self.iload.append(np.concatenate([k[np.newaxis, :], indices]))
 
+    def link_weights(self):
+        """
+        Return the weights of the loads of iload.
+        """
+        return [np.ones(self.istore.shape[1])]
+
     # pylint: disable=too-many-locals
     def generate(self, sorder):
         """
@@ -798,25 +1236,28 @@ class Neumann(BoundaryMethod):
         from .symbolic import nx, ny, nz, indexed, ix
 
         ns = int(self.stencil.nv_ptr[-1])
-        dim = self.stencil.dim
+        dim = len(sorder) - 1
 
         istore, iload, ncond = self._get_istore_iload_symb(dim)
 
         idx = Idx(ix, (0, ncond))
+        batch, loop, _ = self._get_batch_symb(idx)
         fstore = indexed(
             "f",
             [ns, nx, ny, nz],
             index=[istore[idx, k] for k in range(dim + 1)],
             priority=sorder,
+            batch=batch,
         )
         fload = indexed(
             "f",
             [ns, nx, ny, nz],
             index=[iload[0][idx, k] for k in range(dim + 1)],
             priority=sorder,
+            batch=batch,
         )
 
-        self.generator.add_routine((self.name, For(idx, Eq(fstore, fload))))
+        self.generator.add_routine((self.name, For(loop, Eq(fstore, fload))))
 
     @property
     def function(self):
@@ -4,13 +4,334 @@
 #
 # License: BSD 3 clause
 
-from .storage import Array, AOS, SOA
+import sys
+import logging
+
+import numpy as np
+
+from .storage import Array, AOS, SOA, SparseArray, TiledArray
+
+log = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+def morton_order(coords):
+    """
+    Return the permutation which sorts points along the Morton
+    space-filling curve (Z-order).
+
+    The bits of the coordinates are interleaved: points which are close
+    on the curve are close in space.
+
+    Parameters
+    ----------
+    coords : ndarray
+        the nonnegative integer coordinates of the points
+        (one line per dimension)
+
+    Returns
+    -------
+    ndarray
+        the indices of the points in the Morton order
+
+    """
+    coords = np.asarray(coords, dtype=np.uint64)
+    nbits = int(coords.max()).bit_length() if coords.size else 0
+    code = np.zeros(coords.shape[1], dtype=np.uint64)
+    for b in range(nbits):
+        for d, x in enumerate(coords):
+            bit = (x >> np.uint64(b)) & np.uint64(1)
+            code |= bit << np.uint64(len(coords) * b + d)
+    return np.argsort(code, kind="stable")
+
+
+class SparseLattice:
+    """
+    The nodes of a domain stored by a
+    :py:class:`SparseContainer<pylbm.container.SparseContainer>`.
+
+    The fluid nodes come first in the Morton order (see
+    :py:func:`morton_order<pylbm.container.morton_order>`). They are
+    followed by the ghost nodes, also in the Morton order: the points
+    which are not fluid but are read or written around the fluid nodes
+    (x - v_k and x + v_k for a fluid node x) and the inner points whose
+    values are copied in the fictitious points of the periodic directions.
+
+    Parameters
+    ----------
+    domain : Domain
+        the domain
+
+    Attributes
+    ----------
+    shape : tuple
+        the shape of the domain with the fictitious points
+    vmax : list
+        the size of the fictitious points in each direction
+    nnode : int
+        the number of nodes
+    nfluid : int
+        the number of fluid nodes
+    coords : tuple
+        the indices of the nodes in the domain with the fictitious points
+        (one array per direction)
+    nodes : tuple
+        the indices of the nodes in the arrays (one array)
+    index : ndarray
+        the node of each point of the domain with the fictitious points
+        (-1 if the point is not stored)
+    neighbors : ndarray
+        the node of x - v_k for each fluid node x (line) and each
+        velocity v_k (column)
+    ghost : ndarray
+        the nodes in the fictitious points of the periodic directions
+    image : ndarray
+        the node whose value is copied in each node of ghost
+
+    """
+
+    def __init__(self, domain):
+        v = np.asarray(domain.stencil.get_all_velocities())
+        self.vmax = list(domain.stencil.vmax)
+        self.shape = tuple(int(n) for n in domain.shape_halo)
+        dim = len(self.shape)
+        fluid = domain.in_or_out == domain.valin
+
+        # the fluid nodes and the points around them
+        stored = fluid.copy()
+        for vk in np.concatenate([v, -v]):
+            stored |= np.roll(fluid, tuple(int(c) for c in vk), axis=tuple(range(dim)))
+
+        # the fictitious points of the periodic directions
+        # take the values of the points on the other side of the domain
+        periods = domain.mpi_topo.cartcomm.Get_topo()[1]
+        ghost = np.array(np.nonzero(stored & ~fluid))
+        image = ghost.copy()
+        for d in range(dim):
+            if periods[d]:
+                n = self.shape[d] - 2 * self.vmax[d]
+                image[d] = self.vmax[d] + (ghost[d] - self.vmax[d]) % n
+        periodic = np.any(image != ghost, axis=0)
+        ghost, image = ghost[:, periodic], image[:, periodic]
+        stored[tuple(image)] = True
+
+        nodes = []
+        for mask in [fluid, stored & ~fluid]:
+            coords = np.array(np.nonzero(mask))
+            nodes.append(coords[:, morton_order(coords)])
+        self.nfluid = nodes[0].shape[1]
+        coords = np.concatenate(nodes, axis=1)
+        self.nnode = coords.shape[1]
+        self.coords = tuple(coords)
+        self.nodes = (np.arange(self.nnode),)
+        self.index = np.full(self.shape, -1, dtype=np.int32)
+        self.index[self.coords] = np.arange(self.nnode, dtype=np.int32)
+
+        self.neighbors = np.ascontiguousarray(
+            np.stack([self.index[tuple(nodes[0] - vk[:, np.newaxis])] for vk in v], 1),
+            dtype=np.int32,
+        )
+        self.ghost = self.index[tuple(ghost)]
+        self.image = self.index[tuple(image)]
+
+        log.info(
+            "sparse lattice: %d fluid nodes and %d ghost nodes for %d points",
+            self.nfluid,
+            self.nnode - self.nfluid,
+            fluid.size,
+        )
+
+    def slots(self, points):
+        """
+        Return the indices in the arrays of points of the domain with the
+        fictitious points (one line, -1 if the point is not stored).
+
+        Parameters
+        ----------
+        points : ndarray
+            the indices of the points (one line per direction)
+
+        """
+        return self.index[tuple(points)][np.newaxis]
+
+
+class TiledLattice:
+    """
+    The tiles of a domain stored by a
+    :py:class:`TiledContainer<pylbm.container.TiledContainer>`.
+
+    The inner domain is split in tiles of a fixed size and only the tiles
+    which contain at least one fluid node are stored, in the Morton order
+    (see :py:func:`morton_order<pylbm.container.morton_order>`). Each tile
+    is a dense block with its own fictitious points (the halo of the tile)
+    and the blocks are stacked along the first direction: the arrays are
+    dense arrays whose first direction has ntile * block[0] points.
+
+    Each stored point of the domain has one owner in the arrays: the inner
+    point of its tile if the tile is stored, a point of the halo of a tile
+    otherwise. The other copies of the point in the halos of the tiles
+    take the value of the owner before the time step.
+
+    Parameters
+    ----------
+    domain : Domain
+        the domain
+    size : int or list
+        the size of the tiles (one size per direction or the same size
+        in all the directions)
+
+    Attributes
+    ----------
+    shape : tuple
+        the shape of the domain with the fictitious points
+    vmax : list
+        the size of the fictitious points in each direction
+    size : list
+        the size of the tiles in each direction
+    block : list
+        the size of the tiles with their halo in each direction
+    ntile : int
+        the number of stored tiles
+    tiles : ndarray
+        the position of the stored tiles in the grid of the tiles
+        (one line per direction)
+    storage_shape : list
+        the shape of the arrays without the velocities
+    coords : tuple
+        the indices of the stored points in the domain with the fictitious
+        points (one array per direction)
+    nodes : tuple
+        the indices of their owners in the arrays (one array per direction)
+    index : ndarray
+        the indices of the owner of each point of the domain with the
+        fictitious points (first axis, -1 if the point is not stored)
+    copies : tuple
+        the indices in the arrays of the copies of the halos of the tiles
+        and of their owners
+    ghost : tuple
+        the owners of the fictitious points of the periodic directions
+    image : tuple
+        the owners whose values are copied in the owners of ghost
+
+    """
+
+    def __init__(self, domain, size):
+        self.vmax = list(domain.stencil.vmax)
+        self.shape = tuple(int(n) for n in domain.shape_halo)
+        dim = len(self.shape)
+        shape_in = [n - 2 * v for n, v in zip(self.shape, self.vmax)]
+        self.size = [
+            min(int(s), n) for s, n in zip(np.broadcast_to(size, (dim,)), shape_in)
+        ]
+        self.block = [s + 2 * v for s, v in zip(self.size, self.vmax)]
+        fluid = domain.in_or_out == domain.valin
+
+        # the tiles with at least one fluid node
+        ntiles = [-(-n // s) for n, s in zip(shape_in, self.size)]
+        inner = fluid[tuple(slice(v, v + n) for v, n in zip(self.vmax, shape_in))]
+        padding = [(0, t * s - n) for t, s, n in zip(ntiles, self.size, shape_in)]
+        inner = np.pad(inner, padding)
+        split = [n for t, s in zip(ntiles, self.size) for n in (t, s)]
+        active = inner.reshape(split).any(axis=tuple(range(1, 2 * dim, 2)))
+        tiles = np.array(np.nonzero(active))
+        self.tiles = tiles[:, morton_order(tiles)]
+        self.ntile = self.tiles.shape[1]
+        self.storage_shape = [self.ntile * self.block[0]] + self.block[1:]
+
+        # the point of the domain of each point of the blocks
+        local = np.indices(self.block).reshape(dim, 1, -1)
+        size = np.array(self.size)[:, np.newaxis, np.newaxis]
+        point = (self.tiles[:, :, np.newaxis] * size + local).reshape(dim, -1)
+        local = np.broadcast_to(local, (dim, self.ntile, local.shape[2]))
+        local = local.reshape(dim, -1)
+        vmax = np.array(self.vmax)[:, np.newaxis]
+        valid = np.all(point < np.array(self.shape)[:, np.newaxis], axis=0)
+        interior = np.all((local >= vmax) & (local < vmax + size[:, 0]), axis=0)
+
+        # the owner of a point is its inner copy if any
+        pid = np.ravel_multi_index(point[:, valid], self.shape)
+        sid = np.flatnonzero(valid)
+        order = np.lexsort((~interior[valid], pid))
+        pid, sid = pid[order], sid[order]
+        first = np.r_[True, pid[1:] != pid[:-1]]
+        owner = np.repeat(sid[first], np.diff(np.r_[np.flatnonzero(first), pid.size]))
+
+        self.coords = np.unravel_index(pid[first], self.shape)
+        self.nodes = self._storage_index(sid[first])
+        self.copies = (
+            self._storage_index(sid[~first]),
+            self._storage_index(owner[~first]),
+        )
+        self.index = np.full((dim,) + self.shape, -1, dtype=np.int32)
+        self.index[(slice(None),) + self.coords] = self.nodes
+
+        # the fictitious points of the periodic directions
+        # take the values of the points on the other side of the domain
+        periods = domain.mpi_topo.cartcomm.Get_topo()[1]
+        ghost = np.array(self.coords)
+        image = ghost.copy()
+        for d in range(dim):
+            if periods[d]:
+                image[d] = self.vmax[d] + (ghost[d] - self.vmax[d]) % shape_in[d]
+        periodic = np.any(image != ghost, axis=0)
+        ghost, image = self.slots(ghost[:, periodic]), self.slots(image[:, periodic])
+        stored = np.all(image >= 0, axis=0)
+        self.ghost = tuple(ghost[:, stored])
+        self.image = tuple(image[:, stored])
+
+        log.info(
+            "tiled lattice: %d stored tiles over %d (tiles of size %s)",
+            self.ntile,
+            active.size,
+            self.size,
+        )
+
+    def _storage_index(self, sid):
+        """
+        Return the indices in the arrays of the points of the blocks
+        numbered tile by tile.
+        """
+        tile, local = np.divmod(sid, np.prod(self.block))
+        index = list(np.unravel_index(local, self.block))
+        index[0] = index[0] + tile * self.block[0]
+        return tuple(np.asarray(i, dtype=np.int32) for i in index)
+
+    def slots(self, points):
+        """
+        Return the indices in the arrays of the owners of points of the domain
+        with the fictitious points (one line per direction, -1 if the point
+        is not stored).
+
+        Parameters
+        ----------
+        points : ndarray
+            the indices of the points (one line per direction)
+
+        """
+        return self.index[(slice(None),) + tuple(points)]
+
+    @staticmethod
+    def table(index):
+        """
+        Return the indices of index with one line per point, the layout of
+        the tables of the generated code.
+        """
+        return np.ascontiguousarray(np.stack(index, axis=1), dtype=np.int32)
 
 
 class BaseContainer:
     gpu_support = False
+    # True if only the nodes of a sparse lattice are stored
+    sparse = False
+    # the size of the tiles if only the tiles with fluid nodes are stored
+    tile_size = None
+    # the stored points of the domain if they are not all stored
+    lattice = None
+    # the copy of the distribution functions made by the generated driver
+    _fcopy = None
 
-    def __init__(self, domain, scheme, sorder, default_type):
+    def __init__(
+        self, domain, scheme, sorder, default_type, nbatch=None, dtype=np.double
+    ):
         self.dim = domain.dim
         self.mpi_topo = domain.mpi_topo
 
@@ -18,6 +339,11 @@ class BaseContainer:
         self.nspace = domain.global_size
         self.vmax = domain.stencil.vmax
         self.sorder = sorder
+        self.nbatch = nbatch
+        self.dtype = dtype
+        # 1 when the distribution functions are stored in the layout
+        # of the odd time steps of the AA pattern
+        self.parity = 0
 
         if sorder:
             self.m = Array(
@@ -26,7 +352,9 @@ class BaseContainer:
                 self.vmax,
                 sorder,
                 self.mpi_topo,
+                dtype=self.dtype,
                 gpu_support=self.gpu_support,
+                nbatch=self.nbatch,
             )
             self.F = Array(
                 self.nv,
@@ -34,7 +362,9 @@ class BaseContainer:
                 self.vmax,
                 sorder,
                 self.mpi_topo,
+                dtype=self.dtype,
                 gpu_support=self.gpu_support,
+                nbatch=self.nbatch,
             )
         else:
             self.m = default_type(
@@ -42,14 +372,18 @@ class BaseContainer:
                 self.nspace,
                 self.vmax,
                 self.mpi_topo,
+                dtype=self.dtype,
                 gpu_support=self.gpu_support,
+                nbatch=self.nbatch,
             )
             self.F = default_type(
                 self.nv,
                 self.nspace,
                 self.vmax,
                 self.mpi_topo,
+                dtype=self.dtype,
                 gpu_support=self.gpu_support,
+                nbatch=self.nbatch,
             )
             sorder = [i for i in range(self.dim + 1)]
 
@@ -61,10 +395,38 @@ class BaseContainer:
     def _set_sorder(self, sorder):
         pass
 
+    def arguments(self):
+        """
+        Return the arguments of the generated code which describe the
+        storage of the container.
+        """
+        return {}
+
+    def fcopy(self):
+        """
+        Return the array where the generated driver copies the distribution
+        functions before the boundary conditions.
+
+        The array is allocated at the first call and then reused.
+        """
+        if self._fcopy is None:
+            self._fcopy = np.empty_like(self.F.array)
+        return self._fcopy
+
 
 class NumpyContainer(BaseContainer):
-    def __init__(self, domain, scheme, sorder=None, default_type=SOA):
-        super(NumpyContainer, self).__init__(domain, scheme, sorder, default_type)
+    def __init__(
+        self,
+        domain,
+        scheme,
+        sorder=None,
+        default_type=SOA,
+        nbatch=None,
+        dtype=np.double,
+    ):
+        super(NumpyContainer, self).__init__(
+            domain, scheme, sorder, default_type, nbatch, dtype
+        )
         self.Fnew = self.F
 
     def _set_sorder(self, sorder):
@@ -73,15 +435,32 @@ class NumpyContainer(BaseContainer):
 
 
 class CythonContainer(BaseContainer):
-    def __init__(self, domain, scheme, sorder=None, default_type=AOS):
-        super(CythonContainer, self).__init__(domain, scheme, sorder, default_type)
+    def __init__(
+        self,
+        domain,
+        scheme,
+        sorder=None,
+        default_type=AOS,
+        nbatch=None,
+        dtype=np.double,
+        in_place=False,
+    ):
+        super(CythonContainer, self).__init__(
+            domain, scheme, sorder, default_type, nbatch, dtype
+        )
+        if in_place:
+            # the time steps read and write the same array
+            self.Fnew = self.F
+            return
         self.Fnew = Array(
             self.nv,
             self.nspace,
             self.vmax,
             self.sorder,
             self.mpi_topo,
+            dtype=self.dtype,
             gpu_support=self.gpu_support,
+            nbatch=self.nbatch,
         )
         self.Fnew.set_conserved_moments(scheme.consm)
 
@@ -93,8 +472,18 @@ class CythonContainer(BaseContainer):
 class LoopyContainer(CythonContainer):
     gpu_support = True
 
-    def __init__(self, domain, scheme, sorder=None, default_type=AOS):
-        super(LoopyContainer, self).__init__(domain, scheme, sorder, default_type)
+    def __init__(
+        self,
+        domain,
+        scheme,
+        sorder=None,
+        default_type=AOS,
+        nbatch=None,
+        dtype=np.double,
+    ):
+        super(LoopyContainer, self).__init__(
+            domain, scheme, sorder, default_type, nbatch, dtype
+        )
 
     def move2gpu(self, array):
         try:
@@ -104,3 +493,161 @@ class LoopyContainer(CythonContainer):
         except ImportError:
             raise ImportError("Please install loo.py")
         return cl.array.to_device(queue, array)
+
+
+class SparseContainer(BaseContainer):
+    """
+    Container which stores the nodes of a sparse lattice only
+    (see :py:class:`SparseLattice<pylbm.container.SparseLattice>`).
+
+    The memory and the work of the time steps scale with the number of
+    fluid nodes instead of the size of the domain. The generated code
+    loops over the fluid nodes and reads the distribution functions at
+    the nodes given by the table of the neighbors.
+
+    Only one process is supported.
+
+    Parameters
+    ----------
+    domain : Domain
+        the domain
+    scheme : Scheme
+        the scheme
+    sorder : list
+        the order of the velocities and of the nodes.
+        Default is None which means [1, 0]: the velocities of a node
+        are contiguous
+    nbatch : int
+        the number of ensemble members. Default is None
+    dtype : type
+        the type of the arrays. Default is numpy.double
+
+    """
+
+    sparse = True
+
+    def __init__(self, domain, scheme, sorder=None, nbatch=None, dtype=np.double):
+        if domain.mpi_topo.comm.Get_size() > 1:
+            log.error(
+                "Solution: the sparse storage can only be used with one process\n"
+            )
+            sys.exit()
+        if sorder is None:
+            sorder = [1, 0]
+        if len(sorder) != 2:
+            log.error(
+                "Solution: the storage order of the sparse storage is given "
+                "for the velocities and the nodes\n"
+            )
+            sys.exit()
+
+        self.dim = domain.dim
+        self.mpi_topo = domain.mpi_topo
+        self.lattice = SparseLattice(domain)
+
+        self.nv = scheme.stencil.nv_ptr[-1]
+        self.nspace = [self.lattice.nnode]
+        self.vmax = [0]
+        self.sorder = list(sorder)
+        self.nbatch = nbatch
+        self.dtype = dtype
+        self.parity = 0
+
+        self.m, self.F, self.Fnew = [
+            SparseArray(self.nv, self.lattice, self.sorder, self.dtype, self.nbatch)
+            for _ in range(3)
+        ]
+        for array in [self.m, self.F, self.Fnew]:
+            array.set_conserved_moments(scheme.consm)
+
+    def arguments(self):
+        """
+        Return the table of the neighbors and the ghost nodes of the
+        periodic directions.
+        """
+        lattice = self.lattice
+        return {
+            "neighbors": lattice.neighbors,
+            "nfluid": lattice.nfluid,
+            "periodic_ghost": lattice.ghost,
+            "periodic_image": lattice.image,
+            "nperiodic": lattice.ghost.size,
+        }
+
+
+class TiledContainer(BaseContainer):
+    """
+    Container which stores the tiles with fluid nodes only
+    (see :py:class:`TiledLattice<pylbm.container.TiledLattice>`).
+
+    The memory and the work of the time steps scale with the number of
+    tiles which contain fluid nodes. The generated code loops over the
+    stored tiles and makes dense loops inside each tile. The halos of
+    the tiles are updated at the beginning of the time step.
+
+    Only one process is supported.
+
+    Parameters
+    ----------
+    domain : Domain
+        the domain
+    scheme : Scheme
+        the scheme
+    tile_size : int or list
+        the size of the tiles
+    sorder : list
+        the storage order. Default is None which means
+        [dim, 0, ..., dim - 1]: the velocities of a point are contiguous
+    nbatch : int
+        the number of ensemble members. Default is None
+    dtype : type
+        the type of the arrays. Default is numpy.double
+
+    """
+
+    def __init__(
+        self, domain, scheme, tile_size, sorder=None, nbatch=None, dtype=np.double
+    ):
+        if domain.mpi_topo.comm.Get_size() > 1:
+            log.error("Solution: the tiled storage can only be used with one process\n")
+            sys.exit()
+
+        self.dim = domain.dim
+        self.mpi_topo = domain.mpi_topo
+        self.lattice = TiledLattice(domain, tile_size)
+        self.tile_size = self.lattice.size
+
+        self.nv = scheme.stencil.nv_ptr[-1]
+        self.nspace = self.lattice.storage_shape
+        self.vmax = [0] * self.dim
+        if sorder is None:
+            sorder = [self.dim] + [i for i in range(self.dim)]
+        self.sorder = list(sorder)
+        self.nbatch = nbatch
+        self.dtype = dtype
+        self.parity = 0
+
+        self.m, self.F, self.Fnew = [
+            TiledArray(self.nv, self.lattice, self.sorder, self.dtype, self.nbatch)
+            for _ in range(3)
+        ]
+        for array in [self.m, self.F, self.Fnew]:
+            array.set_conserved_moments(scheme.consm)
+
+        # the tables of the generated code (one line per point)
+        lattice = self.lattice
+        self._tables = {
+            "halo_dst": lattice.table(lattice.copies[0]),
+            "halo_src": lattice.table(lattice.copies[1]),
+            "nhalo": lattice.copies[0][0].size,
+            "periodic_ghost": lattice.table(lattice.ghost),
+            "periodic_image": lattice.table(lattice.image),
+            "nperiodic": lattice.ghost[0].size,
+        }
+
+    def arguments(self):
+        """
+        Return the copies of the halos of the tiles and the fictitious points
+        of the periodic directions.
+        """
+        return dict(self._tables)
@@ -299,7 +299,7 @@ class Domain:
             self.__add_elem(elem)
 
         self.clean()
-        log.info(self.__str__())
+        log.info("%s", self)
 
     @property
     def shape_halo(self):
@@ -644,7 +644,7 @@ class Domain:
     # pylint: disable=too-complex
     def visualize(
         self,
-        viewer_app=viewer.matplotlib_viewer,
+        viewer_app=None,
         view_geom=True,
         view_distance=False,
         view_in=True,
@@ -695,6 +695,8 @@ class Domain:
 
         """
 
+        if viewer_app is None:
+            viewer_app = viewer.matplotlib_viewer
         fig = viewer_app.Fig(dim=self.dim)
         view = fig[0]
         view.title = "Domain"
@@ -7,6 +7,7 @@
 """
 __init__ of the module containing the geometrical elements
 """
+import importlib
 
 from .circle import Circle
 from .ellipse import Ellipse
@@ -18,7 +19,8 @@ from .ellipsoid import Ellipsoid
 from .cylinder import CylinderCircle, CylinderEllipse, CylinderTriangle
 from .cylinder import Parallelepiped
 
-from .stl_element import STLElement
+# STLElement is imported at the first access since it imports numpy-stl
+_lazy = {"STLElement": ".stl_element"}
 
 __all__ = [
     "Circle",
@@ -33,3 +35,9 @@ __all__ = [
     "Parallelepiped",
     "STLElement",
 ]
+
+
+def __getattr__(name):
+    if name in _lazy:
+        return getattr(importlib.import_module(_lazy[name], __name__), name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
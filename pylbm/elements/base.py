@@ -165,7 +165,7 @@ class BaseCircle:
             err_msg = "Error in the definition of the cylinder: "
             err_msg += "the vectors are colinear"
             log.error(err_msg)
-        log.info(self.__str__())
+        log.info("%s", self)
 
     def get_bounds(self):
         """
@@ -278,7 +278,7 @@ class BaseEllipse:
             err_msg = "Error in the definition of the cylinder: "
             err_msg += "the vectors have to be orthogonal"
             log.error(err_msg)
-        log.info(self.__str__())
+        log.info("%s", self)
 
     def get_bounds(self):
         """
@@ -387,7 +387,7 @@ class BaseTriangle:
             err_msg = "Error in the definition of the cylinder: "
             err_msg += "the vectors are not free"
             log.error(err_msg)
-        log.info(self.__str__())
+        log.info("%s", self)
 
     def get_bounds(self):
         """
@@ -509,7 +509,7 @@ class BaseParallelogram:
             err_msg = "Error in the definition of the cylinder: "
             err_msg += "the vectors are not free"
             log.error(err_msg)
-        log.info(self.__str__())
+        log.info("%s", self)
 
     def get_bounds(self):
         """
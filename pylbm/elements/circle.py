@@ -81,7 +81,7 @@ class Circle(Element):
         else:
             log.error("The radius of the circle should be positive")
         super(Circle, self).__init__(label, isfluid)
-        log.info(self.__str__())
+        log.info("%s", self)
 
     def get_bounds(self):
         """
@@ -87,7 +87,7 @@ class Ellipse(Element):
             self.v1 = np.asarray(v1)
             self.v2 = np.asarray(v2)
         super(Ellipse, self).__init__(label, isfluid)
-        log.info(self.__str__())
+        log.info("%s", self)
 
     def get_bounds(self):
         """
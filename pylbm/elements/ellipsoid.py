@@ -97,7 +97,7 @@ class Ellipsoid(Element):
             self.v2 = np.asarray(v2)
             self.v3 = np.asarray(v3)
         super(Ellipsoid, self).__init__(label, isfluid)
-        log.info(self.__str__())
+        log.info("%s", self)
 
     def get_bounds(self):
         """
@@ -87,7 +87,7 @@ class Parallelogram(Element):
         self.v1 = np.asarray(vecta)
         self.v2 = np.asarray(vectb)
         super(Parallelogram, self).__init__(label, isfluid)
-        log.info(self.__str__())
+        log.info("%s", self)
 
     def get_bounds(self):
         """
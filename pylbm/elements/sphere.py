@@ -83,7 +83,7 @@ class Sphere(Element):
         else:
             log.error("The radius of the sphere should be positive")
         super(Sphere, self).__init__(label, isfluid)
-        log.info(self.__str__())
+        log.info("%s", self)
 
     def get_bounds(self):
         """
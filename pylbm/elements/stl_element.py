@@ -118,7 +118,7 @@ class STLElement(Element):
         self.nb_tri = self.mesh.points.shape[0]  # nb of triangles
         self.dim = 3
         super(STLElement, self).__init__(label, isfluid)
-        log.info(self.__str__())
+        log.info("%s", self)
 
     def get_bounds(self):
         return self.mesh.min_, self.mesh.max_
@@ -87,7 +87,7 @@ class Triangle(Element):
         self.v1 = np.asarray(vecta)
         self.v2 = np.asarray(vectb)
         super(Triangle, self).__init__(label, isfluid)
-        log.info(self.__str__())
+        log.info("%s", self)
 
     def get_bounds(self):
         box = np.asarray(
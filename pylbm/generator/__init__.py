@@ -1,4 +1,4 @@
-from .codegen import codegen, make_routine
+from .codegen import codegen, make_routine, Driver, DriverCall
 from .ast import For, If, IdxRange, IndexedIntBase
-from .autowrap import autowrap
+from .autowrap import autowrap, get_cache_directory
 from .generator import Generator
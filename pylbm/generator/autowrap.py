@@ -3,13 +3,22 @@
 
 import sys
 import os
+import time
+import shlex
 import shutil
+import hashlib
+import functools
+import logging
+import sysconfig
 import tempfile
 from subprocess import STDOUT, CalledProcessError, check_output
 import importlib
+import importlib.util
 
 from .codegen import get_code_generator
 
+log = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
 
 class CodeWrapError(Exception):
     pass
@@ -22,49 +31,133 @@ class CodeWrapper(object):
 
     @property
     def filename(self):
-        return "%s_%s" % (self._module_name, self._module_counter)
+        return self.module_name
 
     @property
     def full_path(self):
-        return "%s/%s_%s" % (self.workdir, self._module_name, self._module_counter)
+        return "%s/%s" % (self.workdir, self.module_name)
 
     @property
     def module_name(self):
+        if self._module_key is not None:
+            return "%s_%s" % (self._module_name, self._module_key)
         return "%s_%s" % (self._module_name, self._module_counter)
 
     def __init__(
-        self, generator, filepath=None, flags=[], generate=True, verbose=False
+        self,
+        generator,
+        filepath=None,
+        flags=[],
+        generate=True,
+        verbose=False,
+        cache=None,
+        openmp=False,
+        jobs=1,
     ):
         """
         generator -- the code generator to use
+        cache -- the directory of the cache of the compiled modules (optional)
+        openmp -- compile and link with OpenMP (optional)
+        jobs -- the number of parallel jobs of the compilation (optional)
         """
         self.generator = generator
         self.filepath = filepath
-        self.workdir = self.filepath or tempfile.mkdtemp("_sympy_compile")
+        self.cache = cache if not filepath else None
+        self.workdir = self.filepath or (
+            None if self.cache else tempfile.mkdtemp("_sympy_compile")
+        )
         self.flags = flags
         self.generate = generate
         self.verbose = verbose
+        self.openmp = openmp
+        self.jobs = jobs
         self._module_counter = 0
+        self._module_key = None
+
+    @property
+    def signature(self):
+        """the versions and the options which change the compiled module"""
+        from .. import __version__
+
+        return [__version__, sys.version, self.__class__.__name__, self.openmp] + list(
+            self.flags
+        )
 
     def _generate_code(self, routines):
         self.generator.write(routines, self.full_path, True, True, False)
 
+    def _cache_key(self, code):
+        """return the hash of the generated code and of the signature"""
+        sha = hashlib.sha256()
+        for item in self.signature:
+            sha.update(str(item).encode())
+        for filename, contents in code:
+            sha.update(os.path.splitext(filename)[1].encode())
+            sha.update(contents.encode())
+        return sha.hexdigest()[:32]
+
+    def _import_module(self):
+        try:
+            sys.path.append(self.workdir)
+            if self.module_name in sys.modules:
+                sys.modules.pop(self.module_name)
+            importlib.invalidate_caches()
+            mod = importlib.import_module(self.module_name)
+        finally:
+            sys.path.remove(self.workdir)
+        return mod
+
+    def wrap_cached_code(self, routines):
+        """
+        return the module of the routines from the cache
+
+        The module is built and added to the cache if the generated code
+        is not found. The module is built in a temporary directory which
+        is renamed at the end, so that several processes can share the
+        same cache.
+        """
+        code = self.generator.write(routines, self._module_name, False, True, False)
+        self._module_key = self._cache_key(code)
+        cachedir = os.path.join(self.cache, self._module_key)
+
+        if not os.path.isdir(cachedir):
+            os.makedirs(self.cache, exist_ok=True)
+            self.workdir = tempfile.mkdtemp(prefix=".build_", dir=self.cache)
+            try:
+                self._prepare_files(routines)
+                for filename, contents in code:
+                    extension = os.path.splitext(filename)[1]
+                    with open(self.full_path + extension, "w") as f:
+                        f.write(contents)
+                self._process_files(routines)
+                try:
+                    os.rename(self.workdir, cachedir)
+                except OSError:
+                    # the module has been added by another process
+                    pass
+            finally:
+                shutil.rmtree(self.workdir, ignore_errors=True)
+
+        self.workdir = cachedir
+        # the same code has already been imported
+        if self.module_name in sys.modules:
+            return sys.modules[self.module_name]
+        return self._import_module()
+
     def wrap_code(self, routines):
+        if self.cache:
+            return self.wrap_cached_code(routines)
+
         if not os.access(self.workdir, os.F_OK):
             os.mkdir(self.workdir)
 
         try:
-            sys.path.append(self.workdir)
             if self.generate:
                 self._prepare_files(routines)
                 self._generate_code(routines)
                 self._process_files(routines)
-            if self.module_name in sys.modules:
-                sys.modules.pop(self.module_name)
-            importlib.invalidate_caches()
-            mod = importlib.import_module(self.module_name)
+            mod = self._import_module()
         finally:
-            sys.path.remove(self.workdir)
             self._module_counter += 1
             if not self.filepath:
                 try:
@@ -76,9 +169,9 @@ class CodeWrapper(object):
         return mod
 
     def _process_files(self, routine):
-        command = self.command
-        command.extend(self.flags)
+        self._run(self.command)
 
+    def _run(self, command):
         try:
             retoutput = check_output(command, stderr=STDOUT)
         except CalledProcessError as e:
@@ -91,6 +184,33 @@ class CodeWrapper(object):
 
 
 class CythonCodeWrapper(CodeWrapper):
+    """
+    Build the Cython module without setuptools
+
+    The pyx file is translated in the process by Cython and the C file
+    is compiled and linked by the compiler used to build Python.
+    The object files are kept in the cache directory with the hash of
+    the pyx file, of the module name, of the version of Cython and of the
+    compiler command as key, so that an unchanged module is neither
+    translated nor compiled again. The key doesn't depend on the build
+    directory which is a new temporary directory in the cache.
+    The flags are added to the options of the C compiler
+    (for example -march=native).
+
+    With several jobs and GCC, the module is split by the link time
+    optimization: the compilation only produces the intermediate
+    representation and the partitions of the module are compiled in
+    parallel at the link.
+
+    The setup.py of setuptools is used if the compiler is unknown.
+    """
+
+    compile_args = ["-O3", "-w"]
+    openmp_args = ["-fopenmp"]
+    lto_args = ["-flto"]
+    # the durations of the steps of the last build
+    timings = None
+
     setup_template = """\
 from setuptools import setup
 from setuptools import Extension
@@ -100,7 +220,8 @@ ext_mods = [Extension(
     "{modname}",
     {pyxfilename},
     include_dirs=[np.get_include()],
-    extra_compile_args=['-O3', '-w'],
+    extra_compile_args={compile_args},
+    extra_link_args={link_args},
 )]
 setup(ext_modules=cythonize(ext_mods))
 """
@@ -110,13 +231,70 @@ setup(ext_modules=cythonize(ext_mods))
 requires = ["setuptools", "wheel", "Cython"]
 """
 
+    @property
+    def signature(self):
+        import Cython
+        import numpy as np
+
+        return super().signature + [
+            Cython.__version__,
+            np.__version__,
+            self.compile_args,
+            self._get_compiler(),
+        ]
+
+    def _get_compile_args(self):
+        """return the options of the C compiler"""
+        args = list(self.compile_args)
+        if self.openmp:
+            args += self.openmp_args
+        return args + list(self.flags)
+
+    @staticmethod
+    def _get_compiler():
+        """return the commands of the C compiler and of the linker"""
+        cc = os.environ.get("CC", sysconfig.get_config_var("CC"))
+        ldshared = os.environ.get("LDSHARED", sysconfig.get_config_var("LDSHARED"))
+        if not cc or not ldshared:
+            return None
+        cflags = "%s %s" % (
+            os.environ.get("CFLAGS", sysconfig.get_config_var("CFLAGS") or ""),
+            sysconfig.get_config_var("CCSHARED") or "",
+        )
+        return shlex.split(cc) + shlex.split(cflags), shlex.split(ldshared)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _is_gcc(cc):
+        """return True if the C compiler is GCC"""
+        try:
+            version = check_output([cc, "--version"], stderr=STDOUT).decode()
+        except (OSError, CalledProcessError):
+            return False
+        return "Free Software Foundation" in version and "clang" not in version
+
+    def _get_jobs(self, cc):
+        """return the number of partitions of the module compiled in parallel"""
+        if self.jobs <= 1:
+            return 1
+        if not self._is_gcc(cc[0]):
+            log.warning(
+                "the parallel compilation needs GCC: %s is compiled in one job",
+                self.module_name,
+            )
+            return 1
+        return self.jobs
+
     @property
     def command(self):
         setup_file = os.path.join(self.workdir, "setup.py")
         with open(setup_file, "w") as f:
             f.write(
                 self.setup_template.format(
-                    modname=self.module_name, pyxfilename=[self.full_path + ".pyx"]
+                    modname=self.module_name,
+                    pyxfilename=[self.full_path + ".pyx"],
+                    compile_args=self._get_compile_args(),
+                    link_args=self.openmp_args if self.openmp else [],
                 )
             )
 
@@ -124,9 +302,6 @@ requires = ["setuptools", "wheel", "Cython"]
         with open(pyproject_file, "w") as f:
             f.write(self.pyproject_template)
 
-        if self.verbose:
-            print(open(self.full_path + ".pyx").read())
-
         command = [
             sys.executable,
             setup_file,
@@ -138,6 +313,169 @@ requires = ["setuptools", "wheel", "Cython"]
     def _prepare_files(self, routines):
         pass
 
+    def _process_files(self, routines):
+        if log.isEnabledFor(logging.DEBUG):
+            with open(self.full_path + ".pyx") as f:
+                log.debug("code of %s:\n%s", self.module_name, f.read())
+
+        compiler = self._get_compiler()
+        if compiler is None:
+            return super()._process_files(routines)
+
+        jobs = self._get_jobs(compiler[0])
+        command = self._get_compile_command(compiler[0])
+        link_args = self.openmp_args if self.openmp else []
+        if jobs > 1:
+            command += self.lto_args
+            link_args = self._get_compile_args() + ["-flto=%d" % jobs]
+        obj_file = self._object_file(command)
+        cached = os.path.exists(obj_file)
+        timings = {"cython": 0.0, "compile": 0.0}
+        if not cached:
+            start = time.perf_counter()
+            c_file = self._cythonize()
+            timings["cython"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            self._compile(command, c_file, obj_file)
+            timings["compile"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ext_suffix = sysconfig.get_config_var("EXT_SUFFIX") or ".so"
+        self._run(
+            compiler[1] + [obj_file, "-o", self.full_path + ext_suffix] + link_args
+        )
+        timings["link"] = time.perf_counter() - start
+
+        self.timings = timings
+        message = "build of %s: cython %.2fs, C compilation %.2fs%s, %s %.2fs" % (
+            self.module_name,
+            timings["cython"],
+            timings["compile"],
+            " (cached)" if cached else "",
+            "link" if jobs == 1 else "code generation in %d jobs and link" % jobs,
+            timings["link"],
+        )
+        log.info(message)
+        if self.verbose:
+            print(message)
+
+    def _cythonize(self):
+        """translate the pyx file in C in the process"""
+        from Cython.Compiler.Main import CompilationOptions, compile_single
+
+        c_file = self.full_path + ".c"
+        options = CompilationOptions(language_level=3, output_file=c_file)
+        try:
+            result = compile_single(
+                self.full_path + ".pyx", options, full_module_name=self.module_name
+            )
+        except Exception as e:
+            raise CodeWrapError("Error while cythonizing %s:\n%s" % (self.full_path, e))
+        if result.num_errors:
+            raise CodeWrapError("Error while cythonizing %s" % self.full_path)
+        return c_file
+
+    def _get_compile_command(self, cc):
+        """return the command which compiles a C file of Cython"""
+        import numpy as np
+
+        command = cc + [
+            "-I%s" % np.get_include(),
+            "-I%s" % sysconfig.get_paths()["include"],
+        ]
+        return command + self._get_compile_args()
+
+    def _object_file(self, command):
+        """
+        return the name of the object file of the module in the cache
+
+        The file exists if the same pyx file has already been built
+        with the same command.
+        """
+        import Cython
+
+        sha = hashlib.sha256(" ".join(command).encode())
+        sha.update(Cython.__version__.encode())
+        sha.update(self.module_name.encode())
+        with open(self.full_path + ".pyx", "rb") as f:
+            sha.update(f.read())
+        objdir = os.path.join(self.cache or self.workdir, "objects")
+        return os.path.join(objdir, sha.hexdigest()[:32] + ".o")
+
+    def _compile(self, command, c_file, obj_file):
+        """compile the C file and add the object file to the cache"""
+        os.makedirs(os.path.dirname(obj_file), exist_ok=True)
+        tmp_file = self.full_path + ".o"
+        self._run(command + ["-c", c_file, "-o", tmp_file])
+        os.replace(tmp_file, obj_file)
+
+
+class CCodeWrapper(CodeWrapper):
+    """
+    Build the shared library of the C routines
+
+    The C file is compiled and linked in one command by the C compiler
+    used to build Python (or given by the environment variable CC).
+    The library is loaded by ctypes in the generated Python module.
+    The flags are added to the options of the C compiler
+    (for example -march=native).
+    """
+
+    compile_args = ["-O3", "-std=c99", "-fPIC", "-fopenmp-simd", "-w"]
+    openmp_args = ["-fopenmp"]
+    # the durations of the steps of the last build
+    timings = None
+
+    @property
+    def signature(self):
+        return super().signature + [self.compile_args, self._get_compiler()]
+
+    @staticmethod
+    def _get_compiler():
+        """return the command of the C compiler"""
+        return shlex.split(
+            os.environ.get("CC") or sysconfig.get_config_var("CC") or "cc"
+        )
+
+    @property
+    def command(self):
+        args = list(self.compile_args)
+        if self.openmp:
+            args += self.openmp_args
+        return (
+            self._get_compiler()
+            + args
+            + list(self.flags)
+            + [
+                "-shared",
+                self.full_path + ".c",
+                "-o",
+                self.full_path + self.generator.library_suffix,
+                "-lm",
+            ]
+        )
+
+    def _prepare_files(self, routines):
+        pass
+
+    def _process_files(self, routines):
+        if log.isEnabledFor(logging.DEBUG):
+            with open(self.full_path + ".c") as f:
+                log.debug("code of %s:\n%s", self.module_name, f.read())
+
+        start = time.perf_counter()
+        super()._process_files(routines)
+        self.timings = {"compile": time.perf_counter() - start}
+
+        message = "build of %s: C compilation %.2fs" % (
+            self.module_name,
+            self.timings["compile"],
+        )
+        log.info(message)
+        if self.verbose:
+            print(message)
+
 
 class PythonCodeWrapper(CodeWrapper):
     @property
@@ -152,11 +490,34 @@ class PythonCodeWrapper(CodeWrapper):
             print(open(self.full_path + ".py").read())
 
 
+class NumbaCodeWrapper(PythonCodeWrapper):
+    """
+    Import the Python module of the routines compiled by Numba
+
+    The functions are compiled at their first call and Numba caches the
+    machine code next to the module: the compilation is done once for
+    the modules of the cache or of the given directory. The modules
+    written in a temporary directory are removed after the import, the
+    caching of Numba is then disabled.
+    """
+
+    def __init__(self, generator, filepath=None, *args, **kwargs):
+        super().__init__(generator, filepath, *args, **kwargs)
+        self.generator.jit_cache = bool(self.cache or self.filepath)
+
+    def _import_module(self):
+        if importlib.util.find_spec("numba") is None:
+            raise ImportError("Please install numba")
+        return super()._import_module()
+
+
 def get_code_wrapper(backend):
     CodeWrapClass = {
         "NUMPY": PythonCodeWrapper,
         "CYTHON": CythonCodeWrapper,
         "LOOPY": PythonCodeWrapper,
+        "NUMBA": NumbaCodeWrapper,
+        "C": CCodeWrapper,
     }.get(backend.upper())
     if CodeWrapClass is None:
         raise ValueError("Language '%s' is not supported." % backend)
@@ -171,9 +532,28 @@ def autowrap(
     args=None,
     flags=[],
     verbose=False,
+    cache=None,
+    openmp=False,
+    jobs=1,
 ):
     code_generator = get_code_generator(backend, "project")
     CodeWrapperClass = get_code_wrapper(backend)
-    code_wrapper = CodeWrapperClass(code_generator, tempdir, flags, generate, verbose)
+    code_wrapper = CodeWrapperClass(
+        code_generator, tempdir, flags, generate, verbose, cache, openmp, jobs
+    )
 
     return code_wrapper.wrap_code(routines)
+
+
+def get_cache_directory():
+    """
+    return the directory of the cache of the compiled modules
+
+    It is given by the environment variable PYLBM_CACHE_DIR,
+    the default is pylbm in the user cache directory.
+    """
+    directory = os.environ.get("PYLBM_CACHE_DIR")
+    if directory:
+        return os.path.realpath(os.path.expanduser(directory))
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join("~", ".cache")
+    return os.path.realpath(os.path.join(os.path.expanduser(cache_home), "pylbm"))
@@ -100,10 +100,11 @@ unsurmountable issues that can only be tackled with dedicated code generator:
 
 """
 
+import collections
 from io import StringIO
 
 from sympy import __version__ as sympy_version
-from .ast import Assignment, WithBody
+from .ast import Assignment, For, WithBody
 
 # from sympy.codegen import Assignment
 from sympy.core import Symbol, S, Tuple, Equality, Function, Basic
@@ -120,10 +121,14 @@ from sympy.matrices import (
 from .printing.pycode import NumPyPrinter
 from .printing.cython import CythonCodePrinter
 from .printing.loopy import LoopyCodePrinter
+from .printing.numba import NumbaCodePrinter
+from .printing.c import CCodePrinter
 
 __all__ = [
     # description of routines
     "Routine",
+    "Driver",
+    "DriverCall",
     "Argument",
     "InputArgument",
     "OutputArgument",
@@ -131,7 +136,9 @@ __all__ = [
     # routines -> code
     "CodeGen",
     "CythonCodeGen",
+    "CCodeGen",
     "NumPyCodeGen",
+    "NumbaCodeGen",
     "LoopyCodeGen",
     # friendly functions
     "codegen",
@@ -297,6 +304,86 @@ class Routine:
         return args
 
 
+class DriverCall:
+    """Call of a routine inside a driver.
+
+    Parameters
+    ==========
+
+    name : string
+        Name of the called routine.
+
+    prefix : string, optional
+        Prefix added to the names of the arguments of the routine in the
+        argument list of the driver. It avoids conflicts between routines
+        which use the same names for different data.
+
+    shared : iterable, optional
+        Names of the arguments which are not prefixed: they are shared
+        with the other calls of the driver.
+
+    copies : iterable, optional
+        List of (destination, source) tuples. The source array is copied
+        into the destination array before the call if the destination is
+        an argument of the routine.
+
+    """
+
+    def __init__(self, name, prefix="", shared=(), copies=()):
+        self.name = name
+        self.prefix = prefix
+        self.shared = set(shared)
+        self.copies = list(copies)
+
+    def argument_name(self, name):
+        """Returns the name of the argument in the driver."""
+        if name in self.shared:
+            return name
+        return self.prefix + name
+
+    def __str__(self):
+        return "%s(%r, %r)" % (self.__class__.__name__, self.name, self.prefix)
+
+    __repr__ = __str__
+
+
+class Driver:
+    """Description of a routine which calls several routines in a loop.
+
+    A driver performs ``nsteps`` iterations of a sequence of calls without
+    going back to Python. The routines used by the driver must be in the
+    same module.
+
+    Parameters
+    ==========
+
+    name : string
+        Name of the driver in the generated code.
+
+    calls : list of DriverCall
+        The routines called at each iteration (in this order).
+
+    swap : iterable, optional
+        List of (a, b) tuples of arrays swapped at the end of each iteration.
+
+    increments : iterable, optional
+        List of (variable, step) tuples: variable is incremented by step at
+        the end of each iteration if it is an argument of the driver.
+
+    """
+
+    def __init__(self, name, calls, swap=(), increments=()):
+        self.name = name
+        self.calls = list(calls)
+        self.swap = list(swap)
+        self.increments = list(increments)
+
+    def __str__(self):
+        return "%s(%r, %s)" % (self.__class__.__name__, self.name, self.calls)
+
+    __repr__ = __str__
+
+
 COMPLEX_ALLOWED = False
 
 
@@ -578,6 +665,11 @@ class CodeGen:
 
     printer = None  # will be set to an instance of a CodePrinter subclass
     default_datatypes = None
+    # the type of the floats in single precision
+    single_datatype = None
+    # the arrays of the unknowns: they are stored in single precision
+    # when the setting dtype of the routine is float32
+    storage_arrays = ("f", "fnew", "fcopy", "m", "rhs")
     has_output = True
 
     def _indent_code(self, codelines):
@@ -600,6 +692,24 @@ class CodeGen:
     def _get_type(self, stype):
         return self.default_datatypes[stype]
 
+    def _get_float_type(self, routine, setting="dtype"):
+        """Returns the type of the floats of the unknowns of the routine.
+
+        The setting local_dtype gives the type of the local variables.
+        """
+        dtype = routine.settings.get(setting, None) or routine.settings.get(
+            "dtype", "float64"
+        )
+        if dtype == "float32":
+            return self.single_datatype
+        return self._get_type("float")
+
+    def _get_argument_type(self, routine, arg):
+        """Returns the type of the elements of an argument."""
+        if arg.datatype != "int" and self._get_symbol(arg.name) in self.storage_arrays:
+            return self._get_float_type(routine)
+        return self._get_type(arg.datatype)
+
     def _get_symbol(self, s):
         """Returns the symbol as fcode prints it."""
         if self.printer._settings["human"]:
@@ -814,9 +924,16 @@ class CodeGen:
         local_vars.update(user_local_vars)
         local_symbols.update(local_vars)
 
+        # the bounds of the loops which are not given by the shape of an
+        # array (the number of fluid nodes of a sparse storage for example)
+        bounds = set()
+        for i in idx_vars:
+            bounds |= i.args[1].free_symbols if len(i.args) > 1 else set()
+        bounds -= {i.label for i in idx_vars}
+
         # symbols that should be arguments
         symbols = (
-            (expressions.free_symbols | local_expressions.free_symbols)
+            (expressions.free_symbols | local_expressions.free_symbols | bounds)
             - local_symbols
             - global_vars
         )
@@ -970,6 +1087,9 @@ class CodeGen:
 
         code_lines = self._preprocessor_statements(prefix)
 
+        drivers = [r for r in routines if isinstance(r, Driver)]
+        routines = [r for r in routines if not isinstance(r, Driver)]
+
         for routine in routines:
             if empty:
                 code_lines.append("\n")
@@ -984,6 +1104,11 @@ class CodeGen:
                 code_lines.append("\n")
             code_lines.extend(self._get_routine_ending(routine))
 
+        for driver in drivers:
+            if empty:
+                code_lines.append("\n")
+            code_lines.extend(self._get_driver(driver, routines))
+
         code_lines = self._indent_code("".join(code_lines))
 
         if header:
@@ -992,6 +1117,15 @@ class CodeGen:
         if code_lines:
             f.write(code_lines)
 
+    def _get_driver(self, driver, routines):
+        """Returns the code of a driver.
+
+        The default is to ignore the drivers: the backends which can
+        not perform several time steps without going back to Python
+        don't generate them.
+        """
+        return []
+
 
 class CodeGenError(Exception):
     pass
@@ -1022,6 +1156,7 @@ class CythonCodeGen(CodeGen):
     has_output = False
 
     default_datatypes = {"int": "int", "float": "double", "complex": "double"}
+    single_datatype = "float"
 
     def __init__(self, project="project", printer=None, settings={}):
         super(CythonCodeGen, self).__init__(project)
@@ -1044,24 +1179,15 @@ class CythonCodeGen(CodeGen):
             "#cython: binding=True\n",
             "#import cython\n",
             "from libc.math cimport *\n",
+            "from cython.parallel cimport prange\n",
         ]
         return code_lines + ["\n\n"]
 
     def _preprocessor_statements(self, prefix):
         return []
 
-    def _get_routine_opening(self, routine):
-        """Returns the opening statements of the routine."""
-        code_list = []
-
-        export = True
-        # export = self.settings.pop('export', True)
-        if export:
-            code_list.append("def ")
-        else:
-            code_list.append("cdef void ")
-
-        # Inputs
+    def _get_argument_list(self, routine):
+        """Returns the typed arguments of the routine."""
         args = []
 
         for arg in routine.arguments:
@@ -1075,34 +1201,37 @@ class CythonCodeGen(CodeGen):
 
                 if not arg.dimensions:
                     # If it is a scalar
-                    if isinstance(arg, ResultBase):
-                        # if it is an output
-                        args.append("*%s %s" % (self._get_type(arg.datatype), name))
-                    else:
-                        # if it is an output
-                        args.append("%s %s" % (self._get_type(arg.datatype), name))
+                    args.append("%s %s" % (self._get_type(arg.datatype), name))
                 else:
-                    if not export and len(arg.dimensions) == 1:
-                        # if the dimension is 1
-                        args.append("*%s %s" % (self._get_type(arg.datatype), name))
-                    else:
-                        array_type = (
-                            self._get_type(arg.datatype)
-                            + "["
-                            + ", ".join([":"] * len(arg.dimensions))
-                            + ":1]"
-                        )
-                        args.append("%s %s" % (array_type, name))
+                    array_type = (
+                        self._get_argument_type(routine, arg)
+                        + "["
+                        + ", ".join([":"] * len(arg.dimensions))
+                        + ":1]"
+                    )
+                    args.append("%s %s" % (array_type, name))
             else:
                 raise CodeGenError("Unknown Argument type: %s" % type(arg))
+        return args
 
-        args = ", ".join(args)
-        code_list.append(
-            "%s(%s)%s\n" % (routine.name, args, ":" if export else " nogil:")
-        )
-        code_list = ["".join(code_list)]
+    def _get_routine_opening(self, routine):
+        """Returns the opening statements of the routine.
 
-        return code_list
+        Each routine is written as a cdef function without the GIL which
+        can be called from a driver and a Python wrapper with the same
+        name.
+        """
+        args = self._get_argument_list(routine)
+        names = [self._get_symbol(arg.name) for arg in routine.arguments]
+
+        code_list = [
+            "def %s(%s):\n" % (routine.name, ", ".join(args)),
+            "_%s(%s)\n" % (routine.name, ", ".join(names)),
+            "#end\n",
+            "\n",
+            "cdef void _%s(%s) noexcept nogil:\n" % (routine.name, ", ".join(args)),
+        ]
+        return ["".join(code_list)]
 
     def _declare_arguments(self, routine):
         return []
@@ -1112,20 +1241,47 @@ class CythonCodeGen(CodeGen):
 
     def _declare_locals(self, routine):
         args = []
+        idx_names = []
         for idx in routine.idx_vars:
-            args.append("cdef int %s\n" % self._get_symbol(idx))
+            name = self._get_symbol(idx)
+            if name not in idx_names:
+                idx_names.append(name)
+                args.append("cdef int %s\n" % name)
 
+        private_arrays = self._get_private_arrays(routine)
+        dtype = self._get_float_type(routine, "local_dtype")
         for g in routine.local_vars:
             if isinstance(g, Symbol):
-                args.append("cdef double %s\n" % (self._get_symbol(g)))
+                args.append("cdef %s %s\n" % (dtype, self._get_symbol(g)))
+            elif self._get_symbol(g) in private_arrays:
+                name = self._get_symbol(g)
+                scalars = ", ".join(
+                    "%s_%d" % (name, i) for i in range(g.shape[0] * g.shape[1])
+                )
+                args.append("cdef %s %s\n" % (dtype, scalars))
             else:
                 shape = [d for d in g.shape if d != 1]
                 args.append(
-                    "cdef double %s[%s]\n"
-                    % (self._get_symbol(g), ",".join("%s" % s for s in shape))
+                    "cdef %s %s[%s]\n"
+                    % (dtype, self._get_symbol(g), ",".join("%s" % s for s in shape))
                 )
         return ["".join(args)]
 
+    def _get_private_arrays(self, routine):
+        """Returns the names of the local arrays stored in scalars.
+
+        The loops are shared between the threads when the setting threads
+        of the routine is positive: the local arrays are then replaced by
+        scalars which are private to each thread.
+        """
+        if not routine.settings.get("threads", 0):
+            return set()
+        return {
+            self._get_symbol(g)
+            for g in routine.local_vars
+            if isinstance(g, MatrixSymbol)
+        }
+
     def _call_printer(self, routine):
         code_lines = []
 
@@ -1149,13 +1305,22 @@ class CythonCodeGen(CodeGen):
                 expr = Assignment(statement.lhs, statement.rhs)
 
             settings = routine.settings
-            settings.update(dict(human=False, dereference=dereference))
+            settings.update(
+                dict(
+                    human=False,
+                    dereference=dereference,
+                    private_arrays=self._get_private_arrays(routine),
+                )
+            )
             constants, not_c, c_expr = self._printer_method_with_settings(
                 "doprint", settings, expr
             )
 
             for name, value in sorted(constants, key=str):
-                code_lines.append("double const %s = %s;\n" % (name, value))
+                code_lines.append(
+                    "%s const %s = %s;\n"
+                    % (self._get_float_type(routine, "local_dtype"), name, value)
+                )
             code_lines.append("%s\n" % c_expr)
 
         return code_lines
@@ -1163,6 +1328,71 @@ class CythonCodeGen(CodeGen):
     def _get_routine_ending(self, routine):
         return ["#end\n"]
 
+    def _get_driver(self, driver, routines):
+        """Returns the code of a driver.
+
+        The driver is a Python function with the argument nsteps and the
+        arguments of all the called routines. The loop over the iterations
+        is done without the GIL and only calls the cdef functions.
+        """
+        routines = {r.name: r for r in routines}
+
+        arguments = collections.OrderedDict()
+        body = []
+        for call in driver.calls:
+            routine = routines.get(call.name, None)
+            if routine is None:
+                raise CodeGenError(
+                    "Driver %s: unknown routine %s" % (driver.name, call.name)
+                )
+            names = [self._get_symbol(arg.name) for arg in routine.arguments]
+            for name, decl in zip(names, self._get_argument_list(routine)):
+                new_name = call.argument_name(name)
+                dtype = decl[: -len(name)].strip()
+                if arguments.setdefault(new_name, dtype) != dtype:
+                    raise CodeGenError(
+                        "Driver %s: argument %s has several types"
+                        % (driver.name, new_name)
+                    )
+            for dest, source in call.copies:
+                if dest in names:
+                    # the source has the type of the destination if it is
+                    # not an argument of a routine
+                    arguments.setdefault(
+                        call.argument_name(source),
+                        arguments[call.argument_name(dest)],
+                    )
+                    body.append(
+                        "%s[...] = %s\n"
+                        % (call.argument_name(dest), call.argument_name(source))
+                    )
+            body.append(
+                "_%s(%s)\n"
+                % (call.name, ", ".join(call.argument_name(n) for n in names))
+            )
+
+        locals_ = ["cdef int it_\n"]
+        for i, (a, b) in enumerate(driver.swap):
+            if a in arguments and b in arguments:
+                locals_.append("cdef %s tmp%d_\n" % (arguments[a], i))
+                body.append("tmp%d_ = %s\n" % (i, a))
+                body.append("%s = %s\n" % (a, b))
+                body.append("%s = tmp%d_\n" % (b, i))
+
+        for var, step in driver.increments:
+            if var in arguments:
+                arguments.setdefault(step, "double")
+                body.append("%s = %s + %s\n" % (var, var, step))
+
+        args = ["int nsteps"] + ["%s %s" % (t, n) for n, t in arguments.items()]
+        code_lines = ["def %s(%s):\n" % (driver.name, ", ".join(args))]
+        code_lines.extend(locals_)
+        code_lines.append("with nogil:\n")
+        code_lines.append("for it_ in range(nsteps):\n")
+        code_lines.extend(body)
+        code_lines.extend(["#end\n"] * 3)
+        return code_lines
+
     def _indent_code(self, codelines):
         p = CythonCodePrinter()
         return p.indent_code(codelines)
@@ -1291,6 +1521,346 @@ class NumPyCodeGen(CodeGen):
     dump_fns = [dump_py]
 
 
+class NumbaCodeGen(NumPyCodeGen):
+    """Generator for Python code compiled by Numba.
+
+    The .write() method inherited from CodeGen will output a code file
+    <prefix>.py where each routine is decorated by njit. The loops are
+    written explicitly and the outermost loop of each loop nest is a prange
+    loop, except for the routines with the setting threads equal to 0.
+
+    The compiled functions are cached by Numba next to the generated file
+    when jit_cache is True: the file must then be kept on the disk.
+    The setting fastmath of the routines is given to njit.
+
+    """
+
+    jit_cache = True
+
+    def __init__(self, project="project", printer=None, settings={}):
+        super(NumbaCodeGen, self).__init__(project)
+        self.printer = printer or NumbaCodePrinter(settings)
+
+    def _get_header(self):
+        """Writes a common header for the generated files."""
+        code_lines = NumPyCodeGen._get_header(self)
+        code_lines.append("import math\n")
+        code_lines.append("from numba import njit, prange\n")
+        return code_lines
+
+    def _is_parallel(self, routine):
+        """Returns True if the loops of the routine are prange loops."""
+        if routine.settings.get("threads", None) == 0:
+            return False
+        return any(isinstance(s, For) for s in routine.statements)
+
+    def _get_routine_opening(self, routine):
+        """Returns the opening statements of the routine."""
+        code_list = NumPyCodeGen._get_routine_opening(self, routine)
+        decorator = "@njit(parallel=%s, cache=%s, fastmath=%s)\n" % (
+            self._is_parallel(routine),
+            self.jit_cache,
+            bool(routine.settings.get("fastmath", False)),
+        )
+        return [decorator] + code_list
+
+    def _get_routine_ending(self, routine):
+        # the arrays are modified in place
+        return ["#end\n"]
+
+    def _call_printer(self, routine):
+        declarations = []
+        code_lines = []
+
+        for statement in routine.statements:
+            expr = statement
+            if isinstance(statement, Equality):
+                expr = Assignment(statement.lhs, statement.rhs)
+
+            constants, not_supported, py_expr = self._printer_method_with_settings(
+                "doprint",
+                dict(human=False, parallel=self._is_parallel(routine)),
+                expr,
+            )
+
+            for obj, v in sorted(constants, key=str):
+                declarations.append("%s = %s\n" % (obj, v))
+            for obj in sorted(not_supported, key=str):
+                if isinstance(obj, Function):
+                    name = obj.func
+                else:
+                    name = obj
+                declarations.append("# unsupported: %s\n" % (name))
+            code_lines.append("%s\n" % (py_expr))
+        return declarations + code_lines
+
+    def _indent_code(self, codelines):
+        p = NumbaCodePrinter()
+        return p.indent_code(codelines)
+
+    def dump_py(self, routines, f, prefix, header=True, empty=True):
+        self.dump_code(routines, f, prefix, header, empty)
+
+    dump_py.extension = NumPyCodeGen.code_extension
+    dump_py.__doc__ = CodeGen.dump_code.__doc__
+
+    dump_fns = [dump_py]
+
+
+class CCodeGen(CodeGen):
+    """Generator for C99 code called through ctypes.
+
+    The .write() method inherited from CodeGen will output a code file
+    <prefix>.c and a Python module <prefix>.py. The C file is a standalone
+    translation unit where each routine is a function with restrict
+    pointers. It is compiled in a shared library <prefix>_c.so which is
+    loaded by ctypes in the Python module.
+
+    Each array is given by its pointer and by the strides of its axes
+    except the last one which must be contiguous. The local arrays are
+    stored in scalars, the outermost loop of each loop nest is shared
+    between the threads by OpenMP when the setting threads of the routine
+    is positive and the innermost loop is vectorized by omp simd, except
+    for the routines with the setting threads equal to 0.
+
+    """
+
+    code_extension = "c"
+    has_output = False
+
+    default_datatypes = {"int": "int", "float": "double", "complex": "double"}
+    single_datatype = "float"
+    ctypes_datatypes = {
+        "int": "ctypes.c_int",
+        "double": "ctypes.c_double",
+        "float": "ctypes.c_float",
+    }
+    numpy_datatypes = {
+        "int": "numpy.intc",
+        "double": "numpy.float64",
+        "float": "numpy.float32",
+    }
+    # the suffix of the shared library added to the name of the module
+    library_suffix = "_c.so"
+
+    def __init__(self, project="project", printer=None, settings={}):
+        super(CCodeGen, self).__init__(project)
+        self.printer = printer or CCodePrinter(settings)
+
+    def _get_header(self):
+        code_lines = ["/*\n"]
+        tmp = header_comment % {"version": sympy_version, "project": self.project}
+        for line in tmp.splitlines():
+            code_lines.append(" *%s\n" % (" " + line if line else ""))
+        code_lines += [
+            " */\n",
+            "#include <math.h>\n",
+            "#include <stddef.h>\n",
+            "#ifndef M_PI\n",
+            "#define M_PI 3.14159265358979323846\n",
+            "#endif\n",
+            "#ifndef M_E\n",
+            "#define M_E 2.7182818284590452354\n",
+            "#endif\n",
+        ]
+        return code_lines + ["\n"]
+
+    def _preprocessor_statements(self, prefix):
+        return []
+
+    def _get_arguments(self, routine):
+        """Returns the name, the type and the number of axes of the arguments."""
+        args = []
+        for arg in routine.arguments:
+            if isinstance(arg, OutputArgument):
+                raise CodeGenError("C: invalid argument of type %s" % str(type(arg)))
+            if not isinstance(arg, (InputArgument, InOutArgument)):
+                raise CodeGenError("Unknown Argument type: %s" % type(arg))
+            name = self._get_symbol(arg.name)
+            if arg.dimensions:
+                dtype = self._get_argument_type(routine, arg)
+            else:
+                dtype = self._get_type(arg.datatype)
+            args.append((name, dtype, len(arg.dimensions or ())))
+        return args
+
+    def _get_routine_opening(self, routine):
+        """Returns the opening statements of the routine.
+
+        The arrays are restrict pointers followed by the strides
+        of their axes (in number of elements).
+        """
+        args = []
+        for name, dtype, ndim in self._get_arguments(routine):
+            if ndim:
+                args.append("%s *restrict %s" % (dtype, name))
+                args += ["ptrdiff_t %s_s%d" % (name, d) for d in range(ndim - 1)]
+            else:
+                args.append("%s %s" % (dtype, name))
+        return ["void %s(%s) {\n" % (routine.name, ", ".join(args))]
+
+    def _declare_arguments(self, routine):
+        return []
+
+    def _declare_globals(self, routine):
+        return []
+
+    def _get_locals(self, routine):
+        """Returns the names of the local scalars of the routine."""
+        scalars = []
+        for g in routine.local_vars:
+            name = self._get_symbol(g)
+            if isinstance(g, Symbol):
+                scalars.append(name)
+            else:
+                # the local arrays are stored in scalars
+                scalars += ["%s_%d" % (name, i) for i in range(g.shape[0] * g.shape[1])]
+        return scalars
+
+    def _get_private(self, routine):
+        """Returns the names of the local scalars written in the loops.
+
+        The local scalars assigned outside the loops (the loop invariants
+        computed before the loops) are shared between the threads.
+        """
+        shared = {
+            self._get_symbol(s.lhs)
+            for s in routine.statements
+            if isinstance(s, (Equality, Assignment)) and isinstance(s.lhs, Symbol)
+        }
+        return [name for name in self._get_locals(routine) if name not in shared]
+
+    def _declare_locals(self, routine):
+        # the indices of the loops are declared in the loops
+        scalars = self._get_locals(routine)
+        if not scalars:
+            return []
+        dtype = self._get_float_type(routine, "local_dtype")
+        return ["%s %s;\n" % (dtype, ", ".join(scalars))]
+
+    def _call_printer(self, routine):
+        code_lines = []
+        threads = routine.settings.get("threads", None)
+        settings = dict(
+            human=False,
+            threads=threads or 0,
+            simd=threads != 0,
+            private=self._get_private(routine),
+            private_arrays={
+                self._get_symbol(g)
+                for g in routine.local_vars
+                if isinstance(g, MatrixSymbol)
+            },
+        )
+
+        for statement in routine.statements:
+            expr = statement
+            if isinstance(statement, Equality):
+                expr = Assignment(statement.lhs, statement.rhs)
+
+            constants, not_c, c_expr = self._printer_method_with_settings(
+                "doprint", settings, expr
+            )
+
+            for name, value in sorted(constants, key=str):
+                code_lines.append(
+                    "const %s %s = %s;\n"
+                    % (self._get_float_type(routine, "local_dtype"), name, value)
+                )
+            code_lines.append("%s\n" % c_expr)
+
+        return code_lines
+
+    def _get_routine_ending(self, routine):
+        return ["}\n"]
+
+    def _indent_code(self, codelines):
+        p = CCodePrinter()
+        return p.indent_code(codelines)
+
+    def dump_c(self, routines, f, prefix, header=True, empty=True):
+        self.dump_code(routines, f, prefix, header, empty)
+
+    dump_c.extension = code_extension
+    dump_c.__doc__ = CodeGen.dump_code.__doc__
+
+    def dump_py(self, routines, f, prefix, header=True, empty=True):
+        """Write the Python module which calls the C functions.
+
+        The module loads the shared library and defines a function with
+        the arguments of each routine which checks the arrays and calls
+        the C function with their pointers and their strides.
+        """
+        code_lines = []
+        if header:
+            tmp = header_comment % {"version": sympy_version, "project": self.project}
+            for line in tmp.splitlines():
+                code_lines.append("#%s\n" % ("   " + line if line else ""))
+        code_lines += [
+            "import os\n",
+            "import ctypes\n",
+            "import numpy\n",
+            "\n",
+            "_lib = ctypes.CDLL(os.path.splitext(__file__)[0] + %r)\n"
+            % self.library_suffix,
+            "\n\n",
+            "def _array(a, dtype, ndim):\n",
+            "    if a.dtype != dtype or a.ndim != ndim or (\n",
+            "        a.shape[-1] > 1 and a.strides[-1] != a.itemsize\n",
+            "    ):\n",
+            "        raise ValueError(\n",
+            '            "expected an array of %s with %d axes and a contiguous "\n',
+            '            "last axis" % (numpy.dtype(dtype), ndim)\n',
+            "        )\n",
+            "    strides = tuple(s // a.itemsize for s in a.strides[:-1])\n",
+            "    return (a.ctypes.data,) + strides\n",
+            "\n\n",
+            "def _restrict(name, *arrays):\n",
+            "    if len({a.ctypes.data for a in arrays}) < len(arrays):\n",
+            '        raise ValueError("%s: the arrays must be distinct" % name)\n',
+        ]
+
+        for routine in routines:
+            if isinstance(routine, Driver):
+                continue
+            args = self._get_arguments(routine)
+            argtypes, values = [], []
+            for name, dtype, ndim in args:
+                if ndim:
+                    argtypes += ["ctypes.c_void_p"] + ["ctypes.c_ssize_t"] * (ndim - 1)
+                    dtype = self.numpy_datatypes[dtype]
+                    values.append("*_array(%s, %s, %d)" % (name, dtype, ndim))
+                else:
+                    argtypes.append(self.ctypes_datatypes[dtype])
+                    values.append(
+                        "%s(%s)" % ("int" if dtype == "int" else "float", name)
+                    )
+            arrays = [name for name, _, ndim in args if ndim]
+
+            code_lines.append("\n\n")
+            code_lines.append(
+                "_lib.%s.argtypes = [%s]\n" % (routine.name, ", ".join(argtypes))
+            )
+            code_lines.append("_lib.%s.restype = None\n" % routine.name)
+            code_lines.append("\n\n")
+            code_lines.append(
+                "def %s(%s):\n" % (routine.name, ", ".join(a[0] for a in args))
+            )
+            if len(arrays) > 1:
+                code_lines.append(
+                    "    _restrict(%r, %s)\n" % (routine.name, ", ".join(arrays))
+                )
+            code_lines.append("    _lib.%s(%s)\n" % (routine.name, ", ".join(values)))
+
+        f.write("".join(code_lines))
+
+    dump_py.extension = "py"
+
+    # This list of dump functions is used by CodeGen.write to know which dump
+    # functions it has to call.
+    dump_fns = [dump_c, dump_py]
+
+
 class LoopyCodeGen(CodeGen):
     """Generator for Cython code.
 
@@ -1304,6 +1874,7 @@ class LoopyCodeGen(CodeGen):
     _default_settings = {"prefetch": None}
 
     default_datatypes = {"int": "int", "float": "float", "complex": "complex"}
+    single_datatype = "np.float32"
 
     def __init__(self, project="project", printer=None, settings={}):
         super(LoopyCodeGen, self).__init__(project)
@@ -1388,7 +1959,7 @@ class LoopyCodeGen(CodeGen):
                 name = self._get_symbol(arg.name)
                 if arg.dimensions:
                     dims = ["{}".format(d[1] - d[0] + 1) for d in arg.dimensions]
-                    dtype = self._get_type(arg.datatype)
+                    dtype = self._get_argument_type(routine, arg)
                     if dtype == "int":
                         dtype = "np.int32"
                     args.append(
@@ -1402,18 +1973,20 @@ class LoopyCodeGen(CodeGen):
                             name=name, dtype=self._get_type(arg.datatype)
                         )
                     )
+        float_type = self._get_float_type(routine, "local_dtype")
         for i, arg in enumerate(routine.local_vars):
             if isinstance(arg, Symbol):
                 args.append(
-                    'lp.TemporaryVariable("{name}", dtype=float)'.format(
-                        name=self._get_symbol(arg)
+                    'lp.TemporaryVariable("{name}", dtype={dtype})'.format(
+                        name=self._get_symbol(arg), dtype=float_type
                     )
                 )
             else:
                 dims = [d for d in arg.shape if d != 1]
                 args.append(
-                    'lp.TemporaryVariable("{name}", dtype=float, shape="{shape}")'.format(
+                    'lp.TemporaryVariable("{name}", dtype={dtype}, shape="{shape}")'.format(
                         name=self._get_symbol(arg),
+                        dtype=float_type,
                         shape=",".join("%s" % s for s in dims),
                     )
                 )
@@ -1488,6 +2061,8 @@ def get_code_generator(
         "NUMPY": NumPyCodeGen,
         "CYTHON": CythonCodeGen,
         "LOOPY": LoopyCodeGen,
+        "NUMBA": NumbaCodeGen,
+        "C": CCodeGen,
     }.get(language.upper())
     if CodeGenClass is None:
         raise ValueError("Language '%s' is not supported." % language)
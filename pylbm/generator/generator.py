@@ -2,20 +2,51 @@
 # pylint: disable=all
 
 import collections
-from .codegen import make_routine
+from .codegen import make_routine, Driver
 from .autowrap import autowrap
 
 
 class Generator:
-    def __init__(self, backend, directory=None, generate=True, verbose=False):
+    def __init__(
+        self,
+        backend,
+        directory=None,
+        generate=True,
+        verbose=False,
+        cache=None,
+        flags=(),
+        threads=0,
+        jobs=1,
+        dtype="float64",
+        local_dtype=None,
+        fastmath=False,
+    ):
         self.routines = collections.OrderedDict()
+        self.drivers = collections.OrderedDict()
         self.module = None
         self.directory = directory
         self.generate = generate
         self.backend = backend
         self.verbose = verbose
+        self.cache = cache
+        self.flags = list(flags)
+        self.threads = threads
+        # the number of parallel jobs of the compilation
+        self.jobs = jobs
+        self.dtype = dtype
+        # the type of the local variables (default is dtype)
+        self.local_dtype = local_dtype or dtype
+        # the floating point operations can be reordered by numba
+        self.fastmath = fastmath
 
     def add_routine(self, name_expr, local_vars=None, settings={}):
+        settings = dict(settings)
+        if self.threads:
+            settings.setdefault("threads", self.threads)
+        if self.fastmath:
+            settings.setdefault("fastmath", self.fastmath)
+        settings.setdefault("dtype", self.dtype)
+        settings.setdefault("local_dtype", self.local_dtype)
         self.routines[name_expr[0]] = make_routine(
             name_expr[0],
             name_expr[1],
@@ -24,11 +55,18 @@ class Generator:
             settings=settings,
         )
 
+    def add_driver(self, name, calls, swap=(), increments=()):
+        self.drivers[name] = Driver(name, calls, swap=swap, increments=increments)
+
     def compile(self):
         self.module = autowrap(
-            self.routines.values(),
+            list(self.routines.values()) + list(self.drivers.values()),
             self.backend,
             self.directory,
             generate=self.generate,
             verbose=self.verbose,
+            flags=self.flags,
+            cache=self.cache,
+            openmp=self.threads > 0,
+            jobs=self.jobs,
         )
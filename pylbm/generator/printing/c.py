@@ -0,0 +1,198 @@
+# FIXME: make pylint happy !
+# pylint: disable=all
+"""
+C code printer
+
+The expressions are printed like with the Cython printer but the
+statements, the loops and the conditions are written in C99. The arrays
+are given by a pointer and by the strides of their axes except the last
+one which is contiguous.
+"""
+from ..ast import Assignment
+from .cython import CythonCodePrinter
+
+
+class CCodePrinter(CythonCodePrinter):
+    """A printer to convert python expressions to strings of C99 code
+
+    The outermost loop of each loop nest is shared between the threads by
+    OpenMP when the setting threads is positive: the local variables given
+    in the setting private are then private to each thread. The innermost
+    loop is vectorized by the directive omp simd when the setting simd is
+    True.
+    """
+
+    printmethod = "_ccode"
+    language = "C"
+
+    _default_settings = dict(CythonCodePrinter._default_settings, simd=True, private=())
+
+    def _get_statement(self, codestring):
+        return "%s;" % codestring
+
+    def _get_comment(self, text):
+        return "/* {0} */".format(text)
+
+    def _declare_number_const(self, name, value):
+        return "const double {0} = {1};".format(name, value)
+
+    def _print_Indexed(self, expr):
+        name = self._print(expr.base.label)
+        index = [self._print(i) for i in expr.indices]
+        # the last axis is contiguous
+        offset = ["(%s)*%s_s%d" % (i, name, k) for k, i in enumerate(index[:-1])]
+        return "%s[%s]" % (name, " + ".join(offset + [index[-1]]))
+
+    def _print_MatrixElement(self, expr):
+        index = expr.j + expr.i * expr.parent.shape[1]
+        # the local arrays are stored in scalars
+        if str(expr.parent) in self._settings["private_arrays"]:
+            return "{0}_{1}".format(expr.parent, index)
+        name = self._print(expr.parent)
+        return "{0}[({1})*{0}_s0 + {2}]".format(name, expr.i, expr.j)
+
+    def _print_For(self, expr):
+        from ..ast import For, IdxRange
+
+        lines = []
+        index = expr.target
+        # the outermost loop is shared between the threads
+        parallel = self._settings["threads"] and not self._in_prange
+        # the innermost loop is vectorized
+        simd = self._settings["simd"] and not any(isinstance(e, For) for e in expr.body)
+        # the local variables are written at each iteration
+        private = ""
+        if self._settings["private"]:
+            private = " private(%s)" % ", ".join(self._settings["private"])
+        for k, i in enumerate(index):
+            if isinstance(i, IdxRange):
+                # the loop over the tiles
+                bounds = [i.start, i.stop, i.step]
+                label = self._print(getattr(i.label, "label", i.label))
+            else:
+                bounds = [i.lower, i.upper, 1]
+                label = self._print(i.label)
+            start, stop, step = [self._print(b) for b in bounds]
+            innermost = simd and k == len(index) - 1
+            if parallel and k == 0:
+                lines.append(
+                    "#pragma omp parallel for%s schedule(static) num_threads(%d)%s"
+                    % (" simd" if innermost else "", self._settings["threads"], private)
+                )
+            elif innermost:
+                lines.append("#pragma omp simd%s" % private)
+            lines.append(
+                "for (int {0} = {1}; {0} < {2}; {0} += {3}) {{".format(
+                    label, start, stop, step
+                )
+            )
+        self._in_prange = self._in_prange or parallel
+        try:
+            for e in expr.body:
+                temp1, temp2, addlines = self.doprint(e)
+                if isinstance(addlines, str):
+                    lines.append(addlines)
+                else:
+                    lines += addlines
+        finally:
+            if parallel:
+                self._in_prange = False
+        for i in index:
+            lines.append("}")
+        return "\n".join(lines)
+
+    def _print_If(self, expr):
+        lines = []
+        for c, e in expr.statement:
+            lines.append("if (%s) {" % self._print(c))
+            for ee in e:
+                temp1, temp2, output = self.doprint(ee)
+                lines.append(output)
+            lines.append("}")
+        return "\n".join(lines)
+
+    def _print_Piecewise(self, expr):
+        if not expr.args[-1].cond:
+            raise ValueError(
+                "All Piecewise expressions must contain an "
+                "(expr, True) statement to be used as a default "
+                "condition."
+            )
+        lines = []
+        if expr.has(Assignment):
+            for i, (e, c) in enumerate(expr.args):
+                code0 = self._print(e)
+                if i == 0:
+                    lines.append("if (%s) {" % self._print(c))
+                elif i == len(expr.args) - 1 and c == True:  # noqa: E712
+                    # nothing to do in the default case
+                    if not code0:
+                        break
+                    lines.append("else {")
+                else:
+                    lines.append("else if (%s) {" % self._print(c))
+                lines.append(code0)
+                lines.append("}")
+            return "\n".join(lines)
+        code = self._print(expr.args[-1].expr)
+        for e, c in reversed(expr.args[:-1]):
+            code = "((%s) ? (%s) : (%s))" % (self._print(c), self._print(e), code)
+        return code
+
+    def _print_And(self, expr):
+        return "(%s)" % " && ".join(self._print(a) for a in expr.args)
+
+    def _print_Or(self, expr):
+        return "(%s)" % " || ".join(self._print(a) for a in expr.args)
+
+    def _print_Not(self, expr):
+        return "(!%s)" % self._print(expr.args[0])
+
+    def _print_Max(self, expr):
+        code = self._print(expr.args[0])
+        for a in expr.args[1:]:
+            if expr.is_integer:
+                code = "((%s) > (%s) ? (%s) : (%s))" % (
+                    code,
+                    self._print(a),
+                    code,
+                    self._print(a),
+                )
+            else:
+                code = "fmax(%s, %s)" % (code, self._print(a))
+        return code
+
+    def _print_Min(self, expr):
+        code = self._print(expr.args[0])
+        for a in expr.args[1:]:
+            if expr.is_integer:
+                code = "((%s) < (%s) ? (%s) : (%s))" % (
+                    code,
+                    self._print(a),
+                    code,
+                    self._print(a),
+                )
+            else:
+                code = "fmin(%s, %s)" % (code, self._print(a))
+        return code
+
+    def indent_code(self, code):
+        """Accepts a string of code or a list of code lines"""
+
+        if isinstance(code, str):
+            code_lines = self.indent_code(code.splitlines(True))
+            return "".join(code_lines)
+
+        tab = "    "
+        code = [line.lstrip(" \t") for line in code]
+
+        pretty = []
+        level = 0
+        for line in code:
+            if line == "" or line == "\n":
+                pretty.append(line)
+                continue
+            level -= line.startswith("}")
+            pretty.append("%s%s" % (tab * level, line))
+            level += line.rstrip().endswith("{")
+        return pretty
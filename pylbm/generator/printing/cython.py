@@ -86,6 +86,8 @@ class CythonCodePrinter(CodePrinter):
         "dereference": set(),
         "error_on_reserved": False,
         "reserved_word_suffix": "_",
+        "threads": 0,
+        "private_arrays": set(),
     }
 
     def __init__(self, settings=None):
@@ -96,6 +98,7 @@ class CythonCodePrinter(CodePrinter):
         self.known_functions.update(userfuncs)
         self._dereference = set(settings.get("dereference", []))
         self.reserved_words = set(reserved_words)
+        self._in_prange = False
 
     def doprint(self, expr, assign_to=None):
         """
@@ -257,27 +260,55 @@ class CythonCodePrinter(CodePrinter):
         lines = []
         if expr.has(Assignment):
             for i, (e, c) in enumerate(expr.args):
+                code0 = self._print(e)
                 if i == 0:
-                    lines.append("if (%s):" % self._print(c))
-                elif i == len(expr.args) - 1 and c:
+                    lines.append("if %s:" % self._print(c))
+                elif i == len(expr.args) - 1 and c == True:  # noqa: E712
+                    # nothing to do in the default case
+                    if not code0:
+                        break
                     lines.append("else:")
                 else:
-                    lines.append("else if (%s):" % self._print(c))
-                code0 = self._print(e)
+                    lines.append("elif %s:" % self._print(c))
                 lines.append(code0)
-                lines.append("}")
+                lines.append("#end")
             return "\n".join(lines)
         else:
             # The piecewise was used in an expression, need to do inline
-            # operators. This has the downside that inline operators will
-            # not work for statements that span multiple lines (Matrix or
-            # Indexed expressions).
-            ecpairs = [
-                "((%s) ? (\n%s\n)\n" % (self._print(c), self._print(e))
-                for e, c in expr.args[:-1]
-            ]
-            last_line = ": (\n%s\n)" % self._print(expr.args[-1].expr)
-            return ": ".join(ecpairs) + last_line + " ".join([")" * len(ecpairs)])
+            # conditional expressions which are allowed without the GIL.
+            code = self._print(expr.args[-1].expr)
+            for e, c in reversed(expr.args[:-1]):
+                code = "(%s if %s else %s)" % (self._print(e), self._print(c), code)
+            return code
+
+    def _print_Relational(self, expr):
+        op = {"==": "==", "!=": "!=", "<": "<", "<=": "<=", ">": ">", ">=": ">="}
+        return "(%s %s %s)" % (
+            self._print(expr.lhs),
+            op[expr.rel_op],
+            self._print(expr.rhs),
+        )
+
+    def _print_And(self, expr):
+        return "(%s)" % " and ".join(self._print(a) for a in expr.args)
+
+    def _print_Or(self, expr):
+        return "(%s)" % " or ".join(self._print(a) for a in expr.args)
+
+    def _print_Max(self, expr):
+        # the builtin max of Cython keeps the integer type
+        func = "max" if expr.is_integer else "fmax"
+        code = self._print(expr.args[0])
+        for a in expr.args[1:]:
+            code = "%s(%s, %s)" % (func, code, self._print(a))
+        return code
+
+    def _print_Min(self, expr):
+        func = "min" if expr.is_integer else "fmin"
+        code = self._print(expr.args[0])
+        for a in expr.args[1:]:
+            code = "%s(%s, %s)" % (func, code, self._print(a))
+        return code
 
     def _print_ITE(self, expr):
         from sympy.functions import Piecewise
@@ -286,7 +317,12 @@ class CythonCodePrinter(CodePrinter):
         return self._print(_piecewise)
 
     def _print_MatrixElement(self, expr):
-        return "{0}[{1}]".format(expr.parent, expr.j + expr.i * expr.parent.shape[1])
+        index = expr.j + expr.i * expr.parent.shape[1]
+        # the local arrays are stored in scalars which are private
+        # to each thread in a prange loop
+        if str(expr.parent) in self._settings["private_arrays"]:
+            return "{0}_{1}".format(expr.parent, index)
+        return "{0}[{1}]".format(expr.parent, index)
 
     def _print_Symbol(self, expr):
         name = super(CythonCodePrinter, self)._print_Symbol(expr)
@@ -299,16 +335,53 @@ class CythonCodePrinter(CodePrinter):
             return name
 
     def _print_For(self, expr):
+        from ..ast import IdxRange
+
         lines = []
         index = expr.target
-        for i in index:
-            lines.append("for %s in range(%s, %s):" % (i.label, i.lower, i.upper))
-        for e in expr.body:
-            temp1, temp2, addlines = self.doprint(e)
-            if isinstance(addlines, str):
-                lines.append(addlines)
+        # the outermost loop is shared between the threads
+        parallel = self._settings["threads"] and not self._in_prange
+        for k, i in enumerate(index):
+            if isinstance(i, IdxRange):
+                # the loop over the tiles
+                bounds = [i.start, i.stop, i.step]
+                label = getattr(i.label, "label", i.label)
             else:
-                lines += addlines
+                bounds = [i.lower, i.upper]
+                label = i.label
+            if parallel and k == 0:
+                lines.append(
+                    'for %s in prange(%s, schedule="static", num_threads=%d):'
+                    % (
+                        label,
+                        ", ".join(self._print(b) for b in bounds),
+                        self._settings["threads"],
+                    )
+                )
+            elif isinstance(i, IdxRange):
+                # range is only a C loop when the sign of the step is known
+                start, stop, step = [self._print(b) for b in bounds]
+                lines.append(
+                    "for {0} from {1} <= {0} < {2} by {3}:".format(
+                        label, start, stop, step
+                    )
+                )
+            else:
+                lines.append(
+                    "for %s in range(%s):"
+                    % (label, ", ".join(self._print(b) for b in bounds))
+                )
+        self._in_prange = self._in_prange or parallel
+        try:
+            for e in expr.body:
+                temp1, temp2, addlines = self.doprint(e)
+                if isinstance(addlines, str):
+                    lines.append(addlines)
+                else:
+                    lines += addlines
+        finally:
+            if parallel:
+                self._in_prange = False
         for i in index:
             lines.append("#end")
         return "\n".join(lines)
@@ -0,0 +1,145 @@
+# FIXME: make pylint happy !
+# pylint: disable=all
+"""
+Numba code printer
+
+The expressions are printed as Python code like with the NumPy printer
+but the loops are written explicitly: the generated functions are
+compiled by the decorator njit of Numba.
+"""
+from ..ast import Assignment
+from .pycode import AbstractPythonCodePrinter, NumPyPrinter
+
+
+class NumbaCodePrinter(NumPyPrinter):
+    """
+    A printer to convert python expressions to strings of Python code
+    compiled by Numba.
+
+    The outermost loop of each loop nest is a prange loop when the
+    setting parallel is True. The local arrays are stored in scalars
+    which are private to each iteration of the prange loop.
+    """
+
+    printmethod = "_numbacode"
+    language = "Python with Numba"
+
+    _default_settings = dict(NumPyPrinter._default_settings, parallel=True)
+
+    def __init__(self, settings=None):
+        super(NumbaCodePrinter, self).__init__(settings)
+        self._in_prange = False
+
+    def _print_Indexed(self, expr):
+        elem = []
+        for i in range(expr.rank):
+            elem.append(self._print(expr.indices[i]))
+        return "%s[%s]" % (self._print(expr.base.label), ", ".join(elem))
+
+    def _print_Idx(self, expr):
+        return self._print(expr.label)
+
+    def _print_MatrixElement(self, expr):
+        index = expr.j + expr.i * expr.parent.shape[1]
+        return "{0}_{1}".format(expr.parent, index)
+
+    def _print_For(self, expr):
+        from ..ast import IdxRange
+
+        lines = []
+        index = expr.target
+        # the outermost loop is shared between the threads
+        parallel = self._settings["parallel"] and not self._in_prange
+        for k, i in enumerate(index):
+            if isinstance(i, IdxRange):
+                # the loop over the tiles
+                bounds = [i.start, i.stop, i.step]
+                label = getattr(i.label, "label", i.label)
+            else:
+                bounds = [i.lower, i.upper]
+                label = i.label
+            bounds = ", ".join(self._print(b) for b in bounds)
+            # prange only supports the loops with a unit step
+            if parallel and k == 0 and not isinstance(i, IdxRange):
+                lines.append("for %s in prange(%s):" % (label, bounds))
+            else:
+                lines.append("for %s in range(%s):" % (label, bounds))
+        self._in_prange = self._in_prange or parallel
+        try:
+            for e in expr.body:
+                temp1, temp2, addlines = self.doprint(e)
+                if isinstance(addlines, str):
+                    lines.append(addlines)
+                else:
+                    lines += addlines
+        finally:
+            if parallel:
+                self._in_prange = False
+        for i in index:
+            lines.append("#end")
+        return "\n".join(lines)
+
+    def _print_If(self, expr):
+        lines = []
+        for c, e in expr.statement:
+            lines.append("if %s:" % self._print(c))
+            for ee in e:
+                temp1, temp2, output = self.doprint(ee)
+                lines.append(output)
+            lines.append("#end")
+        return "\n".join(lines)
+
+    def _print_Piecewise(self, expr):
+        if not expr.args[-1].cond:
+            raise ValueError(
+                "All Piecewise expressions must contain an "
+                "(expr, True) statement to be used as a default "
+                "condition."
+            )
+        lines = []
+        if expr.has(Assignment):
+            for i, (e, c) in enumerate(expr.args):
+                code0 = self._print(e)
+                if i == 0:
+                    lines.append("if %s:" % self._print(c))
+                elif i == len(expr.args) - 1 and c == True:  # noqa: E712
+                    # nothing to do in the default case
+                    if not code0:
+                        break
+                    lines.append("else:")
+                else:
+                    lines.append("elif %s:" % self._print(c))
+                lines.append(code0)
+                lines.append("#end")
+            return "\n".join(lines)
+        code = self._print(expr.args[-1].expr)
+        for e, c in reversed(expr.args[:-1]):
+            code = "(%s if %s else %s)" % (self._print(e), self._print(c), code)
+        return code
+
+    def _print_Relational(self, expr):
+        return AbstractPythonCodePrinter._print_Relational(self, expr)
+
+    def _print_And(self, expr):
+        return "(%s)" % " and ".join(self._print(a) for a in expr.args)
+
+    def _print_Or(self, expr):
+        return "(%s)" % " or ".join(self._print(a) for a in expr.args)
+
+    def _print_Not(self, expr):
+        return "(not %s)" % self._print(expr.args[0])
+
+    def _print_Max(self, expr):
+        code = self._print(expr.args[0])
+        for a in expr.args[1:]:
+            code = "max(%s, %s)" % (code, self._print(a))
+        return code
+
+    def _print_Min(self, expr):
+        code = self._print(expr.args[0])
+        for a in expr.args[1:]:
+            code = "min(%s, %s)" % (code, self._print(a))
+        return code
+
+    def _print_Mod(self, expr):
+        return AbstractPythonCodePrinter._print_Mod(self, expr)
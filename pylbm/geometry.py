@@ -140,7 +140,7 @@ class Geometry:
                 if elemk.dim != self.dim:
                     raise ValueError("Element must have the same dimension of the box")
                 self.list_elem.append(elemk)
-        log.debug(self.__str__())
+        log.debug("%s", self)
 
     def __str__(self):
         from .utils import header_string
@@ -169,7 +169,7 @@ class Geometry:
     # pylint: disable=too-complex
     def visualize(
         self,
-        viewer_app=viewer.matplotlib_viewer,
+        viewer_app=None,
         figsize=(6, 4),
         viewlabel=False,
         viewgrid=False,
@@ -203,6 +203,8 @@ class Geometry:
             views
 
         """
+        if viewer_app is None:
+            viewer_app = viewer.matplotlib_viewer
         views = viewer_app.Fig(dim=self.dim, figsize=figsize)
         view = views[0]
 
@@ -10,12 +10,23 @@ HDF5 module
 import os
 import logging
 import numpy as np
+import sympy as sp
 import h5py
 import mpi4py.MPI as mpi
 
+from .storage import mpi_datatype
+
 log = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
 
+def _float_type(data):
+    """
+    return the type used to store the data: float32 data are stored
+    in single precision and the other data in double precision.
+    """
+    return np.float32 if np.asarray(data).dtype == np.float32 else np.double
+
+
 class H5File:
     """
     class to manage hfd5 and xdmf file.
@@ -51,6 +62,8 @@ class H5File:
         self.mpi_topo = mpi_topo
         self.scalars = {}
         self.vectors = {}
+        # the number of bytes of the floats of each dataset
+        self.precision = {}
         self._init_grid = True
         self._init_xdmf = init_xdmf
 
@@ -173,8 +186,8 @@ class H5File:
             ind = tuple(ind)
             if with_index:
                 ind = ind + (index,)
-            rcv_buffer = np.empty(buffer_size)
-            comm.Recv([rcv_buffer, mpi.DOUBLE], source=i, tag=index)
+            rcv_buffer = np.empty(buffer_size, dtype=dset.dtype)
+            comm.Recv([rcv_buffer, mpi_datatype(dset.dtype)], source=i, tag=index)
             dset[ind] = rcv_buffer
 
     def add_scalar(self, name, f, *fargs):
@@ -199,16 +212,16 @@ class H5File:
         else:
             data = f(*fargs)
 
+        dtype = _float_type(data)
         comm = self.mpi_topo.cartcomm
         if comm.Get_rank() == 0:
-            dset = self.h5file.create_dataset(
-                name, self.global_size[::-1], dtype=np.double
-            )
+            dset = self.h5file.create_dataset(name, self.global_size[::-1], dtype=dtype)
             self._set_dset(dset, comm, data)
             self.scalars[name] = self.h5filename + ":/" + name
+            self.precision[name] = dset.dtype.itemsize
         else:
             comm.Send(
-                [np.ascontiguousarray(data.T, dtype=np.double), mpi.DOUBLE],
+                [np.ascontiguousarray(data.T, dtype=dtype), mpi_datatype(dtype)],
                 dest=0,
                 tag=0,
             )
@@ -235,17 +248,23 @@ class H5File:
         else:
             datas = f(*fargs)
 
+        dtype = _float_type(datas[0])
         comm = self.mpi_topo.cartcomm
         if comm.Get_rank() == 0:
             dset = self.h5file.create_dataset(
-                name, self.global_size[::-1] + [3], dtype=np.double
+                name, self.global_size[::-1] + [3], dtype=dtype
             )
             for i, data in enumerate(datas):
                 self._set_dset(dset, comm, data, i, with_index=True)
             self.vectors[name] = self.h5filename + ":/" + name
+            self.precision[name] = dset.dtype.itemsize
         else:
             for i, data in enumerate(datas):
-                comm.Send([np.ascontiguousarray(data.T), mpi.DOUBLE], dest=0, tag=i)
+                comm.Send(
+                    [np.ascontiguousarray(data.T, dtype=dtype), mpi_datatype(dtype)],
+                    dest=0,
+                    tag=i,
+                )
 
     def save(self):
         """
@@ -299,12 +318,15 @@ class H5File:
                 self.xdmf_file.write(
                     """
                 <Attribute Name="{0}" AttributeType="Scalar" Center="Node">
-                <DataItem Format="HDF" Dimensions="{1}">
+                <DataItem Format="HDF" Dimensions="{1}" Precision="{3}">
                 {2}
                 </DataItem>
                 </Attribute>
                 """.format(
-                        k, " ".join(map(str, self.global_size[::-1])), v
+                        k,
+                        " ".join(map(str, self.global_size[::-1])),
+                        v,
+                        self.precision[k],
                     )
                 )
 
@@ -312,14 +334,164 @@ class H5File:
                 self.xdmf_file.write(
                     """
                 <Attribute Name="{0}" AttributeType="Vector" Center="Node">
-                <DataItem Format="HDF" Dimensions="{1} {2}">
+                <DataItem Format="HDF" Dimensions="{1} {2}" Precision="{4}">
                 {3}
                 </DataItem>
                 </Attribute>
                 """.format(
-                        k, " ".join(map(str, self.global_size[::-1])), self.dim, v
+                        k,
+                        " ".join(map(str, self.global_size[::-1])),
+                        self.dim,
+                        v,
+                        self.precision[k],
                     )
                 )
 
             self.xdmf_file.write("</Grid>\n</Domain>\n</Xdmf>\n")
             self.xdmf_file.close()
+
+
+def _interior(simulation):
+    """
+    return the slices of the interior points in the local array
+    of the distribution functions, the global region of the process
+    and the global shape of the distribution functions.
+    """
+    domain = simulation.domain
+    vmax = domain.stencil.vmax
+    local = [slice(None)]
+    for i in range(domain.dim):
+        local.append(slice(vmax[i], vmax[i] + domain.shape_in[i]))
+    region = domain.mpi_topo.get_region(*domain.global_size)
+    glob = [slice(None)] + [slice(r[0], r[1]) for r in region]
+    shape = (simulation.container.nv,) + tuple(int(n) for n in domain.global_size)
+    # the ensemble members are stored along the first axis
+    if simulation.container.nbatch is not None:
+        local.insert(0, slice(None))
+        glob.insert(0, slice(None))
+        shape = (simulation.container.nbatch,) + shape
+    return tuple(local), tuple(glob), shape
+
+
+def _use_mpio(comm):
+    return comm.Get_size() > 1 and h5py.get_config().mpi
+
+
+def save_checkpoint(simulation, filename):
+    """
+    save the state of a simulation in a hdf5 file.
+
+    The interior points of the distribution functions are stored in the
+    dataset F with the global shape (nv, nx, ny, nz), preceded by the
+    number of ensemble members if any, so that the file does
+    not depend on the MPI topology. Each process writes its hyperslab:
+    in parallel if h5py is built with MPI, one after the other otherwise.
+
+    Parameters
+    ----------
+
+    simulation : Simulation
+        the simulation to save
+
+    filename : str
+        the name of the hdf5 file
+
+    """
+    comm = mpi.COMM_WORLD
+    rank = comm.Get_rank()
+    container = simulation.container
+    f = container.F
+
+    if f.gpu_support:
+        f.array_cpu[...] = f.array.get()
+
+    local, glob, shape = _interior(simulation)
+    data = f.swaparray[local]
+    # the distribution functions are saved and not their deviations
+    if f.reference is not None:
+        data = data + f.reference_view[local]
+
+    def write_header(h5file):
+        dset = h5file.create_dataset("F", shape, dtype=data.dtype)
+        h5file.attrs["t"] = simulation.t
+        h5file.attrs["nt"] = simulation.nt
+        h5file.attrs["codegen_directory"] = simulation.generator.directory or ""
+        extra = h5file.create_group("extra_parameters")
+        for k, v in simulation.extra_parameters.items():
+            extra.attrs[str(k)] = v
+        return dset
+
+    if _use_mpio(comm):
+        with h5py.File(filename, "w", driver="mpio", comm=comm) as h5file:
+            dset = write_header(h5file)
+            with dset.collective:
+                dset[glob] = data
+    else:
+        if rank == 0:
+            with h5py.File(filename, "w") as h5file:
+                write_header(h5file)
+        for i in range(comm.Get_size()):
+            if rank == i:
+                with h5py.File(filename, "a") as h5file:
+                    h5file["F"][glob] = data
+            comm.Barrier()
+
+
+def load_checkpoint(simulation, filename):
+    """
+    restore the state of a simulation from a hdf5 file.
+
+    The file can be written with another MPI topology: each process
+    reads the hyperslab of its own region.
+
+    Parameters
+    ----------
+
+    simulation : Simulation
+        the simulation to update
+
+    filename : str
+        the name of the hdf5 file
+
+    """
+    comm = mpi.COMM_WORLD
+    f = simulation.container.F
+    local, glob, shape = _interior(simulation)
+
+    if _use_mpio(comm):
+        h5file = h5py.File(filename, "r", driver="mpio", comm=comm)
+    else:
+        h5file = h5py.File(filename, "r")
+
+    with h5file:
+        dset = h5file["F"]
+        if dset.shape != shape:
+            log.error(
+                "The checkpoint %s has the shape %s but the simulation needs %s",
+                filename,
+                dset.shape,
+                shape,
+            )
+            raise ValueError("checkpoint incompatible with the simulation")
+        if f.reference is None:
+            f.swaparray[local] = dset[glob]
+        else:
+            f.swaparray[local] = dset[glob] - f.reference_view[local]
+        simulation.t = float(h5file.attrs["t"])
+        simulation.nt = int(h5file.attrs["nt"])
+        keys = {str(k): k for k in simulation.extra_parameters}
+        for k, v in h5file["extra_parameters"].attrs.items():
+            simulation.extra_parameters[keys.get(k, sp.Symbol(k))] = v
+
+    if f.gpu_support:
+        f.array.set(f.array_cpu)
+
+
+def checkpoint_codegen_directory(filename):
+    """
+    return the directory of the generated code used by the
+    simulation saved in a checkpoint (empty string if the code
+    was generated in a temporary directory).
+    """
+    with h5py.File(filename, "r") as h5file:
+        return str(h5file.attrs.get("codegen_directory", ""))
@@ -7,13 +7,18 @@
 """
 pylbm CLI options
 """
-from argparse import ArgumentParser
+from functools import lru_cache
 
 
+@lru_cache(maxsize=None)
 def options():
     """
     pylbm command line options
+
+    The command line is parsed only once.
     """
+    from argparse import ArgumentParser
+
     parser = ArgumentParser()
     logging = parser.add_argument_group("log")
     logging.add_argument(
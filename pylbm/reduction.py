@@ -0,0 +1,171 @@
+# Authors:
+#     Loic Gouarin <loic.gouarin@polytechnique.edu>
+#     Benjamin Graille <benjamin.graille@math.u-psud.fr>
+#
+# License: BSD 3 clause
+
+"""
+Global reductions of the moments computed in the generated one_time_step.
+"""
+import sys
+import logging
+import numpy as np
+import sympy as sp
+import mpi4py.MPI as mpi
+
+log = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+# initial value of the accumulator and MPI operation for each reduction
+OPERATIONS = {
+    "sum": (0.0, mpi.SUM),
+    "l2": (0.0, mpi.SUM),
+    "max": (-np.inf, mpi.MAX),
+    "min": (np.inf, mpi.MIN),
+}
+
+
+class Reductions:
+    """
+    Global reductions of the moments declared in the dictionary.
+
+    The key 'reductions' of the dictionary gives for each name
+    a dictionary with the keys
+
+    - 'expr': the expression of the conserved moments and of the parameters
+      which is reduced,
+    - 'op': the operation which is 'sum', 'max', 'min' or 'l2'
+      (the square root of the sum of the squares), the default is 'sum',
+    - 'x', 'y', 'z' (optional): restrict the reduction to the plane or the
+      line of the points which are the nearest of these coordinates,
+    - 'increment' (optional): if True, the reduction is done on the
+      increment of the expression during the time step (default is False).
+
+    The reductions are accumulated in the loop of the generated one_time_step
+    after the relaxation, on the moments of the new distribution functions,
+    and reduced over the MPI processes after each time step.
+
+    Parameters
+    ----------
+
+    dico : dictionary
+        the dictionary of the simulation
+    domain : :py:class:`Domain<pylbm.domain.Domain>`
+        the domain of the simulation
+    scheme : :py:class:`Scheme<pylbm.scheme.Scheme>`
+        the scheme of the simulation
+    nbatch : int
+        the number of ensemble members (default is None)
+
+    Attributes
+    ----------
+
+    names : list
+        the names of the reductions
+    values : dict
+        the values of the reductions computed during the last time step
+        (an array with one value by ensemble member if there is an ensemble)
+
+    Examples
+    --------
+
+    >>> dico["reductions"] = {  # doctest: +SKIP
+    ...     "mass": {"expr": rho},
+    ...     "umax": {"expr": sp.sqrt(qx**2 + qy**2) / rho, "op": "max"},
+    ...     "qx_middle": {"expr": qx, "x": 0.5},
+    ...     "residual": {"expr": qx, "op": "l2", "increment": True},
+    ... }
+    """
+
+    def __init__(self, dico, domain, scheme, nbatch=None):
+        reductions = dico.get("reductions", {})
+        self.names = list(reductions)
+        self.ops = [reductions[n].get("op", "sum") for n in self.names]
+        self.exprs = [sp.sympify(reductions[n]["expr"]) for n in self.names]
+        self.increments = [reductions[n].get("increment", False) for n in self.names]
+        self.dims = [
+            [d for d, c in enumerate("xyz"[: domain.dim]) if c in reductions[n]]
+            for n in self.names
+        ]
+
+        allowed = set(scheme.consm) | set(scheme.param)
+        for name, expr in zip(self.names, self.exprs):
+            unknown = expr.free_symbols - allowed
+            if unknown:
+                log.error(
+                    "Solution: the reduction %s can only use the conserved moments "
+                    "and the parameters (found %s)\n",
+                    name,
+                    unknown,
+                )
+                sys.exit()
+
+        nred = len(self.names)
+        shape = (nbatch, nred) if nbatch is not None else (nred,)
+        self.init = np.empty(shape)
+        self.init[...] = [OPERATIONS[op][0] for op in self.ops]
+        self.local = self.init.copy()
+        self.index = self._get_index(reductions, domain)
+        self.values = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def _get_index(self, reductions, domain):
+        """
+        Return the array index of the points of the planes or the lines
+        in the local domain (-1 if they are not in the local domain).
+        """
+        vmax = domain.stencil.vmax
+        region = domain.mpi_topo.get_region(*domain.global_size)
+        index = -np.ones((max(len(self.names), 1), domain.dim), dtype=np.int32)
+        for k, name in enumerate(self.names):
+            for d in self.dims[k]:
+                # global index of the nearest point
+                xmin = domain.coords[d][0] - domain.dx * (region[d][0] + 0.5)
+                i = int(np.floor((reductions[name]["xyz"[d]] - xmin) / domain.dx))
+                i = min(max(i, 0), domain.global_size[d] - 1)
+                if region[d][0] <= i < region[d][1]:
+                    index[k, d] = i - region[d][0] + vmax[d]
+        return index
+
+    def algorithm_input(self):
+        """
+        Return the list of the reductions (operation, expression,
+        restricted dimensions, increment) used to generate the code.
+        """
+        return list(zip(self.ops, self.exprs, self.dims, self.increments))
+
+    def arguments(self):
+        """
+        Return the arrays used by the generated code.
+        """
+        return {
+            "reductions": self.local,
+            "reductions_init": self.init,
+            "reductions_index": self.index,
+        }
+
+    def reset(self):
+        """
+        Reset the accumulators before a time step.
+        """
+        self.local[...] = self.init
+
+    def update(self):
+        """
+        Reduce the accumulators over the MPI processes.
+        """
+        comm = mpi.COMM_WORLD
+        values = np.empty_like(self.local)
+        for k, op in enumerate(self.ops):
+            send = np.ascontiguousarray(self.local[..., k])
+            recv = np.empty_like(send)
+            comm.Allreduce(send, recv, op=OPERATIONS[op][1])
+            values[..., k] = recv
+            if op == "l2":
+                values[..., k] = np.sqrt(values[..., k])
+
+        if values.ndim == 1:
+            self.values = {n: float(values[k]) for k, n in enumerate(self.names)}
+        else:
+            self.values = {n: values[:, k].copy() for k, n in enumerate(self.names)}
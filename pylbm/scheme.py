@@ -16,7 +16,7 @@ from sympy.parsing.sympy_parser import parse_expr
 
 from .stencil import Stencil
 from .validator import validate
-from .symbolic import rel_ux, rel_uy, rel_uz, alltogether, SymbolicVector
+from .symbolic import rel_ux, rel_uy, rel_uz, alltogether, inverse, SymbolicVector
 
 # pylint: disable=too-many-lines
 
@@ -160,7 +160,7 @@ class Scheme:
         # TODO: add the possibility to have vectorial schemes when M matrix is defined
         if len(scheme) == 1 and "M" in scheme[0]:
             self.M = scheme[0]["M"]
-            self.invM = self.M.inv()
+            self.invM = inverse(self.M)
             self.Tu = sp.eye(*self.M.shape)
             self.Tmu = sp.eye(*self.M.shape)
             self.P = []
@@ -187,7 +187,7 @@ class Scheme:
         self._check_inverse(self.M, self.invM, "M")
         self._check_inverse_of_Tu()
 
-        log.info(self.__str__())
+        log.info("%s", self)
 
     def _get_space_and_time_symbolic(self):
         symb_t = self.param.get("time", sp.Symbol("t"))
@@ -498,7 +498,7 @@ class Scheme:
                         ]
                         Mu_[-1][i, j] = p[i].subs(sublist)
 
-            invM_.append(M_[-1].inv())
+            invM_.append(inverse(M_[-1]))
             Tu_.append(Mu_[-1] * invM_[-1])
 
         gshape = (self.stencil.nv_ptr[-1], self.stencil.nv_ptr[-1])
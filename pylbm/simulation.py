@@ -10,6 +10,9 @@ pylbm simulation
 
 import os
 import sys
+import json
+import time
+import hashlib
 import logging
 import types
 import numpy as np
@@ -22,14 +25,67 @@ from .boundary import Boundary
 from . import utils
 from .validator import validate
 from .context import set_queue
-from .generator import Generator
-from .container import NumpyContainer, CythonContainer, LoopyContainer
+from .generator import Generator, get_cache_directory
+from .container import (
+    NumpyContainer,
+    CythonContainer,
+    LoopyContainer,
+    SparseContainer,
+    TiledContainer,
+)
+from .storage import Array
 from .algorithm import PullAlgorithm
 from .monitoring import Monitor, monitor
+from .reduction import Reductions
 
 log = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
 
+class SimulationState:
+    """
+    a lightweight handle on the state of a simulation
+    returned by :py:meth:`iterate<pylbm.simulation.Simulation.iterate>`
+
+    The time and the number of iterations are copied but the moments and
+    the distribution functions are read in the simulation: they are only
+    valid until the simulation goes further.
+
+    Attributes
+    ----------
+
+    simulation : :py:class:`Simulation<pylbm.simulation.Simulation>`
+      the simulation
+    t : float
+      the time of the state
+    nt : int
+      the number of iterations of the state
+    reductions : dict
+      the values of the reductions of the state
+    """
+
+    __slots__ = ("simulation", "t", "nt", "reductions")
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        self.t = simulation.t
+        self.nt = simulation.nt
+        self.reductions = dict(simulation.reductions)
+
+    @property
+    def m(self):
+        """
+        the moments in the interior domain (see Simulation.m).
+        """
+        return self.simulation.m
+
+    @property
+    def F(self):
+        """
+        the distribution functions in the interior domain (see Simulation.F).
+        """
+        return self.simulation.F
+
+
 class Simulation:
     """
     create a class simulation
@@ -40,15 +96,48 @@ class Simulation:
     dico : dictionary
     domain : object of class :py:class:`Domain<pylbm.domain.Domain>`, optional
     scheme : object of class :py:class:`Scheme<pylbm.scheme.Scheme>`, optional
-    type :   optional argument (default value is 'float64')
+    sorder : list or 'auto', optional
+      the storage order of the distribution functions and of the moments.
+      With 'auto', the fastest of a few candidates is chosen by timing
+      a few time steps of scratch simulations (see
+      :py:meth:`autotune_sorder<pylbm.simulation.Simulation.autotune_sorder>`)
+    dtype : str or numpy dtype, optional
+      the type of the distribution functions and of the moments:
+      'float64' (default) or 'float32'. In single precision, the arrays
+      of the unknowns and the local variables of the generated code are
+      floats, which halves the memory used and the memory traffic.
+    reference : 'init' or dict, optional
+      store the deviations of the distribution functions from a reference
+      (default is None). The reference is the equilibrium of the values of
+      the conserved moments given in a dictionary or, with 'init', of the
+      mean of their initial values. The generated code computes in double
+      precision: with dtype='float32', the accuracy is close to the one
+      of the simulation in double precision.
+    sparse : bool, optional
+      store only the fluid nodes and the nodes around them (default is
+      False, cython generator only, see
+      :py:class:`SparseContainer<pylbm.container.SparseContainer>`).
+      The memory and the work scale with the number of fluid nodes:
+      it is useful for porous media and complex geometries. The moments
+      and the distribution functions are zero on the points which are
+      not stored. The storage order is then given for the velocities
+      and the nodes.
+    tile_size : int or list, optional
+      split the domain in tiles of this size (one size per direction
+      or the same size in all the directions) and store only the tiles
+      which contain fluid nodes (default is None, cython generator only,
+      see :py:class:`TiledContainer<pylbm.container.TiledContainer>`).
+      The generated code makes dense loops inside each stored tile.
+      The moments and the distribution functions are zero on the points
+      which are not stored.
 
     Attributes
     ----------
 
     dim : int
       spatial dimension
-    type : float64
-      the type of the values
+    dtype : numpy dtype
+      the type of the distribution functions and of the moments
     domain : :py:class:`Domain<pylbm.domain.Domain>`
       the domain given in argument
     scheme : :py:class:`Scheme<pylbm.scheme.Scheme>`
@@ -63,6 +152,13 @@ class Simulation:
     F_halo : numpy array
       a numpy array that contains the values of the distribution functions
       in each point
+    ensemble : dict
+      the values of the parameters for each ensemble member given by the
+      key 'ensemble' of the dictionary (cython generator only)
+    nbatch : int
+      the number of ensemble members (None if there is no ensemble):
+      the moments and the distribution functions have an additional
+      first axis of this size
 
     Examples
     --------
@@ -87,10 +183,25 @@ class Simulation:
 
     # pylint: disable=too-many-branches, too-many-statements, too-many-locals
     def __init__(
-        self, dico, sorder=None, dtype="float64", check_inverse=False, initialize=True
+        self,
+        dico,
+        sorder=None,
+        dtype="float64",
+        check_inverse=False,
+        initialize=True,
+        reference=None,
+        sparse=False,
+        tile_size=None,
     ):
         validate(dico, __class__.__name__)  # pylint: disable=undefined-variable
 
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float64):
+            log.error(
+                "Solution: the type of the simulation must be float32 or float64\n"
+            )
+            sys.exit()
+
         self.domain = Domain(dico, need_validation=False)
         domain_size = mpi.COMM_WORLD.allreduce(sendobj=np.prod(self.domain.shape_in))
         Monitor.set_size(domain_size)
@@ -103,72 +214,526 @@ class Simulation:
             sys.exit()
 
         self._update_m = True
+        self._update_consm = True
         self.t = 0.0
         self.nt = 0
         self.dt_ = self.domain.dx / self.scheme.la
         self.dim = self.domain.dim
         self.extra_parameters = {}
+        self.ensemble, self.nbatch = self._get_ensemble(dico)
+        self._reductions = Reductions(dico, self.domain, self.scheme, self.nbatch)
 
-        codegen_dir, generate = None, True
+        # the moments and the distribution functions of the reference
+        self.m_ref, self.f_ref = None, None
+        if reference is not None:
+            nv = self.scheme.stencil.nv_ptr[-1]
+            self.m_ref, self.f_ref = np.zeros(nv), np.zeros(nv)
+
+        codegen_dir, generate, cache, flags, threads = None, True, True, [], 0
+        jobs, fastmath = 1, False
         codegen_opt = dico.get("codegen_option", None)
         if codegen_opt:
-            codegen_dir = os.path.realpath(codegen_opt["directory"])
+            if codegen_opt.get("directory", None):
+                codegen_dir = os.path.realpath(codegen_opt["directory"])
             generate = codegen_opt.get("generate", True)
+            cache = codegen_opt.get("cache", True)
+            flags = codegen_opt.get("flags", [])
+            threads = codegen_opt.get("threads", 0)
+            jobs = codegen_opt.get("jobs", 1)
+            fastmath = codegen_opt.get("fastmath", False)
 
+        # the compiled modules are cached when the directory is not given
         self.generator = Generator(
             dico.get("generator", "CYTHON").upper(),
             codegen_dir,
             generate,
             dico.get("show_code", False),
+            cache=get_cache_directory() if cache and codegen_dir is None else None,
+            flags=flags,
+            threads=threads,
+            jobs=jobs,
+            dtype=self.dtype.name,
+            # the compressed distribution functions are decoded in double
+            local_dtype="float64" if reference is not None else None,
+            fastmath=fastmath,
         )
 
+        if self.ensemble and self.generator.backend != "CYTHON":
+            log.error(
+                "Solution: an ensemble can only be used with the cython generator\n"
+            )
+            sys.exit()
+
+        if self._reductions and self.generator.backend != "CYTHON":
+            log.error(
+                "Solution: the reductions can only be used with the cython generator\n"
+            )
+            sys.exit()
+
+        if threads and self.generator.backend not in ("CYTHON", "C"):
+            log.error(
+                "Solution: the threads can only be used with the cython "
+                "and the C generators\n"
+            )
+            sys.exit()
+
+        if jobs > 1 and self.generator.backend != "CYTHON":
+            log.error(
+                "Solution: the parallel compilation can only be used with "
+                "the cython generator\n"
+            )
+            sys.exit()
+
+        if fastmath and self.generator.backend != "NUMBA":
+            log.error("Solution: fastmath can only be used with the numba generator\n")
+            sys.exit()
+
+        if reference is not None and self.generator.backend == "LOOPY":
+            log.error(
+                "Solution: the reference can't be used with the loopy generator\n"
+            )
+            sys.exit()
+
+        if (sparse or tile_size is not None) and (
+            self.generator.backend != "CYTHON" or isinstance(sorder, str)
+        ):
+            log.error(
+                "Solution: the sparse and the tiled storages can only be used "
+                "with the cython generator and a given storage order\n"
+            )
+            sys.exit()
+        if sparse and tile_size is not None:
+            log.error("Solution: choose between the sparse and the tiled storage\n")
+            sys.exit()
+
         # FIXME remove that !!
         set_queue(self.generator.backend)
 
-        self.container = self._get_container(sorder)
+        if isinstance(sorder, str) and sorder == "auto":
+            sorder = self.autotune_sorder(
+                dico, dtype=dtype, check_inverse=check_inverse
+            )
+
+        algo_class = self._get_algorithm_class(dico)
+        self.container = self._get_container(
+            sorder, in_place=algo_class.in_place, sparse=sparse, tile_size=tile_size
+        )
         if self.container.gpu_support:
             self.domain.in_or_out = self.container.move2gpu(self.domain.in_or_out)
             self.container.F.generate(self.generator)
             self.container.Fnew.generate(self.generator)
         sorder = self.container.sorder
+        if threads:
+            self.container.F.generate_first_touch(self.generator)
 
         # Generate the numerical code for the LBM and for the boundary conditions
         self.algo = self._get_algorithm(dico, sorder)
         self.algo.generate()
 
-        self.bc = Boundary(self.domain, self.generator, dico)
+        self.bc = Boundary(
+            self.domain,
+            self.generator,
+            dico,
+            nbatch=self.nbatch,
+            dtype=self.dtype,
+            f_ref=self.f_ref,
+        )
         for method in self.bc.methods:
             method.set_iload()
             method.generate(self.container.sorder)
+        if self.algo.fused_bc:
+            self.bc.fuse(self.domain.in_or_out, self.domain.valin)
 
+        self._driver = self._generate_driver()
         self.generator.compile()
+        # the module can be reused from a directory generated without the driver
+        self._driver = self._driver and hasattr(self.generator.module, "run_steps")
+
+        if hasattr(self.generator.module, "first_touch"):
+            for array in [self.container.F, self.container.Fnew, self.container.m]:
+                array.first_touch(self.generator.module.first_touch)
 
         self.init_type = dico.get("inittype", "moments")
         self.init_data = dico.get("init", None)
 
+        if reference is not None:
+            self._set_reference(reference)
+
         self._need_init = True
         if initialize:
             self._initialize()
 
-        log.info(self.__str__())
+        log.info("%s", self)
 
     def _initialize(self):
         # Initialize the solution and the rhs of boundary conditions
         self.initialization()
+        self._initialize_bc()
+
+    def _initialize_bc(self):
         for method in self.bc.methods:
             method.prepare_rhs(self)
+            if self.container.lattice is not None:
+                method.set_nodes(self.container.lattice)
             method.fix_iload()
             method.set_rhs()
             method.move2gpu()
         self._need_init = False
 
-    def _get_container(self, sorder):
+    @classmethod
+    def from_checkpoint(
+        cls,
+        dico,
+        filename,
+        sorder=None,
+        dtype="float64",
+        check_inverse=False,
+        reference=None,
+    ):
+        """
+        create a simulation from a checkpoint
+
+        Parameters
+        ----------
+
+        dico : dictionary
+            the dictionary used to create the saved simulation
+        filename : str
+            the name of the hdf5 file written by
+            :py:meth:`save_checkpoint<pylbm.simulation.Simulation.save_checkpoint>`
+
+        Notes
+        -----
+
+        The number of processes and the MPI topology can be different from
+        the ones of the saved simulation.
+        If the dictionary has no `codegen_option` and if the code of the saved
+        simulation was generated in a directory which still exists,
+        this code is used without generating it again.
+        """
+        from .hdf5 import load_checkpoint, checkpoint_codegen_directory
+
+        if dico.get("codegen_option", None) is None:
+            directory = checkpoint_codegen_directory(filename)
+            if directory and os.path.isdir(directory):
+                dico = dict(dico)
+                dico["codegen_option"] = {"directory": directory, "generate": False}
+
+        simu = cls(
+            dico,
+            sorder=sorder,
+            dtype=dtype,
+            check_inverse=check_inverse,
+            initialize=False,
+            reference=reference,
+        )
+        load_checkpoint(simu, filename)
+        simu.container.Fnew.array[:] = simu.container.F.array[:]
+        simu._invalidate_moments()
+        simu._initialize_bc()
+        return simu
+
+    def save_checkpoint(self, filename):
+        """
+        save the state of the simulation in a hdf5 file
+
+        The distribution functions on the interior domain, the time,
+        the number of iterations and the extra parameters are saved.
+        The time dependent boundary conditions are recomputed from the time.
+
+        Parameters
+        ----------
+
+        filename : str
+            the name of the hdf5 file
+        """
+        from .hdf5 import save_checkpoint
+
+        if self.container.lattice is not None:
+            log.error(
+                "Solution: the checkpoints can't be used with the sparse "
+                "and the tiled storages\n"
+            )
+            sys.exit()
+        if self._need_init:
+            self._initialize()
+        self._restore_layout()
+        save_checkpoint(self, filename)
+
+    def _generate_driver(self):
+        """
+        Add to the generated code a driver which performs several time steps
+        without going back to Python.
+
+        It is only possible with the cython generator when the boundary
+        conditions don't depend on time, when the ghost points can be
+        updated without MPI communications and when the time steps
+        leave the distribution functions in the natural layout.
+
+        Returns
+        -------
+        bool
+            True if the driver is generated.
+        """
+        from .generator import DriverCall
+
+        if self.generator.backend != "CYTHON" or not self.algo.natural_layout:
+            return False
+
+        for method in self.bc.methods:
+            if getattr(method, "name", None) is None or any(method.time_bc.values()):
+                return False
+
+        if not self.container.F.generate_local_update(self.generator):
+            return False
+
+        calls = []
+        if "periodic_update" in self.generator.routines:
+            calls.append(DriverCall("periodic_update"))
+
+        shared = ["f", "fcopy", "f_ref", "nx", "ny", "nz", "nb"]
+        for i, method in enumerate(self.bc.prepass):
+            calls.append(
+                DriverCall(
+                    method.name,
+                    prefix="bc{}_".format(i),
+                    shared=shared,
+                    copies=[("fcopy", "f")],
+                )
+            )
+        calls.append(
+            DriverCall(
+                "one_time_step",
+                shared=["f", "fnew"],
+                copies=[("reductions", "reductions_init")],
+            )
+        )
+
+        self.generator.add_driver(
+            "run_steps", calls, swap=[("f", "fnew")], increments=[("t", "dt")]
+        )
+        return True
+
+    def _get_ensemble(self, dico):
+        """
+        Return the values of the parameters for each ensemble member
+        and the number of members (None if there is no ensemble).
+        """
+        ensemble = {
+            k: np.asarray(v, dtype="float64")
+            for k, v in dico.get("ensemble", {}).items()
+        }
+        if not ensemble:
+            return ensemble, None
+
+        sizes = {v.size for v in ensemble.values()}
+        if len(sizes) != 1 or 0 in sizes:
+            log.error(
+                "Solution: each parameter of the ensemble must have the same number of values\n"
+            )
+            sys.exit()
+
+        forbidden = [self.scheme.la, self.scheme.symb_t] + list(self.scheme.symb_coord)
+        for k in ensemble:
+            if k in forbidden or k not in self.scheme.param:
+                log.error(
+                    "Solution: %s is not a parameter of the scheme which can vary "
+                    "in the ensemble\n",
+                    k,
+                )
+                sys.exit()
+
+        return ensemble, sizes.pop()
+
+    def _sorder_candidates(self):
+        """
+        Return the storage orders tried by the autotuning:
+        the structure of arrays, the array of structures and, in 2D and 3D,
+        the velocities stored just before the last space axis.
+        """
+        dim = self.dim
+        candidates = [list(range(dim + 1)), [dim] + list(range(dim))]
+        if dim > 1:
+            candidates.append([dim - 1] + list(range(dim - 1)) + [dim])
+        return candidates
+
+    def _sorder_key(self):
+        """
+        Return the key of the storage order chosen by the autotuning
+        in the cache of the generated code.
+        """
+        sha = hashlib.sha256()
+        for item in [
+            self.generator.backend,
+            self.generator.threads,
+            self.dtype,
+            self.nbatch,
+            mpi.COMM_WORLD.Get_size(),
+            list(self.domain.global_size),
+            self.scheme.M,
+            self.scheme.EQ,
+            self.scheme.s,
+            self.scheme._source_terms,
+        ]:
+            sha.update(str(item).encode())
+        return sha.hexdigest()
+
+    def autotune_sorder(self, dico, nsteps=5, dtype="float64", check_inverse=False):
+        """
+        choose the fastest storage order
+
+        A scratch simulation is created for each candidate storage order
+        and nsteps time steps are timed after a first time step.
+        The choice is recorded in the cache of the generated code and
+        used without timing for the next simulations of the same problem.
+
+        Parameters
+        ----------
+
+        dico : dictionary
+            the dictionary of the simulation
+        nsteps : int
+            the number of timed time steps (default 5)
+
+        Returns
+        -------
+
+        list
+            the fastest storage order
+        """
+        key = self._sorder_key()
+        filename = None
+        if self.generator.cache:
+            filename = os.path.join(self.generator.cache, "sorder.json")
+            choices = {}
+            if os.path.exists(filename):
+                with open(filename) as f:
+                    choices = json.load(f)
+            if key in choices:
+                return choices[key]
+
+        # the scratch simulations don't write in the directory of the code
+        scratch = dict(dico)
+        scratch["codegen_option"] = {
+            k: v
+            for k, v in dico.get("codegen_option", {}).items()
+            if k not in ["directory", "generate"]
+        }
+
+        timings = []
+        candidates = self._sorder_candidates()
+        for candidate in candidates:
+            sol = Simulation(
+                scratch, sorder=candidate, dtype=dtype, check_inverse=check_inverse
+            )
+            sol._run_steps(1)
+            start = time.perf_counter()
+            sol._run_steps(nsteps)
+            duration = time.perf_counter() - start
+            timings.append(mpi.COMM_WORLD.allreduce(duration, op=mpi.MAX))
+        best = candidates[int(np.argmin(timings))]
+        log.info("storage order chosen by the autotuning: %s", best)
+
+        if filename and mpi.COMM_WORLD.Get_rank() == 0:
+            choices = {}
+            if os.path.exists(filename):
+                with open(filename) as f:
+                    choices = json.load(f)
+            choices[key] = best
+            with open(filename + ".tmp", "w") as f:
+                json.dump(choices, f)
+            os.replace(filename + ".tmp", filename)
+        return best
+
+    def _set_reference(self, reference):
+        """
+        Compute the reference of the distribution functions: the equilibrium
+        of the values of the conserved moments given by reference.
+
+        The arrays of the distribution functions then store the deviations
+        from the reference.
+        """
+        values = reference
+        if isinstance(reference, str) and reference == "init":
+            values = self._mean_init_values()
+
+        nv = self.container.nv
+        sorder = self.container.sorder
+        nspace = [1] * (len(sorder) - 1)
+        gpu_support = self.container.gpu_support
+        kwargs = {
+            "gpu_support": gpu_support,
+            "nbatch": self.nbatch,
+            "dtype": self.dtype,
+        }
+        m = Array(nv, nspace, 0, sorder, **kwargs)
+        m.set_conserved_moments(self.scheme.consm)
+        f = Array(nv, nspace, 0, sorder, **kwargs)
+        for k, v in values.items():
+            m[k] = v
+        self.equilibrium(m)
+        # f_ref is still zero: m2f gives the distribution functions
+        self.m2f(m, f)
+
+        for i in range(nv):
+            self.m_ref[i] = np.mean(m[i])
+            self.f_ref[i] = np.mean(f[i])
+        for array in [self.container.F, self.container.Fnew]:
+            array.set_reference(self.f_ref)
+        self._invalidate_moments()
+
+    def _mean_init_values(self):
+        """
+        Return the mean of the initial values of the moments
+        given in the dictionary.
+        """
+        if self.init_type != "moments" or self.init_data is None:
+            log.error(
+                "Solution: the reference 'init' needs the initial values of the moments\n"
+            )
+            sys.exit()
+
+        coords = np.meshgrid(*self.domain.coords, sparse=True, indexing="ij")
+        values = {}
+        for k, v in self.init_data.items():
+            if isinstance(v, tuple):
+                extraargs = v[1] if len(v) == 2 else ()
+                v = v[0](*(tuple(coords) + extraargs))
+            elif isinstance(v, types.FunctionType):
+                v = v(*coords)
+            values[k] = float(np.mean(v))
+        return values
+
+    def _get_container(self, sorder, in_place=False, sparse=False, tile_size=None):
+        if sparse:
+            return SparseContainer(
+                self.domain, self.scheme, sorder, nbatch=self.nbatch, dtype=self.dtype
+            )
+        if tile_size is not None:
+            return TiledContainer(
+                self.domain,
+                self.scheme,
+                tile_size,
+                sorder,
+                nbatch=self.nbatch,
+                dtype=self.dtype,
+            )
         container_type = {
             "NUMPY": NumpyContainer,
             "CYTHON": CythonContainer,
             "LOOPY": LoopyContainer,
+            # the loops compiled by numba and the C code are the loops
+            # of the cython code
+            "NUMBA": CythonContainer,
+            "C": CythonContainer,
         }
-        return container_type[self.generator.backend](self.domain, self.scheme, sorder)
+        kwargs = {"nbatch": self.nbatch, "dtype": self.dtype}
+        # the numpy container has only one array of distribution functions
+        if in_place and self.generator.backend != "NUMPY":
+            kwargs["in_place"] = True
+        return container_type[self.generator.backend](
+            self.domain, self.scheme, sorder, **kwargs
+        )
 
     def _get_default_algo_settings(self):
         if self.generator.backend == "NUMPY":
@@ -176,17 +741,33 @@ class Simulation:
         else:
             return {"m_local": True, "split": False, "check_isfluid": False}
 
-    def _get_algorithm(self, dico, sorder):
-        algo_method = PullAlgorithm
-        user_settings = {}
+    @staticmethod
+    def _get_algorithm_class(dico):
+        """
+        Return the class of the algorithm given in the dictionary.
+        """
         dummy = dico.get("lbm_algorithm", None)
         if dummy:
-            algo_method = dummy.get("name", PullAlgorithm)
-            user_settings = dummy.get("settings", {})
+            return dummy.get("name", PullAlgorithm)
+        return PullAlgorithm
+
+    def _get_algorithm(self, dico, sorder):
+        algo_method = self._get_algorithm_class(dico)
+        user_settings = dico.get("lbm_algorithm", {}).get("settings", {})
         algo_settings = self._get_default_algo_settings()
         algo_settings.update(user_settings)
 
-        return algo_method(self.scheme, sorder, self.generator, algo_settings)
+        return algo_method(
+            self.scheme,
+            sorder,
+            self.generator,
+            algo_settings,
+            ensemble=list(self.ensemble),
+            reductions=self._reductions.algorithm_input(),
+            reference=self.m_ref is not None,
+            sparse=self.container.sparse,
+            tile_size=self.container.tile_size,
+        )
 
     @property
     def dt(self):
@@ -197,30 +778,77 @@ class Simulation:
         else:
             return self.dt_
 
+    def _is_conserved(self, i):
+        """
+        check if the key i only selects a conserved moment.
+        """
+        if isinstance(i, sp.Symbol):
+            return i in self.container.m.consm
+        if isinstance(i, (int, np.integer)):
+            return 0 <= i < len(self.scheme.consm)
+        return False
+
+    def _update_moments(self, i=None, halo=True):
+        """
+        compute the moments from the distribution functions if they
+        are not up to date.
+
+        When the moment i is conserved and only the interior domain is needed,
+        only the conserved moments are computed (first rows of M).
+        They are not computed again until the next time step.
+        """
+        if not self._update_m:
+            return
+        self._restore_layout()
+        if (
+            not halo
+            and self._is_conserved(i)
+            and hasattr(self.generator.module, "f2m_consm")
+        ):
+            if self._update_consm:
+                self._update_consm = False
+                self.algo.call_function("f2m_consm", self)
+            return
+        self._update_m = False
+        self._update_consm = False
+        self.f2m()
+
+    def _invalidate_moments(self):
+        self._update_m = True
+        self._update_consm = True
+
+    def _restore_layout(self):
+        """
+        store the distribution functions in the natural layout if the
+        algorithm left them in another layout (see
+        :py:meth:`layout_slots<pylbm.algorithm.BaseAlgorithm.layout_slots>`).
+        """
+        if self.container.parity:
+            self.algo.restore_layout(self.container.F, self.container.parity)
+            self.container.parity = 0
+
     @utils.itemproperty
     def m_halo(self, i):
         """
         get the moment i on the whole domain with halo points.
         """
-        if self._update_m:
-            self._update_m = False
-            self.f2m()
+        self._update_moments(i)
         return self.container.m[i]
 
     @m_halo.setter
     def m_halo(self, i, value):
         self._update_m = False
+        self._update_consm = False
         self.container.m[i] = value
 
     @utils.itemproperty
     def m(self, i):
         """
         get the moment i in the interior domain.
-        """
-        if self._update_m:
-            self._update_m = False
-            self.f2m()
 
+        Only the conserved moments are computed if i is a conserved moment.
+        """
+        self._update_moments(i, halo=False)
         return self.container.m._in(i)  # pylint: disable=protected-access
 
     @utils.itemproperty
@@ -228,11 +856,13 @@ class Simulation:
         """
         get the distribution function i on the whole domain with halo points.
         """
+        self._restore_layout()
         return self.container.F[i]
 
     @F_halo.setter
     def F_halo(self, i, value):
-        self._update_m = True
+        self._restore_layout()
+        self._invalidate_moments()
         self.container.F[i] = value
 
     @utils.itemproperty
@@ -240,8 +870,18 @@ class Simulation:
         """
         get the distribution function i in the interior domain.
         """
+        self._restore_layout()
         return self.container.F._in(i)  # pylint: disable=protected-access
 
+    @property
+    def reductions(self):
+        """
+        the values of the reductions declared in the dictionary
+        computed during the last time step
+        (see :py:class:`Reductions<pylbm.reduction.Reductions>`).
+        """
+        return self._reductions.values
+
     def __str__(self):
         from .utils import header_string
         from .jinja_env import env
@@ -282,6 +922,7 @@ class Simulation:
         coords = np.meshgrid(
             *(c for c in self.domain.coords_halo), sparse=True, indexing="ij"
         )
+        self._restore_layout()
 
         if self.init_type == "moments":
             array_to_init = self.container.m
@@ -324,6 +965,7 @@ class Simulation:
         compute the transport phase on distribution functions
         (the array _F is modified)
         """
+        self._restore_layout()
         self.algo.call_function("transport", self, **kwargs)
 
     def relaxation(self, **kwargs):
@@ -346,6 +988,7 @@ class Simulation:
         compute the moments from the distribution functions
         (the array _m is modified)
         """
+        self._restore_layout()
         self.algo.call_function("f2m", self, **kwargs)
 
     @monitor
@@ -354,6 +997,8 @@ class Simulation:
         compute the distribution functions from the moments
         (the array _F is modified)
         """
+        if f_user is None:
+            self._restore_layout()
         self.algo.call_function("m2f", self, m_user, f_user, **kwargs)
 
     @monitor
@@ -380,14 +1025,27 @@ class Simulation:
 
         The array _F is modified in the phantom array (outer points)
         according to the specified boundary conditions.
+        When the algorithm leaves the distribution functions in another
+        layout than the natural one, the values coming from the outer points
+        are stored in the inner points.
+        When the boundary conditions are fused (setting fused_bc of the
+        algorithm), the fused methods only update the constant terms of
+        their links which are resolved in one_time_step.
         """
         f = self.container.F
-        f.update()
+        slots = self.algo.layout_slots(self.container.parity)
+        if slots is None:
+            f.update()
+        else:
+            f.update_layout(slots, self.algo.all_velocities)
 
         for method in self.bc.methods:
             method.update_feq(self)
             method.set_rhs()
-            method.update(f, **kwargs)
+        for method in self.bc.prepass:
+            method.update(f, slots, **kwargs)
+        if self.bc.fused is not None:
+            self.bc.fused.update()
 
     @monitor
     def one_time_step(self, **kwargs):
@@ -409,12 +1067,281 @@ class Simulation:
         if self._need_init:
             self._initialize()
 
-        self._update_m = True  # we recompute f so m will be not correct
+        self._invalidate_moments()  # we recompute f so m will be not correct
 
+        container = self.container
+        container.parity = self.algo.start_layout(container.F, container.parity)
         self.boundary_condition(**kwargs)
 
-        self.algo.call_function("one_time_step", self, **kwargs)
-        self.container.F, self.container.Fnew = self.container.Fnew, self.container.F
+        if self._reductions:
+            self._reductions.reset()
+        self.algo.call_tuned(self.algo.time_step_name(container.parity), self, **kwargs)
+        container.F, container.Fnew = container.Fnew, container.F
+        container.parity = self.algo.next_parity(container.parity)
+        if self._reductions:
+            self._reductions.update()
 
         self.t += self.dt
         self.nt += 1
+
+    @monitor
+    def run(self, nsteps=None, until=None, every=None, **kwargs):
+        """
+        compute several time steps
+
+        Parameters
+        ----------
+        nsteps : int
+            the number of time steps
+        until : float
+            the final time: the time steps are computed while the time
+            is lower than until
+        every : dict
+            the callbacks called during the run: the key k is an integer
+            and the value is a function called with the simulation as
+            argument when the number of iterations is a multiple of k
+
+        Notes
+        -----
+
+        This function is equivalent to call nsteps times
+        :py:meth:`one_time_step<pylbm.simulation.Simulation.one_time_step>`
+        (or while the time is lower than until if nsteps is not given).
+        With the cython generator, the loop over the time steps is done
+        in the generated code when the boundary conditions don't depend
+        on time and when there are no MPI communications: the simulation
+        only goes back to Python to call the callbacks.
+        The moments are computed at most once between two time steps
+        even if several callbacks use them.
+
+        Examples
+        --------
+
+        >>> sol.run(until=1.0, every={10: plot, 100: save})  # doctest: +SKIP
+        """
+        if nsteps is None and until is None:
+            log.error("run needs the number of time steps or the final time")
+            raise ValueError("run needs nsteps or until")
+        every = every if every else {}
+        if any(k <= 0 for k in every):
+            log.error("the periods of the callbacks must be positive integers")
+            raise ValueError("invalid period in every")
+
+        if nsteps is None:
+            nsteps = self._nsteps_until(until)
+        elif until is not None:
+            nsteps = min(nsteps, self._nsteps_until(until))
+
+        while nsteps > 0:
+            # go to the next iteration where a callback is called
+            chunk = min([nsteps] + [k - self.nt % k for k in every])
+            self._run_steps(chunk, **kwargs)
+            nsteps -= chunk
+            for k, callback in every.items():
+                if self.nt % k == 0:
+                    callback(self)
+
+    def iterate(self, every=1, nsteps=None, until=None, **kwargs):
+        """
+        iterate over the states of the simulation
+
+        Parameters
+        ----------
+        every : int
+            the number of time steps between two states (default 1)
+        nsteps : int
+            the total number of time steps (optional)
+        until : float
+            the final time (optional)
+
+        Yields
+        ------
+        :py:class:`SimulationState<pylbm.simulation.SimulationState>`
+            the state of the simulation after each group of every time steps.
+            The iteration never stops if neither nsteps nor until are given.
+
+        Examples
+        --------
+
+        >>> for state in sol.iterate(every=10, until=1.0):  # doctest: +SKIP
+        ...     print(state.t, state.m[rho].max())
+        """
+        if every <= 0:
+            log.error("the number of time steps between two states must be positive")
+            raise ValueError("invalid every")
+
+        while True:
+            chunk = every
+            if nsteps is not None:
+                chunk = min(chunk, nsteps)
+            if until is not None:
+                chunk = min(chunk, self._nsteps_until(until))
+            if chunk <= 0:
+                return
+            self._run_steps(chunk, **kwargs)
+            if nsteps is not None:
+                nsteps -= chunk
+            yield SimulationState(self)
+
+    def run_to_steady_state(
+        self, tol, residual="residual", every=10, max_steps=100000, **kwargs
+    ):
+        """
+        compute time steps until the steady state is reached
+
+        Parameters
+        ----------
+        tol : float
+            the tolerance on the residual
+        residual : str
+            the name of the reduction used as residual (default 'residual').
+            It is computed in the generated one_time_step and should be
+            the reduction of an increment (see
+            :py:class:`Reductions<pylbm.reduction.Reductions>`)
+        every : int
+            the number of time steps between two checks of the residual
+            (default 10)
+        max_steps : int
+            the maximal number of time steps (default 100000).
+            None removes the limit.
+
+        Returns
+        -------
+        bool
+            True if the residual is lower than the tolerance,
+            False if the maximal number of time steps is reached or
+            if the residual is not finite
+
+        Examples
+        --------
+
+        >>> dico["reductions"] = {  # doctest: +SKIP
+        ...     "residual": {"expr": qx, "op": "l2", "increment": True}
+        ... }
+        >>> sol = pylbm.Simulation(dico)  # doctest: +SKIP
+        >>> sol.run_to_steady_state(1e-10)  # doctest: +SKIP
+        """
+        if residual not in self._reductions.names:
+            log.error(
+                "the residual %s must be declared in the reductions of the dictionary",
+                residual,
+            )
+            raise ValueError("unknown residual {}".format(residual))
+
+        for _ in self.iterate(every=every, nsteps=max_steps, **kwargs):
+            value = self.reductions[residual]
+            if not np.all(np.isfinite(value)):
+                log.error(
+                    "the residual %s is not finite at time step %d: "
+                    "the simulation diverges",
+                    residual,
+                    self.nt,
+                )
+                return False
+            if np.all(value < tol):
+                return True
+        return False
+
+    def _nsteps_until(self, until):
+        """
+        return the number of time steps computed by the loop
+        while t < until: one_time_step()
+        """
+        t, dt, nsteps = self.t, self.dt, 0
+        while t < until:
+            t += dt
+            nsteps += 1
+        return nsteps
+
+    def _run_steps(self, nsteps, **kwargs):
+        """
+        compute nsteps time steps in the generated driver if possible.
+        """
+        if not self._driver:
+            for _ in range(nsteps):
+                self.one_time_step(**kwargs)
+            return
+
+        if self._need_init:
+            self._initialize()
+
+        if nsteps <= 0:
+            return
+
+        self._invalidate_moments()
+
+        f = self.container.F
+        args = {"nsteps": nsteps, "fcopy": self.container.fcopy()}
+        for method in self.bc.methods:
+            method.update_feq(self)
+            method.set_rhs()
+        for i, method in enumerate(self.bc.prepass):
+            for key, value in method._get_args(f).items():
+                args["bc{}_{}".format(i, key)] = value
+        if self.bc.fused is not None:
+            self.bc.fused.update()
+        args.update(kwargs)
+
+        self.algo.call_tuned("run_steps", self, **args)
+        if self._reductions:
+            self._reductions.update()
+
+        if nsteps % 2 == 1:
+            self.container.F, self.container.Fnew = (
+                self.container.Fnew,
+                self.container.F,
+            )
+
+        # the time is incremented step by step to get the same rounding
+        # as with nsteps calls of one_time_step
+        for _ in range(nsteps):
+            self.t += self.dt
+        self.nt += nsteps
+
+
+def compare_precision(dico, nsteps, **kwargs):
+    """
+    compare a simulation with the simulation in double precision
+
+    Both simulations make nsteps time steps from the initial conditions
+    of the dictionary.
+
+    Parameters
+    ----------
+
+    dico : dictionary
+        the dictionary of the simulation
+    nsteps : int
+        the number of time steps
+    kwargs : dict
+        the arguments of the compared simulation
+        (for example dtype='float32' and reference='init')
+
+    Returns
+    -------
+
+    dict
+        the relative error of each conserved moment: the maximum of the
+        absolute difference divided by the maximum of the absolute value
+        in double precision
+
+    Examples
+    --------
+
+    >>> compare_precision(dico, 100, dtype="float32", reference="init")
+
+    """
+    sol_ref = Simulation(dico)
+    sol = Simulation(dico, **kwargs)
+    sol_ref.run(nsteps)
+    sol.run(nsteps)
+
+    comm = mpi.COMM_WORLD
+    errors = {}
+    for k in sol.scheme.consm:
+        value = np.asarray(sol_ref.m[k], dtype=np.double)
+        error = np.max(np.abs(np.asarray(sol.m[k], dtype=np.double) - value))
+        scale = comm.allreduce(np.max(np.abs(value)), op=mpi.MAX)
+        error = comm.allreduce(error, op=mpi.MAX)
+        errors[k] = error / scale if scale > 0 else error
+    return errors
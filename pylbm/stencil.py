@@ -692,7 +692,7 @@ class Stencil(list):
         for k in range(self.nstencils):
             self.append(OneStencil(self.v[k], self.nv[k]))
 
-        log.debug(self.__str__())
+        log.debug("%s", self)
 
         # check if all the schemes are symmetric
         self.is_symmetric()
@@ -877,7 +877,7 @@ class Stencil(list):
     # pylint: disable=too-complex
     def visualize(
         self,
-        viewer_mod=viewer.matplotlib_viewer,
+        viewer_mod=None,
         k=None,
         unique_velocities=False,
         view_label=True,
@@ -928,6 +928,8 @@ class Stencil(list):
                 pos.append(populate(self.vx[i], self.vy[i], self.vz[i]))
                 title.append("Stencil {0:d}".format(i))
 
+        if viewer_mod is None:
+            viewer_mod = viewer.matplotlib_viewer
         views = viewer_mod.Fig(len(pos), 1, dim=self.dim, figsize=(5, 5 * len(pos)))
         views.fix_space(wspace=0.25, hspace=0.25)
 
@@ -21,6 +21,21 @@ from .monitoring import monitor
 log = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
 
+def mpi_datatype(dtype):
+    """
+    return the MPI datatype of the floats of type dtype.
+
+    Parameters
+    ----------
+    dtype : numpy dtype
+        float32 or float64
+
+    """
+    return {np.dtype(np.float32): mpi.FLOAT, np.dtype(np.float64): mpi.DOUBLE}[
+        np.dtype(dtype)
+    ]
+
+
 class Array:
     """
     This class defines the storage of the moments and
@@ -45,6 +60,9 @@ class Array:
         the type of the array. Default is numpy.double
     gpu_support : bool
         true if GPU is needed
+    nbatch : int
+        the number of ensemble members stored along an additional
+        first axis. Default is None (no ensemble axis)
 
     Attributes
     ----------
@@ -66,14 +84,17 @@ class Array:
         mpi_topo=None,
         dtype=np.double,
         gpu_support=False,
+        nbatch=None,
     ):
         self.comm = mpi.COMM_WORLD
         self.sorder = sorder
+        self.nbatch = nbatch
 
         self.gspace_size = gspace_size
         self.dim = len(gspace_size)
         self.consm = {}
         self.gpu_support = gpu_support
+        self.reference = None
 
         if mpi_topo is not None:
             self.mpi_topo = mpi_topo
@@ -103,6 +124,10 @@ class Array:
         shape = [0] * len(tmpshape)
         for i in range(self.dim + 1):
             shape[ind[i]] = int(tmpshape[i])
+        if nbatch is not None:
+            # the ensemble members are stored along the slowest axis
+            shape = [nbatch] + shape
+            ind = [0] + [i + 1 for i in ind]
         self.array_cpu = np.zeros((shape), dtype=dtype)
         self.array = self.array_cpu
 
@@ -115,7 +140,7 @@ class Array:
                 raise ImportError("Please install loo.py")
             self.array = cl.array.to_device(queue, self.array_cpu)
 
-        self.swaparray = np.transpose(self.array_cpu, self.index)
+        self.swaparray = np.transpose(self.array_cpu, ind)
 
         if mpi_topo is not None:
             self._set_subarray()
@@ -123,18 +148,34 @@ class Array:
         # if self.gpu_support:
         #     self.generate()
 
+    def _batch_key(self, key):
+        """
+        add the ensemble axis in front of the key.
+        """
+        if self.nbatch is None:
+            return key
+        if isinstance(key, tuple):
+            return (slice(None),) + key
+        return (slice(None), key)
+
     def __getitem__(self, key):
         if self.gpu_support:
             self.array_cpu[...] = self.array.get()
         if isinstance(key, sp.Symbol):
-            return self.swaparray[self.consm[key]]
-        return self.swaparray[key]
+            key = self.consm[key]
+        key = self._batch_key(key)
+        if self.reference is None:
+            return self.swaparray[key]
+        return self.swaparray[key] + self.reference_view[key]
 
     def __setitem__(self, key, values):
         if isinstance(key, sp.Symbol):
-            self.swaparray[self.consm[key]] = values
-        else:
+            key = self.consm[key]
+        key = self._batch_key(key)
+        if self.reference is None:
             self.swaparray[key] = values
+        else:
+            self.swaparray[key] = values - self.reference_view[key]
         if self.gpu_support:
             try:
                 import pyopencl as cl
@@ -153,8 +194,40 @@ class Array:
         if self.gpu_support:
             self.array_cpu[...] = self.array.get()
         if isinstance(key, (sp.Symbol, sp.IndexedBase)):
-            return self.swaparray[self.consm[key]][tuple(ind)]
-        return self.swaparray[key][tuple(ind)]
+            key = self.consm[key]
+        key, ind = self._batch_key(key), self._batch_key(tuple(ind))
+        if self.reference is None:
+            return self.swaparray[key][ind]
+        return self.swaparray[key][ind] + self.reference_view[key][ind]
+
+    def set_reference(self, reference):
+        """
+        store the deviations of the values from a reference.
+
+        The array stores the difference between the values and the
+        reference of each velocity: the small deviations keep their
+        precision in single precision. The values are given back
+        in double precision by the accessors.
+
+        Parameters
+        ----------
+        reference : ndarray
+            the reference value of each velocity
+
+        """
+        self.reference = np.asarray(reference, dtype=np.double)
+
+    @property
+    def reference_view(self):
+        """
+        the reference with the shape of swaparray (None without reference).
+        """
+        if self.reference is None:
+            return None
+        shape = [self.nv] + [1] * self.dim
+        if self.nbatch is not None:
+            shape = [1] + shape
+        return np.broadcast_to(self.reference.reshape(shape), self.swaparray.shape)
 
     def set_conserved_moments(self, consm):
         """
@@ -183,6 +256,8 @@ class Array:
         """
         the space size.
         """
+        if self.nbatch is not None:
+            return self.swaparray.shape[2:]
         return self.swaparray.shape[1:]
 
     @property
@@ -190,6 +265,8 @@ class Array:
         """
         the number of velocities.
         """
+        if self.nbatch is not None:
+            return self.swaparray.shape[1]
         return self.swaparray.shape[0]
 
     @property
@@ -218,13 +295,16 @@ class Array:
         dim = self.dim
         vmax = self.vmax
 
-        def swap(array_in):
+        def swap(array_in, batch=0):
             array_out = [0] * (dim + 1)
             for i in range(dim + 1):
                 array_out[self.index[i]] = array_in[i]
+            if self.nbatch is not None:
+                array_out = [batch] + array_out
             return array_out
 
-        sizes = swap([nv] + nspace)
+        sizes = swap([nv] + nspace, self.nbatch)
+        datatype = mpi_datatype(self.array_cpu.dtype)
 
         rank = self.mpi_topo.cartcomm.Get_rank()
         coords = self.mpi_topo.cartcomm.Get_coords(rank)
@@ -248,15 +328,15 @@ class Array:
         for d in range(dim):  # pylint: disable=invalid-name
             subsizes = [nv] + nspace
             subsizes[d + 1] = vmax[d]
-            subsizes = swap(subsizes)
+            subsizes = swap(subsizes, self.nbatch)
 
             sstart = [0] * (dim + 1)
             sstart[d + 1] = vmax[d]
             sstart = swap(sstart)
-            rstart = [0] * (dim + 1)
+            rstart = swap([0] * (dim + 1))
 
-            self.send_type.append(mpi.DOUBLE.Create_subarray(sizes, subsizes, sstart))
-            self.recv_type.append(mpi.DOUBLE.Create_subarray(sizes, subsizes, rstart))
+            self.send_type.append(datatype.Create_subarray(sizes, subsizes, sstart))
+            self.recv_type.append(datatype.Create_subarray(sizes, subsizes, rstart))
 
             log.info(
                 "[%d] send to %d with tag %d subarray:%s",
@@ -280,8 +360,8 @@ class Array:
             rstart[d + 1] = nspace[d] - vmax[d]
             rstart = swap(rstart)
 
-            self.send_type.append(mpi.DOUBLE.Create_subarray(sizes, subsizes, sstart))
-            self.recv_type.append(mpi.DOUBLE.Create_subarray(sizes, subsizes, rstart))
+            self.send_type.append(datatype.Create_subarray(sizes, subsizes, sstart))
+            self.recv_type.append(datatype.Create_subarray(sizes, subsizes, rstart))
 
             log.info(
                 "[%d] send to %d with tag %d subarray:%s",
@@ -366,6 +446,76 @@ class Array:
 
                 mpi.Request.Waitall(req)
 
+    # pylint: disable=too-many-locals
+    @monitor
+    def update_layout(self, slots, velocities):
+        """
+        update the inner points on the interface with the datas of the
+        neighbors when the distribution functions are stored in another
+        layout than the natural one (see
+        :py:meth:`layout_slots<pylbm.algorithm.BaseAlgorithm.layout_slots>`).
+
+        The value of the velocity k at the point x is stored in the slot
+        slots[k] at the point x + v_k: the values which left the inner
+        domain of the neighbors are in their ghost points and are copied
+        in the inner points where they are read.
+
+        Parameters
+        ----------
+        slots : ndarray
+            the slot of each velocity
+        velocities : ndarray
+            the velocities (one line per velocity)
+
+        """
+        # the component slots[k] at the point x stores a value of x + shifts[k]
+        shifts = np.empty_like(velocities)
+        shifts[slots] = -np.asarray(velocities)
+
+        axis0 = 0 if self.nbatch is None else 1
+        ndim = self.swaparray.ndim
+
+        def band(axis, start, stop, k=slice(None)):
+            key = [slice(None)] * ndim
+            key[axis0] = k
+            key[axis] = slice(start, stop)
+            return tuple(key)
+
+        for d in range(self.dim):  # pylint: disable=invalid-name
+            axis, vmax, n = axis0 + d + 1, self.vmax[d], self.nspace[d]
+            left, right = self.neighbors[2 * d], self.neighbors[2 * d + 1]
+
+            send_left = np.ascontiguousarray(self.swaparray[band(axis, 0, vmax)])
+            send_right = np.ascontiguousarray(self.swaparray[band(axis, n - vmax, n)])
+            recv_left, recv_right = np.empty_like(send_left), np.empty_like(send_right)
+            self.comm.Sendrecv(
+                send_left,
+                dest=left,
+                sendtag=self.send_tag[2 * d],
+                recvbuf=recv_right,
+                source=right,
+                recvtag=self.recv_tag[2 * d + 1],
+            )
+            self.comm.Sendrecv(
+                send_right,
+                dest=right,
+                sendtag=self.send_tag[2 * d + 1],
+                recvbuf=recv_left,
+                source=left,
+                recvtag=self.recv_tag[2 * d],
+            )
+
+            for k, shift in enumerate(shifts):
+                c = int(shift[d])
+                if c < 0 and left != mpi.PROC_NULL:
+                    self.swaparray[band(axis, vmax, vmax - c, k)] = recv_left[
+                        band(axis, 0, -c, k)
+                    ]
+                if c > 0 and right != mpi.PROC_NULL:
+                    self.swaparray[band(axis, n - vmax - c, n - vmax, k)] = recv_right[
+                        band(axis, vmax - c, vmax, k)
+                    ]
+
     # pylint: disable=too-many-locals
     def generate(self, generator):
         """
@@ -419,6 +569,141 @@ class Array:
             iloop = set_order([s, i, j, k], remove_index=3)
             generator.add_routine(("update_z", For(iloop, sp.Eq(f_store, f_load))))
 
+    # pylint: disable=too-many-locals
+    def generate_local_update(self, generator, name="periodic_update"):
+        """
+        generate the update of the ghost points when all the neighbors
+        are the process itself (periodic directions) or do not exist.
+
+        Parameters
+        ----------
+        generator : Generator
+            the generator where the routine is added
+        name : str
+            the name of the routine (default is periodic_update)
+
+        Returns
+        -------
+        bool
+            False if the ghost points must be exchanged with other processes
+            and no routine is generated, True otherwise.
+
+        """
+        from .symbolic import nx, ny, nz, nb, batch_idx
+
+        if not hasattr(self, "neighbors"):
+            return False
+
+        rank = self.mpi_topo.cartcomm.Get_rank()
+        nspace = [nx, ny, nz][: self.dim]
+
+        def set_order(array, batch=None):
+            out = [-1] * len(self.sorder)
+            for i, s in enumerate(self.sorder):
+                out[s] = array[i]
+            if self.nbatch is not None:
+                out = [batch] + out
+            return out
+
+        fi = sp.IndexedBase("f", set_order([self.nv] + nspace, nb))
+        s = sp.Idx("s", (0, self.nv))
+        ib = batch_idx()
+
+        code = []
+        for d in range(self.dim):  # pylint: disable=invalid-name
+            neighbors = self.neighbors[2 * d : 2 * d + 2]
+            if all(n == mpi.PROC_NULL for n in neighbors):
+                continue
+            if any(n != rank for n in neighbors):
+                return False
+
+            vmax = self.vmax[d]
+            idx = [sp.Idx(i, (0, n)) for i, n in zip(["i", "j", "k"], nspace)]
+            idx[d] = sp.Idx(idx[d].label, (0, vmax))
+            left, right = list(idx), list(idx)
+            left_load, right_load = list(idx), list(idx)
+            right[d] = nspace[d] - vmax + idx[d]
+            left_load[d] = nspace[d] - 2 * vmax + idx[d]
+            right_load[d] = vmax + idx[d]
+
+            f_store = sp.Matrix(
+                [fi[set_order([s] + left, ib)], fi[set_order([s] + right, ib)]]
+            )
+            f_load = sp.Matrix(
+                [
+                    fi[set_order([s] + left_load, ib)],
+                    fi[set_order([s] + right_load, ib)],
+                ]
+            )
+            code.append(For(set_order([s] + idx, ib), sp.Eq(f_store, f_load)))
+
+        if code:
+            generator.add_routine((name, code))
+        return True
+
+    def generate_first_touch(self, generator, name="first_touch"):
+        """
+        generate the routine which writes zeros in the array with the
+        outermost loop of the kernels.
+
+        The memory pages are mapped on the NUMA node of the thread which
+        writes them first: when the loops are shared between threads,
+        each thread then finds the part of the array it works on in its
+        local memory.
+
+        Parameters
+        ----------
+        generator : Generator
+            the generator where the routine is added
+        name : str
+            the name of the routine (default is first_touch)
+
+        """
+        from .symbolic import nx, ny, nz, nb, ix_, iy_, iz_, batch_idx, space_idx
+
+        nspace = [nx, ny, nz][: self.dim]
+
+        def set_order(array, batch=None):
+            out = [-1] * len(self.sorder)
+            for i, s in enumerate(self.sorder):
+                out[s] = array[i]
+            if self.nbatch is not None:
+                out = [batch] + out
+            return out
+
+        fi = sp.IndexedBase("f", set_order([self.nv] + nspace, nb))
+        s = sp.Idx("s", (0, self.nv))
+        ib = batch_idx()
+
+        # the space indices in the order of the loops of the kernels
+        loop = space_idx([(0, n) for n in nspace], priority=self.sorder[1:])
+        idx = sorted(loop, key=lambda i: [ix_, iy_, iz_].index(i.label))
+        if self.nbatch is not None:
+            loop = [ib] + loop
+        generator.add_routine(
+            (name, For(loop + [s], sp.Eq(fi[set_order([s] + idx, ib)], 0)))
+        )
+
+    def first_touch(self, function):
+        """
+        write zeros in the array with the routine generated by
+        :py:meth:`generate_first_touch<pylbm.storage.Array.generate_first_touch>`.
+
+        Parameters
+        ----------
+        function : callable
+            the generated routine
+
+        """
+        from .symbolic import call_genfunction
+
+        args = {"f": self.array}
+        for n, size in zip(["nx", "ny", "nz"], self.nspace):
+            args[n] = size
+        if self.nbatch is not None:
+            args["nb"] = self.nbatch
+        call_genfunction(function, args)
+
 
 class SOA(Array):
     """
@@ -439,6 +724,8 @@ class SOA(Array):
         the type of the array. Default is numpy.double
     gpu_support: bool
         True if GPU is needed
+    nbatch : int
+        the number of ensemble members. Default is None
 
     Attributes
     ----------
@@ -451,7 +738,14 @@ class SOA(Array):
     """
 
     def __init__(
-        self, nv, gspace_size, vmax, mpi_topo, dtype=np.double, gpu_support=False
+        self,
+        nv,
+        gspace_size,
+        vmax,
+        mpi_topo,
+        dtype=np.double,
+        gpu_support=False,
+        nbatch=None,
     ):
         sorder = [i for i in range(len(gspace_size) + 1)]
         Array.__init__(
@@ -463,6 +757,7 @@ class SOA(Array):
             mpi_topo,
             dtype,
             gpu_support=gpu_support,
+            nbatch=nbatch,
         )
 
     def reshape(self):
@@ -491,6 +786,8 @@ class AOS(Array):
         the type of the array. Default is numpy.double
     gpu_support: bool
         True if GPU is needed
+    nbatch : int
+        the number of ensemble members. Default is None
 
     Attributes
     ----------
@@ -503,7 +800,14 @@ class AOS(Array):
     """
 
     def __init__(
-        self, nv, gspace_size, vmax, mpi_topo, dtype=np.double, gpu_support=False
+        self,
+        nv,
+        gspace_size,
+        vmax,
+        mpi_topo,
+        dtype=np.double,
+        gpu_support=False,
+        nbatch=None,
     ):
         sorder = [len(gspace_size)] + [i for i in range(len(gspace_size))]
         Array.__init__(
@@ -515,6 +819,7 @@ class AOS(Array):
             mpi_topo,
             dtype,
             gpu_support=gpu_support,
+            nbatch=nbatch,
         )
 
     def reshape(self):
@@ -522,3 +827,237 @@ class AOS(Array):
         reshape
         """
         return self.array.reshape((np.prod(self.nspace), self.nv))
+
+
+class SparseArray(Array):
+    """
+    This class defines an array which stores the unknowns of the lattice
+    Boltzmann schemes on the nodes of a sparse lattice only
+    (see :py:class:`SparseLattice<pylbm.container.SparseLattice>`).
+
+    The array has one space axis: the list of the nodes. The accessors
+    give and set the values on the whole domain with the fictitious points
+    as for :py:class:`Array<pylbm.storage.Array>`: the points which are not
+    stored are zero and the values given on these points are ignored.
+
+    Parameters
+    ----------
+    nv: int
+        number of velocities
+    lattice: SparseLattice
+        the nodes of the lattice
+    sorder: list
+        the order of the velocities and of the nodes.
+        Default is None which means [nv, nodes]
+    dtype: type
+        the type of the array. Default is numpy.double
+    nbatch : int
+        the number of ensemble members. Default is None
+
+    Attributes
+    ----------
+    array
+    lattice
+    nspace
+    nv
+    shape
+    size
+
+    """
+
+    def __init__(self, nv, lattice, sorder=None, dtype=np.double, nbatch=None):
+        self.lattice = lattice
+        super().__init__(nv, [lattice.nnode], [0], sorder, dtype=dtype, nbatch=nbatch)
+
+    def _stored_shape(self, key):
+        """
+        the shape of the stored values of the key.
+        """
+        if isinstance(key, sp.Symbol):
+            key = self.consm[key]
+        return self.swaparray[self._batch_key(key)].shape
+
+    def __getitem__(self, key):
+        lattice = self.lattice
+        values = super().__getitem__(key)
+        dense = np.zeros(values.shape[: -self.dim] + lattice.shape, dtype=values.dtype)
+        dense[(Ellipsis,) + lattice.coords] = values[(Ellipsis,) + lattice.nodes]
+        return dense
+
+    def __setitem__(self, key, values):
+        lattice = self.lattice
+        shape = self._stored_shape(key)
+        values = np.broadcast_to(values, shape[: -self.dim] + lattice.shape)
+        stored = np.zeros(shape)
+        stored[(Ellipsis,) + lattice.nodes] = values[(Ellipsis,) + lattice.coords]
+        super().__setitem__(key, stored)
+
+    def _in(self, key):
+        if isinstance(key, sp.IndexedBase):
+            key = self.consm[key]
+        ind = tuple(slice(vmax, -vmax) for vmax in self.lattice.vmax)
+        return self[key][(Ellipsis,) + ind]
+
+    @monitor
+    def update(self):
+        """
+        update the ghost nodes of the periodic directions with the values
+        of their images.
+        """
+        lattice = self.lattice
+        self.swaparray[..., lattice.ghost] = self.swaparray[..., lattice.image]
+
+    def generate_local_update(self, generator, name="periodic_update"):
+        """
+        generate the update of the ghost nodes of the periodic directions.
+
+        Parameters
+        ----------
+        generator : Generator
+            the generator where the routine is added
+        name : str
+            the name of the routine (default is periodic_update)
+
+        Returns
+        -------
+        bool
+            True: the ghost nodes never need MPI communications.
+
+        """
+        from .symbolic import nx, nb, batch_idx
+
+        if self.lattice.ghost.size == 0:
+            return True
+
+        def set_order(array, batch=None):
+            out = [-1] * len(self.sorder)
+            for i, s in enumerate(self.sorder):
+                out[s] = array[i]
+            if self.nbatch is not None:
+                out = [batch] + out
+            return out
+
+        nperiodic = sp.Symbol("nperiodic", integer=True)
+        ghost = sp.IndexedBase(sp.Symbol("periodic_ghost", integer=True), [nperiodic])
+        image = sp.IndexedBase(sp.Symbol("periodic_image", integer=True), [nperiodic])
+        fi = sp.IndexedBase("f", set_order([self.nv, nx], nb))
+        s = sp.Idx("s", (0, self.nv))
+        j = sp.Idx("j", (0, nperiodic))
+        ib = batch_idx()
+
+        loop = [j, s] if self.nbatch is None else [ib, j, s]
+        f_store = fi[set_order([s, ghost[j]], ib)]
+        f_load = fi[set_order([s, image[j]], ib)]
+        generator.add_routine((name, For(loop, sp.Eq(f_store, f_load))))
+        return True
+
+
+class TiledArray(SparseArray):
+    """
+    This class defines an array which stores the unknowns of the lattice
+    Boltzmann schemes on the tiles of a tiled lattice only
+    (see :py:class:`TiledLattice<pylbm.container.TiledLattice>`).
+
+    The tiles and their halos are stacked along the first direction.
+    The accessors give and set the values on the whole domain with the
+    fictitious points as for :py:class:`SparseArray<pylbm.storage.SparseArray>`.
+
+    Parameters
+    ----------
+    nv: int
+        number of velocities
+    lattice: TiledLattice
+        the tiles of the lattice
+    sorder: list
+        the order of nv, nx, ny and nz. Default is None which means
+        [nv, nx, ny, nz]
+    dtype: type
+        the type of the array. Default is numpy.double
+    nbatch : int
+        the number of ensemble members. Default is None
+
+    Attributes
+    ----------
+    array
+    lattice
+    nspace
+    nv
+    shape
+    size
+
+    """
+
+    # pylint: disable=super-init-not-called, non-parent-init-called
+    def __init__(self, nv, lattice, sorder=None, dtype=np.double, nbatch=None):
+        self.lattice = lattice
+        Array.__init__(
+            self,
+            nv,
+            lattice.storage_shape,
+            [0] * len(lattice.shape),
+            sorder,
+            dtype=dtype,
+            nbatch=nbatch,
+        )
+
+    def __setitem__(self, key, values):
+        super().__setitem__(key, values)
+        dst, src = self.lattice.copies
+        self.swaparray[(Ellipsis,) + dst] = self.swaparray[(Ellipsis,) + src]
+
+    @monitor
+    def update(self):
+        """
+        update the fictitious points of the periodic directions with the
+        values of their images.
+        """
+        lattice = self.lattice
+        self.swaparray[(Ellipsis,) + lattice.ghost] = self.swaparray[
+            (Ellipsis,) + lattice.image
+        ]
+
+    def generate_local_update(self, generator, name="periodic_update"):
+        """
+        generate the update of the fictitious points of the periodic
+        directions.
+
+        Parameters
+        ----------
+        generator : Generator
+            the generator where the routine is added
+        name : str
+            the name of the routine (default is periodic_update)
+
+        Returns
+        -------
+        bool
+            True: the fictitious points never need MPI communications.
+
+        """
+        from .symbolic import nx, ny, nz, nb, batch_idx
+
+        if self.lattice.ghost[0].size == 0:
+            return True
+
+        def set_order(array, batch=None):
+            out = [-1] * len(self.sorder)
+            for i, s in enumerate(self.sorder):
+                out[s] = array[i]
+            if self.nbatch is not None:
+                out = [batch] + out
+            return out
+
+        nperiodic = sp.Symbol("nperiodic", integer=True)
+        shape = [nperiodic, self.dim]
+        ghost = sp.IndexedBase(sp.Symbol("periodic_ghost", integer=True), shape)
+        image = sp.IndexedBase(sp.Symbol("periodic_image", integer=True), shape)
+        fi = sp.IndexedBase("f", set_order([self.nv] + [nx, ny, nz][: self.dim], nb))
+        s = sp.Idx("s", (0, self.nv))
+        j = sp.Idx("j", (0, nperiodic))
+        ib = batch_idx()
+
+        loop = [j, s] if self.nbatch is None else [ib, j, s]
+        f_store = fi[set_order([s] + [ghost[j, d] for d in range(self.dim)], ib)]
+        f_load = fi[set_order([s] + [image[j, d] for d in range(self.dim)], ib)]
+        generator.add_routine((name, For(loop, sp.Eq(f_store, f_load))))
+        return True
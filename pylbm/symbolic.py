@@ -8,7 +8,10 @@
 Symbolic module
 """
 
+import os
+import pickle
 import inspect
+import weakref
 import numpy as np
 import sympy as sp
 from sympy.matrices.common import ShapeError
@@ -26,6 +29,7 @@ ix_, iy_, iz_, iv_ = sp.symbols(
 rel_ux, rel_uy, rel_uz = sp.symbols(
     "rel_ux, rel_uy, rel_uz", real=True
 )  # pylint: disable=invalid-name
+nb, ib_ = sp.symbols("nb, ib_", integer=True)  # pylint: disable=invalid-name
 
 
 class SymbolicVector(sp.Matrix):
@@ -117,6 +121,7 @@ def indexed(
     velocities=None,
     velocities_index=None,
     priority=None,
+    batch=None,
 ):
     """
     Return a SymPy matrix or an expression of indexed
@@ -147,6 +152,10 @@ def indexed(
         define how to reorder the indeices (lower to greater)
         (default is None)
 
+    batch : sympy.Idx
+        index of the ensemble members added before the other indices
+        (default is None)
+
     Return
     ------
 
@@ -186,14 +195,31 @@ def indexed(
     [    m[1, j + 1, k]],
     [m[2, j - 1, k - 1]]])
 
+    >>> m = indexed("m", [10, 100, 200], [i, j, k], velocities_index=range(2), batch=batch_idx())
+    >>> m
+    Matrix([
+    [m[ib_, 0, j, k]],
+    [m[ib_, 1, j, k]]])
+
     """
     if velocities_index and velocities:
         raise ValueError("velocities and velocities_index can't be defined together.")
 
-    output = sp.IndexedBase(name, set_order(shape, priority))
+    def add_batch(ind):
+        if batch is None:
+            return ind
+        return [batch] + list(ind)
+
+    shape = set_order(shape, priority)
+    if batch is not None:
+        shape = [nb] + list(shape)
+    output = sp.IndexedBase(name, shape)
 
     if velocities_index:
-        ind = [set_order([k] + list(index[1:]), priority) for k in velocities_index]
+        ind = [
+            add_batch(set_order([k] + list(index[1:]), priority))
+            for k in velocities_index
+        ]
         return SymbolicVector([output[i] for i in ind])
     elif velocities is not None:
         ind = []
@@ -202,10 +228,10 @@ def indexed(
             tmp_ind = []
             for ik, k in enumerate(v):  # pylint: disable=invalid-name
                 tmp_ind.append(indices[ik] + int(k))
-            ind.append(set_order([iv] + tmp_ind, priority))
+            ind.append(add_batch(set_order([iv] + tmp_ind, priority)))
         return SymbolicVector([output[i] for i in ind])
     else:
-        return output[set_order(index, priority)]
+        return output[add_batch(set_order(index, priority))]
 
 
 def space_idx(ranges, priority=None):
@@ -256,6 +282,151 @@ def space_idx(ranges, priority=None):
         return idx
 
 
+def batch_idx():
+    """
+    Return the SymPy Idx of the ensemble members.
+
+        ib_ -> [0, nb[
+
+    Return
+    ------
+
+    sympy.Idx
+
+    """
+    return sp.Idx(ib_, (0, nb))
+
+
+# the memoized symbolic simplifications and inverses: only the last
+# SYMBOLIC_CACHE_SIZE results used are kept
+SYMBOLIC_CACHE_SIZE = 8192
+_symbolic_cache = {}  # pylint: disable=invalid-name
+
+
+def _memoize(key, compute):
+    """
+    Return the memoized result of key or compute it.
+
+    The dictionary keeps the order of the uses: the least recently used
+    results are removed when there are more than SYMBOLIC_CACHE_SIZE.
+    """
+    try:
+        res = _symbolic_cache.pop(key)
+    except KeyError:
+        res = compute()
+    _symbolic_cache[key] = res
+    _trim_symbolic_cache()
+    return res
+
+
+def _trim_symbolic_cache():
+    """
+    Remove the least recently used results of the symbolic cache.
+    """
+    while len(_symbolic_cache) > SYMBOLIC_CACHE_SIZE:
+        del _symbolic_cache[next(iter(_symbolic_cache))]
+
+
+def simplify(expr, nsimplify=False):
+    """
+    Return the simplification of a sympy expression.
+
+    The result is memoized: the simplification of an expression
+    already seen is not computed again (see SYMBOLIC_CACHE_SIZE).
+
+    Parameters
+    ----------
+
+    expr : sympy expression
+       expression to simplify
+    nsimplify : bool
+       replace the floats by rationals (default is False)
+
+    """
+
+    def compute():
+        res = sp.sympify(expr).expand().together().factor()
+        if nsimplify:
+            res = res.nsimplify()
+        return res
+
+    return _memoize(("simplify", expr, nsimplify), compute)
+
+
+def inverse(M):
+    """
+    Return the inverse of the sympy matrix M.
+
+    The result is memoized as for :py:func:`simplify`.
+
+    Parameters
+    ----------
+
+    M : sympy matrix
+       matrix to invert
+
+    """
+    res = _memoize(
+        ("inverse", sp.ImmutableMatrix(M)), lambda: sp.ImmutableMatrix(M.inv())
+    )
+    return sp.Matrix(res)
+
+
+def save_symbolic_cache(filename=None):
+    """
+    Save the memoized simplifications in a file.
+
+    The simplifications of expressions which can't be pickled (with the
+    functions defined at run time for example) are not saved.
+
+    Parameters
+    ----------
+
+    filename : str
+       the name of the file, the default is symbolic.pkl
+       in the cache directory of the generated code
+
+    """
+    if filename is None:
+        from .generator import get_cache_directory
+
+        filename = os.path.join(get_cache_directory(), "symbolic.pkl")
+    cache = {}
+    for key, value in _symbolic_cache.items():
+        try:
+            pickle.dumps((key, value))
+        except (pickle.PicklingError, AttributeError, TypeError):
+            continue
+        cache[key] = value
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    with open(filename, "wb") as f:
+        pickle.dump(cache, f)
+
+
+def load_symbolic_cache(filename=None):
+    """
+    Load the simplifications saved by :py:func:`save_symbolic_cache`.
+
+    Nothing is done if the file doesn't exist.
+
+    Parameters
+    ----------
+
+    filename : str
+       the name of the file, the default is symbolic.pkl
+       in the cache directory of the generated code
+
+    """
+    if filename is None:
+        from .generator import get_cache_directory
+
+        filename = os.path.join(get_cache_directory(), "symbolic.pkl")
+    if os.path.exists(filename):
+        with open(filename, "rb") as f:
+            _symbolic_cache.update(pickle.load(f))
+        _trim_symbolic_cache()
+
+
 def alltogether(M, nsimplify=False):
     """
     Simplify all the elements of sympy matrix M
@@ -269,10 +440,7 @@ def alltogether(M, nsimplify=False):
     """
     for i in range(M.shape[0]):
         for j in range(M.shape[1]):
-            if nsimplify:
-                M[i, j] = M[i, j].expand().together().factor().nsimplify()
-            else:
-                M[i, j] = M[i, j].expand().together().factor()
+            M[i, j] = simplify(M[i, j], nsimplify)
 
 
 def recursive_sub(expr, replace):
@@ -285,15 +453,123 @@ def recursive_sub(expr, replace):
     return new_expr
 
 
+# the generated modules are not kept alive by this cache
+_genfunction_args = weakref.WeakKeyDictionary()  # pylint: disable=invalid-name
+
+
+def genfunction_args(function):
+    """
+    Return the names of the arguments of a generated function.
+
+    The introspection is done only once for each function which can be
+    weakly referenced.
+
+    Parameters
+    ----------
+
+    function : callable
+        the generated function
+
+    Return
+    ------
+
+    tuple of str
+
+    """
+    try:
+        return _genfunction_args[function]
+    except (KeyError, TypeError):
+        pass
+    try:
+        names = tuple(function.arg_dict.keys())
+    except AttributeError:
+        # the functions compiled by numba wrap a Python function
+        function_ = getattr(function, "py_func", function)
+        names = tuple(inspect.getfullargspec(function_).args)
+    try:
+        _genfunction_args[function] = names
+    except TypeError:
+        # the builtin functions can't be weakly referenced
+        pass
+    return names
+
+
 def call_genfunction(function, args):
     from .monitoring import monitor
     from .context import queue
 
-    try:
-        func_args = function.arg_dict.keys()
-        d = {k: args[k] for k in func_args}  # pylint: disable=invalid-name
+    d = {k: args[k] for k in genfunction_args(function)}  # pylint: disable=invalid-name
+    if hasattr(function, "arg_dict"):
         d["queue"] = queue
-    except:  # noqa: E722
-        func_args = inspect.getfullargspec(function).args
-        d = {k: args[k] for k in func_args}  # pylint: disable=invalid-name
     monitor(function)(**d)
+
+
+class GenFunctionCall:
+    """
+    Call of a generated function with its arguments bound once.
+
+    The values of the arguments are stored in a tuple and the function
+    is called without building a dictionary. The arrays are bound by
+    reference: the plan must be rebuilt when an array is replaced by
+    another one but not when its values are modified.
+
+    Parameters
+    ----------
+
+    function : callable
+        the generated function
+    args : dict
+        the values of the arguments (extra keys are ignored)
+    dynamic : iterable
+        the names of the arguments which can change at each call
+        (default is empty)
+
+    Examples
+    --------
+
+    >>> def axpy(a, x, y):
+    ...     return a*x + y
+    >>> call = GenFunctionCall(axpy, {'a': 2, 'x': 1, 'y': 3, 'z': 0}, ['a'])
+    >>> call()
+    5
+    >>> call(a=3)
+    6
+
+    """
+
+    def __init__(self, function, args, dynamic=()):
+        from .monitoring import monitor
+        from .context import queue
+
+        self.names = genfunction_args(function)
+        self.function = monitor(function)
+        self.args = tuple(args[k] for k in self.names)
+        self.kwargs = None
+        if hasattr(function, "arg_dict"):
+            # loo.py kernels are only called with keyword arguments
+            self.kwargs = dict(zip(self.names, self.args))
+            self.kwargs["queue"] = queue
+        self.dynamic = {k: self.names.index(k) for k in dynamic if k in self.names}
+
+    def __call__(self, **values):
+        """
+        Call the function with the bound arguments.
+
+        Parameters
+        ----------
+
+        values : dict
+            new values of the dynamic arguments
+
+        """
+        if self.kwargs is not None:
+            kwargs = dict(self.kwargs)
+            kwargs.update({k: v for k, v in values.items() if k in self.dynamic})
+            return self.function(**kwargs)
+        if self.dynamic and values:
+            args = list(self.args)
+            for k, i in self.dynamic.items():
+                if k in values:
+                    args[i] = values[k]
+            return self.function(*args)
+        return self.function(*self.args)
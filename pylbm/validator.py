@@ -17,6 +17,7 @@ import sympy
 from .elements.base import Element
 from .boundary import BoundaryMethod
 from .algorithm import BaseAlgorithm
+from . import _configure_logging
 
 log = logging.getLogger(__name__)  # pylint: disable=invalid-name
 init(autoreset=True)
@@ -186,6 +187,8 @@ def validate(dico, name):
         The class name to validate ('Stencil', 'Domain', ...)
 
     """
+    _configure_logging()
+
     scheme = {
         "velocities": {
             "type": "list",
@@ -305,6 +308,26 @@ def validate(dico, name):
             "keysrules": {"type": "symbol"},
             "valuesrules": {"anyof": [{"type": "expr"}, {"type": "number"}]},
         },
+        "ensemble": {
+            "type": "dict",
+            "keysrules": {"type": "symbol"},
+            "valuesrules": {"type": "list", "schema": {"type": "number"}},
+        },
+        "reductions": {
+            "type": "dict",
+            "keysrules": {"type": "string"},
+            "valuesrules": {
+                "type": "dict",
+                "schema": {
+                    "expr": {"anyof_type": ["expr", "number"], "required": True},
+                    "op": {"type": "string", "allowed": ["sum", "max", "min", "l2"]},
+                    "x": {"type": "number"},
+                    "y": {"type": "number"},
+                    "z": {"type": "number"},
+                    "increment": {"type": "boolean"},
+                },
+            },
+        },
         "inittype": {
             "type": "string",
             "allowed": ["moments", "distributions"],
@@ -331,12 +354,20 @@ def validate(dico, name):
             "type": "list",
             "schema": {"anyof_type": ["number", "expr"]},
         },
-        "generator": {"type": "string", "allowed": ["numpy", "cython", "loopy"]},
+        "generator": {
+            "type": "string",
+            "allowed": ["numpy", "cython", "loopy", "numba", "c"],
+        },
         "codegen_option": {
             "type": "dict",
             "schema": {
                 "directory": {"type": "string"},
                 "generate": {"type": "boolean"},
+                "cache": {"type": "boolean"},
+                "flags": {"type": "list", "schema": {"type": "string"}},
+                "threads": {"type": "integer", "min": 0},
+                "jobs": {"type": "integer", "min": 1},
+                "fastmath": {"type": "boolean"},
             },
         },
         "lbm_algorithm": {
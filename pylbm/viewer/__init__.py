@@ -1,3 +1,12 @@
-from . import matplotlib_viewer
+import importlib
 
 # from . import vispyViewer
+
+# the viewers are imported at the first access since they import matplotlib
+_viewers = ["matplotlib_viewer"]
+
+
+def __getattr__(name):
+    if name in _viewers:
+        return importlib.import_module("." + name, __name__)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
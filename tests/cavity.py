@@ -0,0 +1,140 @@
+"""
+the lid driven cavities used by the tests of the simulation
+"""
+
+import numpy as np
+import sympy as sp
+import pylbm
+
+X, Y, Z, LA = sp.symbols("X, Y, Z, lambda")
+rho, qx, qy, qz = sp.symbols("rho, qx, qy, qz")
+
+LABELS = [[0, 0, 0, 1], [-1, -1, 0, 1]]
+
+
+def bc_up(f, m, x, y, driven_velocity):
+    m[qx] = driven_velocity
+
+
+def cavity(generator, label):
+    """the D2Q9 lid driven cavity"""
+    dx = 1.0 / 16
+    s_mu = 1.0 / (0.5 + 3e-3 / dx)
+    s = [0.0, 0.0, 0.0, s_mu, s_mu, 1.5, 1.5, s_mu, s_mu]
+    qx2, qy2, qxy = qx**2, qy**2, qx * qy
+    return {
+        "box": {"x": [0.0, 1.0], "y": [0.0, 1.0], "label": label},
+        "space_step": dx,
+        "scheme_velocity": LA,
+        "schemes": [
+            {
+                "velocities": list(range(9)),
+                "polynomials": [
+                    1,
+                    LA * X,
+                    LA * Y,
+                    3 * (X**2 + Y**2) - 4,
+                    0.5 * (9 * (X**2 + Y**2) ** 2 - 21 * (X**2 + Y**2) + 8),
+                    3 * X * (X**2 + Y**2) - 5 * X,
+                    3 * Y * (X**2 + Y**2) - 5 * Y,
+                    X**2 - Y**2,
+                    X * Y,
+                ],
+                "relaxation_parameters": s,
+                "equilibrium": [
+                    rho,
+                    qx,
+                    qy,
+                    -2 * rho + 3 * (qx2 + qy2),
+                    rho - 3 * (qx2 + qy2),
+                    -qx / LA,
+                    -qy / LA,
+                    qx2 - qy2,
+                    qxy,
+                ],
+                "conserved_moments": [rho, qx, qy],
+            }
+        ],
+        "init": {rho: 1.0, qx: 0.0, qy: 0.0},
+        "parameters": {LA: 1.0},
+        "boundary_conditions": {
+            0: {"method": {0: pylbm.bc.BouzidiBounceBack}},
+            1: {
+                "method": {0: pylbm.bc.BouzidiBounceBack},
+                "value": (bc_up, (0.1,)),
+            },
+        },
+        "generator": generator,
+    }
+
+
+def bc_up_3d(f, m, x, y, z, driven_velocity):
+    m[qx] = driven_velocity
+
+
+def cavity_3d(generator, label):
+    """the D3Q19 lid driven cavity"""
+    return {
+        "box": {"x": [0.0, 1.0], "y": [0.0, 1.0], "z": [0.0, 1.0], "label": label},
+        "space_step": 1.0 / 8,
+        "scheme_velocity": LA,
+        "schemes": [
+            {
+                "velocities": list(range(19)),
+                "polynomials": [
+                    1,
+                    LA * X,
+                    LA * Y,
+                    LA * Z,
+                    X**2,
+                    Y**2,
+                    Z**2,
+                    X * Y,
+                    Y * Z,
+                    Z * X,
+                    X * Y**2,
+                    X * Z**2,
+                    Y * X**2,
+                    Y * Z**2,
+                    Z * X**2,
+                    Z * Y**2,
+                    X**2 * Y**2,
+                    Y**2 * Z**2,
+                    Z**2 * X**2,
+                ],
+                "relaxation_parameters": [0.0] * 4 + [1.5] * 15,
+                "equilibrium": [
+                    rho,
+                    qx,
+                    qy,
+                    qz,
+                    rho / 3 + qx**2,
+                    rho / 3 + qy**2,
+                    rho / 3 + qz**2,
+                    qx * qy,
+                    qy * qz,
+                    qz * qx,
+                ]
+                + [qx / 3] * 2
+                + [qy / 3] * 2
+                + [qz / 3] * 2
+                + [rho / 9] * 3,
+                "conserved_moments": [rho, qx, qy, qz],
+            }
+        ],
+        "init": {rho: 1.0, qx: 0.0, qy: 0.0, qz: 0.0},
+        "parameters": {LA: 1.0},
+        "boundary_conditions": {
+            0: {"method": {0: pylbm.bc.BouzidiBounceBack}},
+            1: {
+                "method": {0: pylbm.bc.BouzidiBounceBack},
+                "value": (bc_up_3d, (0.1,)),
+            },
+        },
+        "generator": generator,
+    }
+
+
+def interior(sol):
+    """the distribution functions in the interior domain"""
+    return np.array([sol.F[k] for k in range(sol.container.nv)])
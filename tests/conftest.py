@@ -182,6 +182,17 @@ def schemes(request):
     return request
 
 
+@pytest.fixture(autouse=True, scope="session")
+def cache_directory(tmp_path_factory):
+    """
+    Store the compiled modules of the tests in a new directory and not in
+    the cache of the user which may hold modules of previous runs.
+    """
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("PYLBM_CACHE_DIR", str(tmp_path_factory.mktemp("cache")))
+        yield
+
+
 def pytest_addoption(parser):
     group = parser.getgroup("h5 file comparison")
     group.addoption(
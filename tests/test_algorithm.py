@@ -0,0 +1,209 @@
+"""
+test the lattice Boltzmann algorithms compared to the default pull algorithm
+"""
+
+import pytest
+import numpy as np
+import sympy as sp
+import pylbm
+
+from cavity import LABELS, cavity, cavity_3d, interior, rho, qx, qy, qz
+
+
+def algorithm(generator, label, **options):
+    """the simulation of the cavity with the options of the algorithm"""
+    dico = cavity(generator, label)
+    dico["lbm_algorithm"] = options
+    return pylbm.Simulation(dico)
+
+
+@pytest.mark.parametrize("generator", ["numpy", "cython"])
+def test_call_plan(generator):
+    sol = pylbm.Simulation(cavity(generator, [0, 0, 0, 1]))
+    call = sol.algo.get_call("one_time_step", sol)
+    # the distribution functions are swapped at each time step
+    sol.one_time_step()
+    sol.one_time_step()
+    assert sol.algo.get_call("one_time_step", sol) is call
+
+
+@pytest.mark.parametrize("generator", ["numpy", "cython"])
+def test_call_plan_new_parameter(generator):
+    sol = pylbm.Simulation(cavity(generator, [0, 0, 0, 1]))
+    call = sol.algo.get_call("one_time_step", sol)
+    sol.extra_parameters[sp.Symbol("alpha")] = 1.0
+    assert sol.algo.get_call("one_time_step", sol) is not call
+
+
+@pytest.mark.parametrize("generator", ["numpy", "cython"])
+def test_call_plan_arrays(generator):
+    # the arrays are compared by identity
+    sol = pylbm.Simulation(cavity(generator, [0, 0, 0, 1]))
+    sol.extra_parameters[sp.Symbol("beta")] = np.zeros(3)
+    call = sol.algo.get_call("one_time_step", sol)
+    assert sol.algo.get_call("one_time_step", sol) is call
+    sol.extra_parameters[sp.Symbol("beta")] = np.zeros(3)
+    assert sol.algo.get_call("one_time_step", sol) is not call
+
+
+@pytest.mark.parametrize("tiles", [{"y": 5}, {"x": 3, "y": 4}, {"y": "auto"}])
+def test_tiles(tiles):
+    sol_ref = pylbm.Simulation(cavity("cython", [0, 0, 0, 1]))
+    sol = algorithm("cython", [0, 0, 0, 1], settings={"tiles": tiles})
+
+    for _ in range(5):
+        sol_ref.one_time_step()
+        sol.one_time_step()
+    sol_ref.run(5)
+    sol.run(5)
+    assert np.all(sol.F_halo[:] == sol_ref.F_halo[:])
+
+
+def test_tiles_autotuner():
+    sol = algorithm("cython", [0, 0, 0, 1], settings={"tiles": {"y": "auto"}})
+    # the candidates are timed in one_time_step
+    for _ in range(5):
+        sol.one_time_step()
+
+    tuner = sol.algo.tile_tuner
+    # the warm-up is not timed
+    assert len(tuner.candidates) == 4
+    assert len(tuner.timings) == 4
+    assert tuner.done
+    assert sol.algo.tiles == tuner.best
+
+
+@pytest.mark.parametrize("tiles", [{"y": 3, "z": 4}, {"x": 2, "z": "auto"}])
+def test_tiles_3d(tiles):
+    label = [0, 0, 0, 0, 0, 1]
+    sol_ref = pylbm.Simulation(cavity_3d("cython", label))
+    dico = cavity_3d("cython", label)
+    dico["lbm_algorithm"] = {"settings": {"tiles": tiles}}
+    sol = pylbm.Simulation(dico)
+
+    for _ in range(5):
+        sol_ref.one_time_step()
+        sol.one_time_step()
+    sol_ref.run(5)
+    sol.run(5)
+    assert np.all(sol.F_halo[:] == sol_ref.F_halo[:])
+    for moment in [rho, qx, qy, qz]:
+        assert np.all(sol.m[moment] == sol_ref.m[moment])
+
+
+def test_tiles_3d_autotuner():
+    dico = cavity_3d("cython", [0, 0, 0, 0, 0, 1])
+    dico["lbm_algorithm"] = {"settings": {"tiles": {"x": 2, "z": "auto"}}}
+    sol = pylbm.Simulation(dico)
+    for _ in range(5):
+        sol.one_time_step()
+
+    # the tile sizes which are given are kept
+    tuner = sol.algo.tile_tuner
+    assert tuner.done
+    assert sol.algo.tiles == dict(tuner.best, x=2)
+
+
+@pytest.mark.parametrize("generator", ["numpy", "cython"])
+@pytest.mark.parametrize("label", LABELS)
+def test_aa_algorithm(generator, label):
+    sol_ref = pylbm.Simulation(cavity(generator, label))
+    sol = algorithm(generator, label, name=pylbm.algorithm.AAAlgorithm)
+    assert sol.container.Fnew is sol.container.F
+
+    for nsteps in [1, 4, 5]:
+        sol_ref.run(nsteps)
+        sol.run(nsteps)
+        for moment in [rho, qx, qy]:
+            assert sol.m[moment] == pytest.approx(sol_ref.m[moment], abs=1e-14)
+        assert interior(sol) == pytest.approx(interior(sol_ref), abs=1e-14)
+
+
+@pytest.mark.parametrize("generator", ["numpy", "cython"])
+def test_aa_algorithm_parity(generator):
+    sol = algorithm(generator, [0, 0, 0, 1], name=pylbm.algorithm.AAAlgorithm)
+
+    for nsteps in [1, 4, 5]:
+        sol.run(nsteps)
+        assert sol.container.parity == nsteps % 2
+        # the distribution functions are put in the natural order
+        sol.m[rho]
+        assert sol.container.parity == 0
+
+
+@pytest.mark.parametrize("generator", ["numpy", "cython"])
+@pytest.mark.parametrize("label", LABELS)
+def test_push_algorithm(generator, label):
+    sol_ref = pylbm.Simulation(cavity(generator, label))
+    sol = algorithm(generator, label, name=pylbm.algorithm.PushAlgorithm)
+
+    for nsteps in [1, 4]:
+        sol_ref.run(nsteps)
+        sol.run(nsteps)
+        for moment in [rho, qx, qy]:
+            assert sol.m[moment] == pytest.approx(sol_ref.m[moment], abs=1e-14)
+        assert interior(sol) == pytest.approx(interior(sol_ref), abs=1e-14)
+
+
+@pytest.mark.parametrize("generator", ["numpy", "cython"])
+def test_push_algorithm_parity(generator):
+    sol = algorithm(generator, [0, 0, 0, 1], name=pylbm.algorithm.PushAlgorithm)
+
+    for nsteps in [1, 4]:
+        sol.run(nsteps)
+        assert sol.container.parity == 1
+        # the distribution functions are put in the natural order
+        sol.m[rho]
+        assert sol.container.parity == 0
+
+
+@pytest.mark.parametrize("generator", ["numpy", "cython"])
+@pytest.mark.parametrize("name", ["PullAlgorithm", "AAAlgorithm"])
+def test_optimize_flops(generator, name):
+    sol = algorithm(
+        generator,
+        [0, 0, 0, 1],
+        name=getattr(pylbm.algorithm, name),
+        settings={"optimize": True},
+    )
+    before, after = sol.algo.flops["one_time_step"]
+    assert after < before
+
+
+@pytest.mark.parametrize("generator", ["numpy", "cython"])
+@pytest.mark.parametrize("name", ["PullAlgorithm", "AAAlgorithm"])
+def test_optimize(generator, name):
+    label = [0, 0, 0, 1]
+    sol_ref = pylbm.Simulation(cavity(generator, label))
+    sol = algorithm(
+        generator,
+        label,
+        name=getattr(pylbm.algorithm, name),
+        settings={"optimize": True},
+    )
+
+    for nsteps in [1, 4]:
+        sol_ref.run(nsteps)
+        sol.run(nsteps)
+        for moment in [rho, qx, qy]:
+            assert sol.m[moment] == pytest.approx(sol_ref.m[moment], abs=1e-12)
+        assert interior(sol) == pytest.approx(interior(sol_ref), abs=1e-12)
+
+
+def test_fused_bc_methods():
+    sol = algorithm("cython", [0, 0, 0, 1], settings={"fused_bc": True})
+    assert sol.bc.fused.methods == sol.bc.methods
+    assert sol.bc.prepass == []
+
+
+@pytest.mark.parametrize("label", LABELS)
+def test_fused_bc(label):
+    sol_ref = pylbm.Simulation(cavity("cython", label))
+    sol = algorithm("cython", label, settings={"fused_bc": True})
+
+    for nsteps in [1, 10]:
+        sol_ref.run(nsteps)
+        sol.run(nsteps)
+        for moment in [rho, qx, qy]:
+            assert sol.m[moment] == pytest.approx(sol_ref.m[moment], abs=1e-12)
+        assert interior(sol) == pytest.approx(interior(sol_ref), abs=1e-12)
@@ -0,0 +1,119 @@
+"""
+test the build and the cache of the compiled modules
+"""
+
+import os
+import shutil
+import pytest
+import pylbm
+from pylbm.generator.autowrap import CythonCodeWrapper
+
+from cavity import cavity, rho, qx, qy
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """an empty cache of the compiled modules"""
+    monkeypatch.setenv("PYLBM_CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def modules(cache):
+    """the directories of the modules in the cache"""
+    return [d for d in os.listdir(cache) if d != "objects"]
+
+
+@pytest.mark.parametrize("generator", ["numpy", "cython"])
+def test_cache(cache, generator):
+    sol_ref = pylbm.Simulation(cavity(generator, [0, 0, 0, 1]))
+    assert len(modules(cache)) == 1
+
+    sol = pylbm.Simulation(cavity(generator, [0, 0, 0, 1]))
+    assert len(modules(cache)) == 1
+    assert sol.generator.module is sol_ref.generator.module
+
+
+@pytest.mark.parametrize("generator", ["numpy", "cython"])
+def test_cache_new_code(cache, generator):
+    pylbm.Simulation(cavity(generator, [0, 0, 0, 1]))
+
+    # the relaxation parameters are written in the generated code
+    dico = cavity(generator, [0, 0, 0, 1])
+    dico["schemes"][0]["relaxation_parameters"][5] = 1.6
+    pylbm.Simulation(dico)
+    assert len(modules(cache)) == 2
+
+
+@pytest.mark.parametrize("generator", ["numpy", "cython"])
+def test_cache_disabled(cache, generator):
+    sol_ref = pylbm.Simulation(cavity(generator, [0, 0, 0, 1]))
+
+    dico = cavity(generator, [0, 0, 0, 1])
+    dico["codegen_option"] = {"cache": False}
+    sol = pylbm.Simulation(dico)
+    assert len(modules(cache)) == 1
+    assert sol.generator.module is not sol_ref.generator.module
+
+
+def test_build_flags(cache):
+    sol_ref = pylbm.Simulation(cavity("cython", [0, 0, 0, 1]))
+
+    dico = cavity("cython", [0, 0, 0, 1])
+    dico["codegen_option"] = {"flags": ["-O2"]}
+    sol = pylbm.Simulation(dico)
+    assert sol.generator.module is not sol_ref.generator.module
+    assert len(os.listdir(cache / "objects")) == 2
+
+    for _ in range(3):
+        sol_ref.one_time_step()
+        sol.one_time_step()
+    for moment in [rho, qx, qy]:
+        assert sol.m[moment] == pytest.approx(sol_ref.m[moment])
+
+
+def test_parallel_build(cache, monkeypatch):
+    compiler = CythonCodeWrapper._get_compiler()
+    if compiler is None or not CythonCodeWrapper._is_gcc(compiler[0][0]):
+        pytest.skip("the parallel compilation needs GCC")
+
+    commands = []
+    run = CythonCodeWrapper._run
+
+    def record(self, command):
+        commands.append(command)
+        return run(self, command)
+
+    monkeypatch.setattr(CythonCodeWrapper, "_run", record)
+    dico = cavity("cython", [0, 0, 0, 1])
+    dico["codegen_option"] = {"jobs": 2}
+    sol = pylbm.Simulation(dico)
+    assert "-flto" in commands[0]
+    assert "-flto=2" in commands[1]
+
+    dico = cavity("cython", [0, 0, 0, 1])
+    dico["codegen_option"] = {"cache": False}
+    sol_ref = pylbm.Simulation(dico)
+
+    sol_ref.run(5)
+    sol.run(5)
+    for moment in [rho, qx, qy]:
+        assert sol.m[moment] == pytest.approx(sol_ref.m[moment], abs=1e-14)
+
+
+def test_object_cache(cache, monkeypatch):
+    pylbm.Simulation(cavity("cython", [0, 0, 0, 1]))
+    objects = os.listdir(cache / "objects")
+    assert len(objects) == 1
+
+    # the module removed from the cache is linked from its object file
+    for name in modules(cache):
+        shutil.rmtree(cache / name)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the object file is not reused")
+
+    monkeypatch.setattr(CythonCodeWrapper, "_cythonize", fail)
+    monkeypatch.setattr(CythonCodeWrapper, "_compile", fail)
+    pylbm.Simulation(cavity("cython", [0, 0, 0, 1]))
+    assert os.listdir(cache / "objects") == objects
+    assert len(modules(cache)) == 1
@@ -0,0 +1,77 @@
+"""
+test the storages of the distribution functions
+"""
+
+import pytest
+import pylbm
+
+from cavity import LABELS, cavity, interior, rho, qx, qy
+
+
+def porous_cavity(label):
+    """the cavity with an obstacle"""
+    dico = cavity("cython", label)
+    dico["elements"] = [pylbm.Circle((0.5, 0.5), 0.2, label=0)]
+    return dico
+
+
+def test_fcopy():
+    # the copy of the driver is allocated once
+    sol = pylbm.Simulation(cavity("cython", [0, 0, 0, 1]))
+    sol.run(2)
+    fcopy = sol.container.fcopy()
+    sol.run(3)
+    assert sol.container.fcopy() is fcopy
+
+
+def test_sparse_lattice():
+    sol = pylbm.Simulation(porous_cavity([0, 0, 0, 1]), sparse=True)
+    lattice = sol.container.lattice
+    fluid = sol.domain.in_or_out == sol.domain.valin
+    assert lattice.nfluid == fluid.sum()
+    assert lattice.nnode < fluid.size
+
+
+@pytest.mark.parametrize("label", LABELS)
+def test_sparse(label):
+    dico = porous_cavity(label)
+    sol_ref = pylbm.Simulation(dico)
+    sol = pylbm.Simulation(dico, sparse=True)
+
+    fluid = (sol.domain.in_or_out == sol.domain.valin)[1:-1, 1:-1]
+    for nsteps in [1, 10]:
+        sol_ref.run(nsteps)
+        sol.run(nsteps)
+        for moment in [rho, qx, qy]:
+            assert sol.m[moment][fluid] == pytest.approx(
+                sol_ref.m[moment][fluid], abs=1e-12
+            )
+        assert interior(sol)[:, fluid] == pytest.approx(
+            interior(sol_ref)[:, fluid], abs=1e-12
+        )
+
+
+def test_tiled_lattice():
+    # the tiles without fluid nodes are not stored
+    sol = pylbm.Simulation(porous_cavity([0, 0, 0, 1]), tile_size=2)
+    assert sol.container.lattice.ntile < 64
+
+
+@pytest.mark.parametrize("tile_size", [2, [3, 4]])
+@pytest.mark.parametrize("label", LABELS)
+def test_tiled(label, tile_size):
+    dico = porous_cavity(label)
+    sol_ref = pylbm.Simulation(dico)
+    sol = pylbm.Simulation(dico, tile_size=tile_size)
+
+    fluid = (sol.domain.in_or_out == sol.domain.valin)[1:-1, 1:-1]
+    for nsteps in [1, 10]:
+        sol_ref.run(nsteps)
+        sol.run(nsteps)
+        for moment in [rho, qx, qy]:
+            assert sol.m[moment][fluid] == pytest.approx(
+                sol_ref.m[moment][fluid], abs=1e-12
+            )
+        assert interior(sol)[:, fluid] == pytest.approx(
+            interior(sol_ref)[:, fluid], abs=1e-12
+        )
@@ -0,0 +1,61 @@
+"""
+test the generators of the code compared to the cython generator
+"""
+
+import pytest
+import numpy as np
+import pylbm
+
+from cavity import LABELS, cavity, rho, qx, qy
+
+
+@pytest.mark.parametrize("label", LABELS)
+def test_threads(label):
+    sol_ref = pylbm.Simulation(cavity("cython", label))
+    dico = cavity("cython", label)
+    dico["codegen_option"] = {"threads": 2}
+    sol = pylbm.Simulation(dico)
+    assert sol.generator.routines["one_time_step"].settings["threads"] == 2
+
+    for _ in range(5):
+        sol_ref.one_time_step()
+        sol.one_time_step()
+    sol_ref.run(5)
+    sol.run(5)
+    assert np.all(sol.F_halo[:] == sol_ref.F_halo[:])
+
+
+@pytest.mark.parametrize("fastmath", [False, True])
+@pytest.mark.parametrize("label", LABELS)
+def test_numba(label, fastmath):
+    pytest.importorskip("numba")
+    sol_ref = pylbm.Simulation(cavity("cython", label))
+    dico = cavity("numba", label)
+    dico["codegen_option"] = {"fastmath": fastmath}
+    sol = pylbm.Simulation(dico)
+    assert sol.generator.module.one_time_step.targetoptions["parallel"]
+
+    for nsteps in [1, 10]:
+        for _ in range(nsteps):
+            sol_ref.one_time_step()
+            sol.one_time_step()
+        for moment in [rho, qx, qy]:
+            assert sol.m[moment] == pytest.approx(sol_ref.m[moment], abs=1e-12)
+        assert sol.F[:] == pytest.approx(sol_ref.F[:], abs=1e-12)
+
+
+@pytest.mark.parametrize("threads", [0, 2])
+@pytest.mark.parametrize("label", LABELS)
+def test_c(label, threads):
+    sol_ref = pylbm.Simulation(cavity("cython", label))
+    dico = cavity("c", label)
+    dico["codegen_option"] = {"threads": threads}
+    sol = pylbm.Simulation(dico)
+
+    for nsteps in [1, 10]:
+        for _ in range(nsteps):
+            sol_ref.one_time_step()
+            sol.one_time_step()
+        for moment in [rho, qx, qy]:
+            assert sol.m[moment] == pytest.approx(sol_ref.m[moment], abs=1e-12)
+        assert sol.F[:] == pytest.approx(sol_ref.F[:], abs=1e-12)
@@ -0,0 +1,50 @@
+"""
+test the checkpoint of a simulation in a hdf5 file
+"""
+
+import pytest
+import numpy as np
+import pylbm
+
+from cavity import cavity
+
+
+@pytest.fixture(params=["numpy", "cython"])
+def checkpoint(request, tmp_path):
+    """a simulation after 5 time steps and its checkpoint"""
+    dico = cavity(request.param, [0, 0, 0, 1])
+    dico["codegen_option"] = {"directory": str(tmp_path / "code")}
+    sol = pylbm.Simulation(dico)
+    for _ in range(5):
+        sol.one_time_step()
+
+    filename = str(tmp_path / "checkpoint.h5")
+    sol.save_checkpoint(filename)
+    return sol, request.param, filename
+
+
+def test_restart(checkpoint):
+    sol_ref, generator, filename = checkpoint
+    sol = pylbm.Simulation.from_checkpoint(cavity(generator, [0, 0, 0, 1]), filename)
+    assert sol.nt == sol_ref.nt
+    assert sol.t == pytest.approx(sol_ref.t)
+    for k in range(9):
+        assert np.all(sol.F[k] == sol_ref.F[k])
+
+
+def test_restart_code(checkpoint):
+    # the generated code of the checkpoint is reused
+    _, generator, filename = checkpoint
+    sol = pylbm.Simulation.from_checkpoint(cavity(generator, [0, 0, 0, 1]), filename)
+    assert not sol.generator.generate
+
+
+def test_continue(checkpoint):
+    sol_ref, generator, filename = checkpoint
+    sol = pylbm.Simulation.from_checkpoint(cavity(generator, [0, 0, 0, 1]), filename)
+
+    for _ in range(5):
+        sol_ref.one_time_step()
+        sol.one_time_step()
+    for k in range(9):
+        assert np.all(sol.F[k] == sol_ref.F[k])
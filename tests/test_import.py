@@ -0,0 +1,51 @@
+import sys
+import subprocess
+
+
+def test_lazy_import():
+    code = (
+        "import sys, pylbm\n"
+        "for name in ['matplotlib', 'h5py', 'stl', 'pylbm.analysis']:\n"
+        "    assert name not in sys.modules, name\n"
+        "pylbm.H5File, pylbm.STLElement, pylbm.Stability\n"
+        "pylbm.viewer.matplotlib_viewer\n"
+        "for name in ['matplotlib', 'h5py', 'stl', 'pylbm.analysis']:\n"
+        "    assert name in sys.modules, name\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_lazy_configuration():
+    code = (
+        "import sys, pylbm\n"
+        "names = ['mpi4py', 'cerberus', 'colorlog', 'colorama', 'argparse']\n"
+        "for name in names:\n"
+        "    assert name not in sys.modules, name\n"
+        "assert not pylbm.logger.handlers\n"
+        "pylbm.Simulation\n"
+        "for name in names:\n"
+        "    assert name in sys.modules, name\n"
+        "assert pylbm.logger.handlers\n"
+        "assert callable(pylbm.options)\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_configuration_submodule():
+    code = (
+        "import pylbm\n"
+        "from pylbm.stencil import Stencil\n"
+        "Stencil({'dim': 1, 'schemes': [{'velocities': [0, 1, 2]}]})\n"
+        "assert pylbm.logger.handlers\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_all():
+    import pylbm
+
+    namespace = {}
+    exec("from pylbm import *", namespace)
+    for name in ["Simulation", "Circle", "STLElement", "bc", "options"]:
+        assert name in pylbm.__all__
+        assert namespace[name] is getattr(pylbm, name)
@@ -0,0 +1,63 @@
+"""
+test the reductions computed in the generated one_time_step
+"""
+
+import pytest
+import numpy as np
+import sympy as sp
+import pylbm
+
+from cavity import cavity, rho, qx, qy
+
+REDUCTIONS = {
+    "sum": (
+        {"expr": rho},
+        lambda m_rho, m_qx, m_qy: m_rho.sum(),
+    ),
+    "max": (
+        {"expr": sp.sqrt(qx**2 + qy**2) / rho, "op": "max"},
+        lambda m_rho, m_qx, m_qy: (np.sqrt(m_qx**2 + m_qy**2) / m_rho).max(),
+    ),
+    "min": (
+        {"expr": qx, "op": "min"},
+        lambda m_rho, m_qx, m_qy: m_qx.min(),
+    ),
+    "l2": (
+        {"expr": qy, "op": "l2"},
+        lambda m_rho, m_qx, m_qy: np.sqrt((m_qy**2).sum()),
+    ),
+    "line": (
+        {"expr": qx, "x": 0.5},
+        lambda m_rho, m_qx, m_qy: m_qx[8].sum(),
+    ),
+    "point": (
+        {"expr": qx, "x": 0.5, "y": 0.9, "op": "max"},
+        lambda m_rho, m_qx, m_qy: m_qx[8, 14],
+    ),
+}
+
+
+@pytest.mark.parametrize("name", REDUCTIONS.keys())
+def test_reduction(name):
+    reduction, expected = REDUCTIONS[name]
+    dico = cavity("cython", [0, 0, 0, 1])
+    dico["reductions"] = {name: reduction}
+    sol = pylbm.Simulation(dico)
+
+    for nsteps in [1, 5]:
+        sol.run(nsteps)
+        value = expected(sol.m[rho], sol.m[qx], sol.m[qy])
+        assert sol.reductions[name] == pytest.approx(value, rel=1e-12, abs=1e-12)
+
+
+def test_increment():
+    dico = cavity("cython", [0, 0, 0, 1])
+    dico["reductions"] = {
+        "residual": {"expr": qx, "op": "l2", "increment": True},
+    }
+    sol = pylbm.Simulation(dico)
+
+    m_qx = sol.m[qx].copy()
+    sol.run(1)
+    expected = np.sqrt(((sol.m[qx] - m_qx) ** 2).sum())
+    assert sol.reductions["residual"] == pytest.approx(expected, rel=1e-12)
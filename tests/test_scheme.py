@@ -0,0 +1,90 @@
+import sympy as sp
+import pylbm
+from pylbm import symbolic
+
+X, Y, LA = sp.symbols("X, Y, lambda")
+rho, qx, qy = sp.symbols("rho, qx, qy")
+
+
+def d2q9():
+    qx2, qy2, qxy = qx**2, qy**2, qx * qy
+    return {
+        "dim": 2,
+        "scheme_velocity": LA,
+        "parameters": {LA: 1.0},
+        "schemes": [
+            {
+                "velocities": list(range(9)),
+                "polynomials": [
+                    1,
+                    X,
+                    Y,
+                    3 * (X**2 + Y**2) - 4 * LA**2,
+                    0.5
+                    * (
+                        9 * (X**2 + Y**2) ** 2
+                        - 21 * (X**2 + Y**2) * LA**2
+                        + 8 * LA**4
+                    ),
+                    3 * X * (X**2 + Y**2) - 5 * X * LA**2,
+                    3 * Y * (X**2 + Y**2) - 5 * Y * LA**2,
+                    X**2 - Y**2,
+                    X * Y,
+                ],
+                "relaxation_parameters": [0.0, 0.0, 0.0, 1.5, 1.5, 1.5, 1.5, 1.8, 1.8],
+                "equilibrium": [
+                    rho,
+                    qx,
+                    qy,
+                    -2 * rho + 3 * (qx2 + qy2),
+                    rho - 3 * (qx2 + qy2),
+                    -qx / LA,
+                    -qy / LA,
+                    qx2 - qy2,
+                    qxy,
+                ],
+                "conserved_moments": [rho, qx, qy],
+            }
+        ],
+    }
+
+
+class TestScheme:
+    def test_memoization(self, monkeypatch):
+        scheme_ref = pylbm.Scheme(d2q9())
+
+        # the simplifications are not computed again
+        def fail(*args, **kwargs):
+            raise AssertionError("the simplification is not memoized")
+
+        monkeypatch.setattr(sp.Expr, "factor", fail)
+        monkeypatch.setattr(sp.MatrixBase, "inv", fail)
+        scheme = pylbm.Scheme(d2q9())
+        assert scheme.M == scheme_ref.M
+        assert scheme.invM == scheme_ref.invM
+
+    def test_save_load_cache(self, tmp_path, monkeypatch):
+        pylbm.Scheme(d2q9())
+        filename = str(tmp_path / "symbolic.pkl")
+        symbolic.save_symbolic_cache(filename)
+
+        monkeypatch.setattr(symbolic, "_symbolic_cache", {})
+        symbolic.load_symbolic_cache(filename)
+        assert len(symbolic._symbolic_cache) > 0
+
+        expr = (X + Y) ** 2
+        assert symbolic.simplify(expr) == sp.factor(expr)
+        assert ("simplify", expr, False) in symbolic._symbolic_cache
+
+        symbolic.load_symbolic_cache(str(tmp_path / "unknown.pkl"))
+
+    def test_bounded_cache(self, monkeypatch):
+        monkeypatch.setattr(symbolic, "_symbolic_cache", {})
+        monkeypatch.setattr(symbolic, "SYMBOLIC_CACHE_SIZE", 3)
+        pylbm.Scheme(d2q9())
+        assert len(symbolic._symbolic_cache) == 3
+
+        # the least recently used results are removed
+        expr = (X + Y) ** 2
+        symbolic.simplify(expr)
+        assert list(symbolic._symbolic_cache)[-1] == ("simplify", expr, False)
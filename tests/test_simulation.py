@@ -0,0 +1,237 @@
+"""
+test the class Simulation
+"""
+
+import os
+import pytest
+import numpy as np
+import sympy as sp
+import pylbm
+
+from cavity import LABELS, cavity, rho, qx, qy
+
+
+@pytest.mark.parametrize("generator", ["numpy", "cython"])
+@pytest.mark.parametrize("label", LABELS)
+def test_run(generator, label):
+    sol_ref = pylbm.Simulation(cavity(generator, label))
+    sol = pylbm.Simulation(cavity(generator, label))
+
+    for nsteps in [0, 1, 10]:
+        for _ in range(nsteps):
+            sol_ref.one_time_step()
+        sol.run(nsteps)
+
+        assert sol.nt == sol_ref.nt
+        assert sol.t == sol_ref.t
+        assert np.all(sol.F_halo[:] == sol_ref.F_halo[:])
+        for moment in [rho, qx, qy]:
+            assert np.all(sol.m[moment] == sol_ref.m[moment])
+
+
+@pytest.mark.parametrize("generator", ["numpy", "cython"])
+def test_run_every(generator):
+    sol_ref = pylbm.Simulation(cavity(generator, [0, 0, 0, 1]))
+    sol = pylbm.Simulation(cavity(generator, [0, 0, 0, 1]))
+
+    calls = []
+    sol.run(
+        until=1.0,
+        every={
+            3: lambda s: calls.append((3, s.nt, s.m[rho].sum())),
+            5: lambda s: calls.append((5, s.nt, s.m[rho].sum())),
+        },
+    )
+
+    calls_ref = []
+    while sol_ref.t < 1.0:
+        sol_ref.one_time_step()
+        for k in [3, 5]:
+            if sol_ref.nt % k == 0:
+                calls_ref.append((k, sol_ref.nt, sol_ref.m[rho].sum()))
+
+    assert sol.nt == sol_ref.nt
+    assert [c[:2] for c in calls] == [c[:2] for c in calls_ref]
+    assert np.allclose([c[2] for c in calls], [c[2] for c in calls_ref])
+    for k in range(9):
+        assert np.all(sol.F[k] == sol_ref.F[k])
+
+
+@pytest.mark.parametrize("generator", ["numpy", "cython"])
+def test_iterate(generator):
+    sol_ref = pylbm.Simulation(cavity(generator, [0, 0, 0, 1]))
+    sol = pylbm.Simulation(cavity(generator, [0, 0, 0, 1]))
+
+    states = []
+    for state in sol.iterate(every=4, nsteps=10):
+        states.append(state.nt)
+        for _ in range(state.nt - sol_ref.nt):
+            sol_ref.one_time_step()
+        assert state.t == pytest.approx(sol_ref.t)
+        assert np.all(state.m[qx] == sol_ref.m[qx])
+    assert states == [4, 8, 10]
+
+
+def test_iterate_until_reached():
+    sol = pylbm.Simulation(cavity("cython", [0, 0, 0, 1]))
+    sol.run(3)
+    assert [state.nt for state in sol.iterate(every=5, until=sol.t)] == []
+
+
+def steady_cavity():
+    dico = cavity("cython", [0, 0, 0, 1])
+    dico["reductions"] = {
+        "residual": {"expr": qx, "op": "l2", "increment": True},
+    }
+    return pylbm.Simulation(dico)
+
+
+def test_run_to_steady_state():
+    sol = steady_cavity()
+    sol.run(1)
+    assert sol.run_to_steady_state(1e-4, max_steps=5000)
+    assert sol.reductions["residual"] < 1e-4
+    # the residual is checked every 10 time steps
+    assert sol.nt % 10 == 1
+
+
+def test_run_to_steady_state_max_steps():
+    sol = steady_cavity()
+    sol.run(1)
+    assert not sol.run_to_steady_state(1e-4, max_steps=10)
+    assert sol.nt == 11
+
+
+def test_run_to_steady_state_diverge():
+    sol = steady_cavity()
+    sol.run(1)
+    sol.container.F.array[:] = np.nan
+
+    assert not sol.run_to_steady_state(1e-4, max_steps=None)
+    assert sol.nt == 11
+
+
+def test_run_to_steady_state_unknown_residual():
+    sol = steady_cavity()
+    with pytest.raises(ValueError):
+        sol.run_to_steady_state(1e-4, residual="unknown")
+
+
+@pytest.mark.parametrize("generator", ["numpy", "cython"])
+def test_sorder_auto(generator, tmp_path, monkeypatch):
+    monkeypatch.setenv("PYLBM_CACHE_DIR", str(tmp_path))
+    sol_ref = pylbm.Simulation(cavity(generator, [0, 0, 0, 1]))
+    sol = pylbm.Simulation(cavity(generator, [0, 0, 0, 1]), sorder="auto")
+    assert sol.container.sorder in [[0, 1, 2], [2, 0, 1], [1, 0, 2]]
+    assert os.path.exists(tmp_path / "sorder.json")
+
+    for _ in range(3):
+        sol_ref.one_time_step()
+        sol.one_time_step()
+    # the compiler may order the operations differently
+    for moment in [rho, qx, qy]:
+        assert sol.m[moment] == pytest.approx(sol_ref.m[moment], abs=1e-14)
+
+
+def test_sorder_auto_cached(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYLBM_CACHE_DIR", str(tmp_path))
+    sol = pylbm.Simulation(cavity("cython", [0, 0, 0, 1]), sorder="auto")
+
+    # the choice is read in the cache: the candidates are not used
+    monkeypatch.setattr(pylbm.Simulation, "_sorder_candidates", None)
+    sol_cached = pylbm.Simulation(cavity("cython", [0, 0, 0, 1]), sorder="auto")
+    assert sol_cached.container.sorder == sol.container.sorder
+
+
+@pytest.mark.parametrize("generator", ["numpy", "cython"])
+@pytest.mark.parametrize("label", LABELS)
+def test_float32(generator, label):
+    sol_ref = pylbm.Simulation(cavity(generator, label))
+    sol = pylbm.Simulation(cavity(generator, label), dtype="float32")
+    assert sol.container.F.array.dtype == np.float32
+    assert sol.container.m.array.dtype == np.float32
+    for method in sol.bc.methods:
+        assert method.rhs.dtype == np.float32
+
+    sol_ref.run(10)
+    sol.run(10)
+    assert sol.F_halo[:].dtype == np.float32
+    assert sol.F_halo[:] == pytest.approx(sol_ref.F_halo[:], abs=1e-5)
+    for moment in [rho, qx, qy]:
+        assert sol.m[moment] == pytest.approx(sol_ref.m[moment], abs=1e-5)
+
+
+@pytest.mark.parametrize("generator", ["numpy", "cython"])
+@pytest.mark.parametrize("label", LABELS)
+def test_reference(generator, label):
+    sol_ref = pylbm.Simulation(cavity(generator, label))
+    sol = pylbm.Simulation(cavity(generator, label), reference="init")
+    assert sol.m_ref[0] == pytest.approx(1.0)
+    assert sol.F_halo[:] == pytest.approx(sol_ref.F_halo[:], abs=1e-14)
+
+    sol_ref.run(10)
+    sol.run(10)
+    assert sol.F_halo[:] == pytest.approx(sol_ref.F_halo[:], abs=1e-12)
+    for moment in [rho, qx, qy]:
+        assert sol.m[moment] == pytest.approx(sol_ref.m[moment], abs=1e-12)
+
+
+def test_compressed_float32():
+    from pylbm.simulation import compare_precision
+
+    dico = cavity("cython", [0, 0, 0, 1])
+    errors = compare_precision(dico, 20, dtype="float32")
+    errors_compressed = compare_precision(
+        dico, 20, dtype="float32", reference={rho: 1.0, qx: 0.0, qy: 0.0}
+    )
+    assert errors_compressed[qx] < errors[qx]
+    for moment in [rho, qx, qy]:
+        assert errors_compressed[moment] < 1e-6
+
+
+@pytest.mark.parametrize("generator", ["numpy", "cython"])
+def test_conserved_moments(generator):
+    sol_ref = pylbm.Simulation(cavity(generator, [0, 0, 0, 1]))
+    sol = pylbm.Simulation(cavity(generator, [0, 0, 0, 1]))
+
+    for _ in range(3):
+        sol_ref.one_time_step()
+        sol.one_time_step()
+        sol_ref.f2m()
+
+        # only the conserved moments are computed
+        for moment in [rho, qx, qy, 0]:
+            assert sol._update_m
+            assert np.allclose(sol.m[moment], sol_ref.m[moment])
+        assert not sol._update_consm
+
+        assert np.allclose(sol.m[3], sol_ref.m[3])
+        assert not sol._update_m
+
+
+@pytest.mark.parametrize("label", LABELS)
+def test_ensemble(label):
+    s_mu = sp.Symbol("s_mu")
+    values = [1.2, 1.5, 1.8]
+
+    def dico(value):
+        dico = cavity("cython", label)
+        s = dico["schemes"][0]["relaxation_parameters"]
+        s[3] = s[4] = s[7] = s[8] = s_mu
+        dico["parameters"][s_mu] = value
+        return dico
+
+    dico_ens = dico(values[0])
+    dico_ens["ensemble"] = {s_mu: values}
+    sol = pylbm.Simulation(dico_ens)
+    sol_ref = [pylbm.Simulation(dico(v)) for v in values]
+
+    sol.one_time_step()
+    sol.run(5)
+    for ref in sol_ref:
+        ref.run(6)
+
+    assert sol.m[rho].shape == (len(values),) + sol_ref[0].m[rho].shape
+    for k, ref in enumerate(sol_ref):
+        for moment in [rho, qx, qy]:
+            assert np.allclose(sol.m[moment][k], ref.m[moment])